@@ -15,5 +15,52 @@ def load_config(app, overrides):
     app.config["JWT_COOKIE_SECURE"] = True
     app.config["JWT_COOKIE_CSRF_PROTECT"] = False
     app.config['FLASK_ADMIN_SWATCH'] = 'darkly'
+    app.config.setdefault('APP_PROFILE', 'web') # web, api or cli, see App/main.py
+    app.config.setdefault('STREET_DRIVES_CACHE_SIZE', 1024)
+    app.config.setdefault('STREET_DRIVES_CACHE_TTL', 60)
+    app.config.setdefault('USER_IDENTITY_CACHE_SIZE', 10000)
+    app.config.setdefault('USER_IDENTITY_CACHE_TTL', 60)
+    app.config.setdefault('PASSWORD_HASH_METHOD', None) # werkzeug's default, e.g. "pbkdf2:sha256:600000"
+    app.config.setdefault('PASSWORD_HASH_SALT_LENGTH', 16)
+    app.config.setdefault('PASSWORD_HASH_THREADS', 4) # 0 hashes inline on the event loop
+    app.config.setdefault('EVENT_QUEUE_SIZE', 100)
+    app.config.setdefault('SSE_KEEPALIVE_SECONDS', 15)
+    app.config.setdefault('SPATIAL_CELL_DEGREES', 0.01) # about 1.1km at the equator
+    app.config.setdefault('ROUTE_TIME_BUDGET', 0.5) # seconds spent improving a route
+    app.config.setdefault('ROUTE_CACHE_SIZE', 256)
+    app.config.setdefault('VAN_SPEED_KMH', 25)
+    app.config.setdefault('STOP_DWELL_SECONDS', 120)
+    app.config.setdefault('DELAYED_STATUS_MINUTES', 10) # added to every ETA while a driver is DELAYED
+    app.config.setdefault('STOP_ARRIVAL_RADIUS_M', 75)
+    app.config.setdefault('ROAD_DETOUR_FACTOR', 1.3) # road distance per meter of straight line
+    app.config.setdefault('ETA_ROUTE_RECHECK_SECONDS', 30)
+    app.config.setdefault('ETA_DRIVE_LEAD_MINUTES', 60) # a drive follows its driver's pings from this long before arrive_at
+    app.config.setdefault('LOCATION_FLUSH_SECONDS', 2) # how long driver location pings are buffered before being written
+    app.config.setdefault('LOCATION_FLUSH_BATCH_SIZE', 500)
+    app.config.setdefault('LOCATION_CACHE_SIZE', 10000) # drivers whose last known state a worker keeps
+    app.config.setdefault('LOCATION_CACHE_SECONDS', 30) # after which it is read from the database again
+    app.config.setdefault('ARCHIVE_AFTER_DAYS', 30) # drives older than this move to the archive tables
+    app.config.setdefault('ARCHIVE_CHUNK_SIZE', 1000) # drives moved per transaction
+    app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOB_BACKOFF_SECONDS', 10) # first retry delay, doubled per failed attempt
+    app.config.setdefault('JOB_BACKOFF_MAX_SECONDS', 3600)
+    app.config.setdefault('JOB_LEASE_SECONDS', 600) # a RUNNING job is handed to another worker after this
+    app.config.setdefault('JOB_POLL_SECONDS', 1)
+    app.config.setdefault('DRIVE_DURATION_MINUTES', 30) # how long a drive books its driver from arrive_at
+    app.config.setdefault('SCHEDULE_HORIZON_DAYS', 28) # how far ahead recurring drives are listed and checked for clashes
+    # engine pool (ignored for sqlite); FLASK_SQLALCHEMY_ENGINE_OPTIONS__<name> sets any other option
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    app.config.setdefault('DB_POOL_SIZE', 10) # per worker process
+    app.config.setdefault('DB_MAX_OVERFLOW', 20)
+    app.config.setdefault('DB_POOL_TIMEOUT', 30)
+    app.config.setdefault('DB_POOL_PRE_PING', True)
+    app.config.setdefault('DB_POOL_RECYCLE', 1800)
+    app.config.setdefault('DB_POOL_SLOW_CHECKOUT_MS', 500)
+    app.config.setdefault('RESPONSE_CACHE_SIZE', 512)
+    app.config.setdefault('RESPONSE_CACHE_TTL', 10) # seconds a rendered list response is reused
+    app.config.setdefault('METRICS_DIR', None) # shared by all gunicorn workers, e.g. /tmp/breadvan-metrics
+    app.config.setdefault('METRICS_FLUSH_SECONDS', 5)
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', 10) # same statement more often than this in one request
+    app.config.setdefault('DB_GEVENT', 'auto') # cooperative psycopg2: true, false or auto (when gevent has patched sockets)
     for key in overrides:
         app.config[key] = overrides[key]
\ No newline at end of file
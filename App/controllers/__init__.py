@@ -1,3 +1,18 @@
 from .user import *
 from .auth import *
 from .initialize import *
+from .driver import *
+from .location import *
+from .drive_schedule import *
+from .booking import *
+from .drive import *
+from .export import *
+from .schedule_import import *
+from .route import *
+from .table_version import *
+from .request_counts import *
+from .stop_request import *
+from .archive import *
+from .notification import *
+from .jobs import *
+from .eta import *
@@ -0,0 +1,81 @@
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert
+
+from App.models import Drive, DriveArchive, StopRequest, StopRequestArchive
+from App.database import db
+
+# Drives older than ARCHIVE_AFTER_DAYS move, with their stop requests, from the
+# live tables to drive_archive/stop_request_archive, keeping ids. Each chunk of
+# drives is moved in its own transaction, so an interrupted run loses nothing
+# and the next run carries on where it stopped.
+
+DRIVE_COLUMNS = ("id", "driver_id", "street_id", "arrive_at", "created_at", "status")
+STOP_REQUEST_COLUMNS = ("id", "resident_id", "drive_id", "requested_at", "status", "address")
+
+_archive_settings = {"after_days": 30, "chunk_size": 1000}
+
+def configure_archive(app):
+    _archive_settings["after_days"] = app.config['ARCHIVE_AFTER_DAYS']
+    _archive_settings["chunk_size"] = app.config['ARCHIVE_CHUNK_SIZE']
+
+def _columns(model, names):
+    return [getattr(model, name) for name in names]
+
+def _archive_chunk(cutoff, chunk_size):
+    # locking the drives keeps stop requests from being added to them meanwhile
+    drive_ids = db.session.scalars(
+        db.select(Drive.id).filter(Drive.arrive_at < cutoff).order_by(Drive.id).limit(chunk_size).with_for_update()
+    ).all()
+    if not drive_ids:
+        return 0, 0
+    # DELETE ... RETURNING hands over exactly the rows removed, as they were when removed
+    stop_requests = db.session.execute(
+        delete(StopRequest).where(StopRequest.drive_id.in_(drive_ids))
+        .returning(*_columns(StopRequest, STOP_REQUEST_COLUMNS))
+        .execution_options(synchronize_session=False)
+    ).mappings().all()
+    drives = db.session.execute(
+        delete(Drive).where(Drive.id.in_(drive_ids))
+        .returning(*_columns(Drive, DRIVE_COLUMNS))
+        .execution_options(synchronize_session=False)
+    ).mappings().all()
+    archived_at = datetime.utcnow()
+    db.session.execute(insert(DriveArchive), [dict(row, archived_at=archived_at) for row in drives])
+    if stop_requests:
+        db.session.execute(insert(StopRequestArchive), [dict(row, archived_at=archived_at) for row in stop_requests])
+    db.session.commit()
+    return len(drives), len(stop_requests)
+
+def archive_drives(older_than=None, chunk_size=None, max_chunks=None):
+    """
+    Move drives that arrived more than older_than ago (ARCHIVE_AFTER_DAYS by
+    default), whatever their status, and their stop requests into the archive
+    tables, chunk_size drives per transaction. Stops after max_chunks chunks
+    when given. Returns a report with moved counts and throughput.
+    """
+    if older_than is None:
+        older_than = timedelta(days=_archive_settings["after_days"])
+    chunk_size = chunk_size or _archive_settings["chunk_size"]
+    cutoff = datetime.utcnow() - older_than
+    started = time.perf_counter()
+    report = {'drives': 0, 'stop_requests': 0, 'chunks': 0, 'done': False}
+    while max_chunks is None or report['chunks'] < max_chunks:
+        drives, stop_requests = _archive_chunk(cutoff, chunk_size)
+        if not drives:
+            report['done'] = True
+            break
+        report['drives'] += drives
+        report['stop_requests'] += stop_requests
+        report['chunks'] += 1
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+def get_archive_counts():
+    return {
+        'drives': db.session.scalar(db.select(db.func.count()).select_from(Drive)),
+        'archived_drives': db.session.scalar(db.select(db.func.count()).select_from(DriveArchive)),
+        'stop_requests': db.session.scalar(db.select(db.func.count()).select_from(StopRequest)),
+        'archived_stop_requests': db.session.scalar(db.select(db.func.count()).select_from(StopRequestArchive)),
+    }
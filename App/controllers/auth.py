@@ -1,12 +1,49 @@
+from collections import namedtuple
+
+from flask import g
 from flask_jwt_extended import create_access_token, jwt_required, JWTManager, get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 
 from App.models import User
 from App.database import db
+from App.cache import LRUCache
+
+# What the JWT layer and templates need to know about the current user.
+# Cached per worker so authenticated requests don't query for it.
+UserIdentity = namedtuple("UserIdentity", ["id", "username"])
+
+identity_cache = LRUCache(maxsize=10000, ttl=60)
+
+def configure_identity_cache(app):
+  identity_cache.configure(
+    maxsize=app.config['USER_IDENTITY_CACHE_SIZE'],
+    ttl=app.config['USER_IDENTITY_CACHE_TTL']
+  )
+
+def get_user_identity(user_id):
+  identity = identity_cache.get(user_id)
+  if identity is None:
+    row = db.session.execute(db.select(User.id, User.username).filter_by(id=user_id)).first()
+    if row is None:
+      return None
+    identity = UserIdentity(*row)
+    identity_cache.set(user_id, identity)
+  return identity
+
+def invalidate_user_identity(user_id):
+  identity_cache.invalidate(user_id)
 
 def login(username, password):
   result = db.session.execute(db.select(User).filter_by(username=username))
   user = result.scalar_one_or_none()
   if user and user.check_password(password):
+    # the plaintext is only available now, so upgrade legacy hashes on login
+    if user.password_needs_rehash():
+      user.set_password(password)
+      db.session.commit()
     # Store ONLY the user id as a string in JWT 'sub'
     return create_access_token(identity=str(user.id))
   return None
@@ -30,7 +67,11 @@ def setup_jwt(app):
       user_id = int(identity)
     except (TypeError, ValueError):
       return None
-    return db.session.get(User, user_id)
+    # resolve once per request; jwt_required and the context processor share it
+    current = g.get("current_identity")
+    if current is None or current.id != user_id:
+      g.current_identity = get_user_identity(user_id)
+    return g.current_identity
 
   return jwt
 
@@ -39,14 +80,31 @@ def setup_jwt(app):
 def add_auth_context(app):
   @app.context_processor
   def inject_user():
-      try:
-          verify_jwt_in_request()
-          identity = get_jwt_identity()
-          user_id = int(identity) if identity is not None else None
-          current_user = db.session.get(User, user_id) if user_id is not None else None
-          is_authenticated = current_user is not None
-      except Exception as e:
-          print(e)
-          is_authenticated = False
-          current_user = None
-      return dict(is_authenticated=is_authenticated, current_user=current_user)
\ No newline at end of file
+      if "current_identity" not in g:
+          g.current_identity = None
+          try:
+              verify_jwt_in_request(optional=True)
+          except (JWTExtendedException, PyJWTError) as e:
+              # expired or tampered token: render the page as anonymous
+              app.logger.debug("ignoring invalid JWT: %s", e)
+      current_user = g.current_identity
+      return dict(is_authenticated=current_user is not None, current_user=current_user)
+
+
+# Drop cached identities when users change: immediately on flush and again
+# after the transaction ends, so a concurrent refill can't keep stale data.
+
+def _invalidate_identity(mapper, connection, target):
+  identity_cache.invalidate(target.id)
+  session = object_session(target)
+  if session is not None:
+    session.info.setdefault("stale_users", set()).add(target.id)
+
+event.listen(User, "after_update", _invalidate_identity)
+event.listen(User, "after_delete", _invalidate_identity)
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_stale_identities(session):
+  for user_id in session.info.pop("stale_users", ()):
+    identity_cache.invalidate(user_id)
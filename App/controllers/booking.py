@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from sqlalchemy import true
+
+from App.models import Drive, DriveSchedule, Driver
+from App.database import db
+from App.intervals import IntervalIndex
+from .drive_schedule import get_schedule_occurrences
+
+# A drive books its driver from arrive_at for DRIVE_DURATION_MINUTES. Scheduling
+# paths lock the drivers involved, load their bookings around the new drives
+# into an IntervalIndex with one range query on (driver_id, arrive_at), then
+# check each new drive against it with two bisects. The row locks keep two
+# transactions from booking the same driver into the same slot.
+
+_booking_settings = {"duration": timedelta(minutes=30)}
+
+def configure_bookings(app):
+    _booking_settings["duration"] = timedelta(minutes=app.config['DRIVE_DURATION_MINUTES'])
+
+def get_drive_duration():
+    return _booking_settings["duration"]
+
+def load_booking_index(driver_ids, start, end, lock=True):
+    """
+    An IntervalIndex of the bookings of driver_ids that could overlap a drive
+    arriving between start and end: their drives ("drive #<id>") and their
+    recurring drives' occurrences ("schedule #<id>"). With lock, the drivers
+    stay locked until the transaction ends.
+    """
+    duration = get_drive_duration()
+    driver_ids = sorted(set(driver_ids))
+    if lock:
+        # a fixed order keeps concurrent schedulers from deadlocking on the driver rows
+        db.session.execute(db.select(Driver.id).filter(Driver.id.in_(driver_ids)).order_by(Driver.id).with_for_update()).all()
+    index = IntervalIndex(duration)
+    rows = db.session.execute(
+        db.select(Drive.id, Drive.driver_id, Drive.arrive_at)
+        .filter(Drive.driver_id.in_(driver_ids), Drive.status != "CANCELLED",
+                Drive.arrive_at > start - duration, Drive.arrive_at < end + duration)
+    )
+    for drive_id, driver_id, arrive_at in rows:
+        index.add(driver_id, arrive_at, f"drive #{drive_id}")
+    for schedule, arrive_at in get_schedule_occurrences(DriveSchedule.driver_id.in_(driver_ids),
+                                                        start - duration, end + duration):
+        index.add(schedule.driver_id, arrive_at, f"schedule #{schedule.id}")
+    return index
+
+def describe_conflicts(conflicts):
+    return ", ".join(f"{item} at {start:%Y-%m-%d %H:%M}" for start, item in conflicts)
+
+def check_booking(driver_id, arrive_at, drive_id=None):
+    """
+    Lock the driver and return the (arrive_at, "drive #<id>") bookings a drive
+    at arrive_at would overlap, leaving drive_id itself out when rescheduling.
+    """
+    index = load_booking_index([driver_id], arrive_at, arrive_at)
+    return [(start, item) for start, item in index.overlapping(driver_id, arrive_at) if item != f"drive #{drive_id}"]
+
+def find_double_bookings(start, end):
+    """
+    Every pair of overlapping bookings ("drive #<id>" or "schedule #<id>") of
+    the same driver arriving between start and end, found in one sweep over
+    each driver's sorted drives and recurring drives' occurrences.
+    """
+    index = IntervalIndex(get_drive_duration())
+    rows = db.session.execute(
+        db.select(Drive.id, Drive.driver_id, Drive.arrive_at)
+        .filter(Drive.status != "CANCELLED", Drive.arrive_at >= start, Drive.arrive_at < end)
+    )
+    for drive_id, driver_id, arrive_at in rows:
+        index.add(driver_id, arrive_at, f"drive #{drive_id}")
+    for schedule, arrive_at in get_schedule_occurrences(true(), start, end):
+        index.add(schedule.driver_id, arrive_at, f"schedule #{schedule.id}")
+    return [
+        {"driver_id": driver_id, "booking": first[1], "arrive_at": first[0].isoformat(),
+         "overlapping_booking": second[1], "overlapping_arrive_at": second[0].isoformat()}
+        for driver_id, first, second in index.overlaps()
+    ]
@@ -0,0 +1,217 @@
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import get_history
+
+from App.models import Drive, DriveSchedule
+from App.database import db
+from App.cache import LRUCache
+from .booking import check_booking, describe_conflicts, get_drive_duration, load_booking_index
+from .drive_schedule import expand_schedule, get_schedule_horizon, get_schedule_occurrences
+from .jobs import enqueue_job
+from .notification import new_change_id
+
+# Immutable snapshot of a Drive row, or of a schedule occurrence not yet made
+# into one (id None); safe to share between requests and sessions
+UpcomingDrive = namedtuple("UpcomingDrive", ["id", "driver_id", "street_id", "arrive_at", "status", "schedule_id"])
+
+# Every resident on a street sees the same upcoming drives, so cache per street
+street_drives_cache = LRUCache(maxsize=1024, ttl=60)
+
+def configure_drive_cache(app):
+    street_drives_cache.configure(
+        maxsize=app.config['STREET_DRIVES_CACHE_SIZE'],
+        ttl=app.config['STREET_DRIVES_CACHE_TTL']
+    )
+
+def get_upcoming_drives_for_street(street_id):
+    drives = street_drives_cache.get(street_id)
+    if drives is not None:
+        return drives
+    now = datetime.utcnow()
+    rows = db.session.execute(
+        db.select(Drive.id, Drive.driver_id, Drive.street_id, Drive.arrive_at, Drive.status, Drive.schedule_id)
+        .filter(Drive.street_id == street_id, Drive.arrive_at >= now)
+        .order_by(Drive.arrive_at.asc())
+    )
+    drives = [UpcomingDrive(*row) for row in rows]
+    # recurring drives up to the schedule horizon, where no drive row stands in for them
+    drives.extend(
+        UpcomingDrive(None, schedule.driver_id, street_id, arrive_at, "SCHEDULED", schedule.id)
+        for schedule, arrive_at in get_schedule_occurrences(DriveSchedule.street_id == street_id,
+                                                            now, now + get_schedule_horizon())
+    )
+    drives = tuple(sorted(drives, key=lambda d: d.arrive_at))
+    # the list goes stale as soon as its earliest drive is in the past
+    ttl = (drives[0].arrive_at - now).total_seconds() if drives else None
+    street_drives_cache.set(street_id, drives, ttl=ttl)
+    return drives
+
+def get_upcoming_drives_for_street_json(street_id):
+    return [
+        {
+            "id": d.id,
+            "driver_id": d.driver_id,
+            "street_id": d.street_id,
+            "arrive_at": d.arrive_at.isoformat(),
+            "status": d.status,
+            "schedule_id": d.schedule_id
+        }
+        for d in get_upcoming_drives_for_street(street_id)
+    ]
+
+def _notify(drive, kind):
+    # the job is committed together with the drive change, so no change goes unannounced
+    db.session.flush()
+    enqueue_job("notify_drives", {"drive_ids": [drive.id], "kind": kind, "change_id": new_change_id()})
+
+def _check_booking(driver_id, arrive_at, drive_id=None):
+    # the caller's transaction is left as it is (driver lock included) for it to roll back or carry on with
+    conflicts = check_booking(driver_id, arrive_at, drive_id)
+    if conflicts:
+        raise ValueError(f"driver {driver_id} is already booked then ({describe_conflicts(conflicts)})")
+
+def schedule_drive(driver_id, street_id, arrive_at):
+    """
+    Schedule a drive and queue the notification of the street's residents.
+    Raises ValueError if the driver is already booked around arrive_at,
+    leaving the session's transaction open for the caller to end.
+    """
+    if arrive_at <= datetime.utcnow():
+        raise ValueError("arrival must be in the future")
+    _check_booking(driver_id, arrive_at)
+    drive = Drive(driver_id=driver_id, street_id=street_id, arrive_at=arrive_at)
+    db.session.add(drive)
+    _notify(drive, "DRIVE_SCHEDULED")
+    return drive
+
+def reschedule_drive(drive_id, arrive_at):
+    """
+    Move a scheduled drive to arrive_at; None if there is no such drive.
+    Raises ValueError if the drive can't move there, leaving the session's
+    transaction open for the caller to end.
+    """
+    drive = db.session.get(Drive, drive_id)
+    if drive is None:
+        return None
+    if drive.status != "SCHEDULED":
+        raise ValueError(f"drive {drive_id} is {drive.status.lower()}")
+    if arrive_at <= datetime.utcnow():
+        raise ValueError("arrival must be in the future")
+    _check_booking(drive.driver_id, arrive_at, drive_id)
+    if drive.schedule_id is not None:
+        # the schedule's occurrence has moved: keep it from showing up again where it was
+        _skip_occurrence(db.session.get(DriveSchedule, drive.schedule_id), drive.arrive_at.date())
+    drive.arrive_at = arrive_at
+    _notify(drive, "DRIVE_RESCHEDULED")
+    return drive
+
+def cancel_drive(drive_id):
+    """Cancel a drive that hasn't arrived yet; None if there is no such drive."""
+    drive = db.session.get(Drive, drive_id)
+    if drive is None:
+        return None
+    if drive.status not in ("SCHEDULED", "EN_ROUTE"):
+        raise ValueError(f"drive {drive_id} is {drive.status.lower()}")
+    drive.status = "CANCELLED"
+    _notify(drive, "DRIVE_CANCELLED")
+    return drive
+
+def create_drive_schedule(driver_id, street_id, weekday, time_of_day, starts_on, ends_on=None,
+                          interval_weeks=1, exceptions=()):
+    """
+    Add a recurring drive: every interval_weeks on weekday (0 is Monday) at
+    time_of_day, from starts_on until ends_on (open-ended by default), except
+    on the dates in exceptions. Raises ValueError if the rule is invalid or
+    an occurrence would double-book the driver, within the schedule horizon or
+    up to the driver's last booked drive if that is further out, leaving the
+    session's transaction open for the caller to end.
+    """
+    if not 0 <= weekday <= 6:
+        raise ValueError("weekday must be 0 (Monday) to 6 (Sunday)")
+    if interval_weeks < 1:
+        raise ValueError("interval must be at least one week")
+    if ends_on is not None and ends_on < starts_on:
+        raise ValueError("the schedule must end after it starts")
+    schedule = DriveSchedule(driver_id=driver_id, street_id=street_id, weekday=weekday, time_of_day=time_of_day,
+                             starts_on=starts_on, ends_on=ends_on, interval_weeks=interval_weeks,
+                             exceptions=json.dumps(sorted(day.isoformat() for day in exceptions)))
+    now = datetime.utcnow()
+    last_drive = db.session.scalar(
+        db.select(db.func.max(Drive.arrive_at)).filter(Drive.driver_id == driver_id, Drive.status != "CANCELLED")
+    )
+    end = now + get_schedule_horizon()
+    if last_drive is not None:
+        end = max(end, last_drive + get_drive_duration())
+    if ends_on is not None:
+        end = min(end, datetime.combine(ends_on + timedelta(days=1), datetime.min.time()))
+    index = load_booking_index([driver_id], now, end)
+    for arrive_at in expand_schedule(schedule, now, end):
+        conflicts = index.overlapping(driver_id, arrive_at)
+        if conflicts:
+            raise ValueError(f"driver {driver_id} is already booked at {arrive_at:%Y-%m-%d %H:%M} "
+                             f"({describe_conflicts(conflicts)})")
+    db.session.add(schedule)
+    db.session.commit()
+    return schedule
+
+def _skip_occurrence(schedule, day):
+    schedule.exceptions = json.dumps(sorted({d.isoformat() for d in schedule.skipped_dates() | {day}}))
+
+def skip_schedule_occurrence(schedule_id, day):
+    """
+    Drop the occurrence of a recurring drive on day; None if there is no such
+    schedule. Raises ValueError if there is no occurrence that day, or if it has
+    already been made into a drive (cancel that instead).
+    """
+    schedule = db.session.get(DriveSchedule, schedule_id)
+    if schedule is None:
+        return None
+    start = datetime.combine(day, datetime.min.time())
+    occurrence = next(expand_schedule(schedule, start, start + timedelta(days=1)), None)
+    if occurrence is None:
+        raise ValueError(f"schedule {schedule_id} has no drive on {day}")
+    drive_id = db.session.scalar(db.select(Drive.id).filter_by(schedule_id=schedule_id, arrive_at=occurrence))
+    if drive_id is not None:
+        raise ValueError(f"that drive is already drive {drive_id}; cancel it instead")
+    _skip_occurrence(schedule, day)
+    db.session.commit()
+    return schedule
+
+def invalidate_street_drives(street_ids):
+    # for writes that bypass the ORM (bulk and Core statements)
+    for street_id in street_ids:
+        street_drives_cache.invalidate(street_id)
+
+def get_street_drives_cache_stats():
+    return street_drives_cache.stats()
+
+
+# Invalidate on flush, and again once the transaction is over, so a reader that
+# refilled the cache between the two cannot keep pre-commit data around.
+
+def _touched_streets(target):
+    streets = {target.street_id}
+    streets.update(get_history(target, "street_id").deleted or ())
+    return streets
+
+def _invalidate_streets(mapper, connection, target):
+    streets = _touched_streets(target)
+    for street_id in streets:
+        street_drives_cache.invalidate(street_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("stale_streets", set()).update(streets)
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Drive, _event, _invalidate_streets)
+    event.listen(DriveSchedule, _event, _invalidate_streets)
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_stale_streets(session):
+    for street_id in session.info.pop("stale_streets", ()):
+        street_drives_cache.invalidate(street_id)
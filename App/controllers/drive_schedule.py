@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from App.models import Drive, DriveSchedule
+from App.database import db
+
+# A DriveSchedule stands for a drive every interval_weeks on its weekday. Its
+# occurrences are worked out for whatever window is asked for and never stored
+# as such. A Drive row with the schedule's id and the occurrence's arrive_at is
+# only made once a stop request attaches to the occurrence; from then on that
+# row stands in for it, so cancelling or moving it works like any other drive.
+
+_schedule_settings = {"horizon_days": 28}
+
+def configure_drive_schedules(app):
+    _schedule_settings["horizon_days"] = app.config['SCHEDULE_HORIZON_DAYS']
+
+def get_schedule_horizon():
+    return timedelta(days=_schedule_settings["horizon_days"])
+
+def expand_schedule(schedule, start, end):
+    """Lazily yield the arrival times of schedule's occurrences with start <= arrive_at < end."""
+    step = timedelta(weeks=schedule.interval_weeks)
+    first = schedule.starts_on + timedelta(days=(schedule.weekday - schedule.starts_on.weekday()) % 7)
+    # jump straight to the last occurrence before the window rather than walking there from starts_on
+    day = first + step * max(0, (start.date() - first).days // step.days)
+    skipped = schedule.skipped_dates()
+    while schedule.ends_on is None or day <= schedule.ends_on:
+        arrive_at = datetime.combine(day, schedule.time_of_day)
+        if arrive_at >= end:
+            return
+        if arrive_at >= start and day not in skipped:
+            yield arrive_at
+        day += step
+
+def get_schedule_occurrences(condition, start, end):
+    """
+    (schedule, arrive_at) for every occurrence between start and end of the
+    schedules matching condition that no drive stands in for yet.
+    """
+    schedules = db.session.scalars(
+        db.select(DriveSchedule).filter(
+            condition, DriveSchedule.starts_on < end.date() + timedelta(days=1),
+            or_(DriveSchedule.ends_on.is_(None), DriveSchedule.ends_on >= start.date()))
+    ).all()
+    if not schedules:
+        return []
+    # the (schedule_id, arrive_at) unique index answers this
+    materialized = set(db.session.execute(
+        db.select(Drive.schedule_id, Drive.arrive_at)
+        .filter(Drive.schedule_id.in_([s.id for s in schedules]), Drive.arrive_at >= start, Drive.arrive_at < end)
+    ).all())
+    return [
+        (schedule, arrive_at)
+        for schedule in schedules
+        for arrive_at in expand_schedule(schedule, start, end)
+        if (schedule.id, arrive_at) not in materialized
+    ]
+
+def is_occurrence(schedule, arrive_at):
+    return next(expand_schedule(schedule, arrive_at, arrive_at + timedelta(seconds=1)), None) == arrive_at
+
+def get_drive_schedule(id):
+    return db.session.get(DriveSchedule, id)
@@ -0,0 +1,146 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, object_session, selectinload
+
+from App.models import Drive, Driver, Resident, StopRequest
+from App.database import db
+from App.pubsub import hub
+from App.spatial import GridIndex
+
+DRIVER_STATUSES = ("OFF_DUTY", "EN_ROUTE", "DELAYED", "ACCEPTED", "REJECTED", "COMPLETED")
+
+def get_driver(id):
+    return db.session.get(Driver, id)
+
+def get_driver_topics(driver):
+    # subscribers follow a driver directly, or any street the driver is heading to
+    street_ids = db.session.scalars(
+        db.select(Drive.street_id).distinct()
+        .filter(Drive.driver_id == driver.id, Drive.arrive_at >= datetime.utcnow())
+    )
+    return ["drivers", f"driver:{driver.id}"] + [f"street:{street_id}" for street_id in street_ids]
+
+def set_driver_status(driver_id, status, location=None, latitude=None, longitude=None):
+    driver = get_driver(driver_id)
+    if not driver:
+        return None
+    driver.status = status
+    if location:
+        driver.location = location
+    if latitude is not None and longitude is not None:
+        driver.latitude, driver.longitude = latitude, longitude
+    driver.status_updated_at = datetime.utcnow()
+    db.session.commit()
+    hub.publish(db.session, get_driver_topics(driver), "status", driver.get_json())
+    return driver
+
+def get_driver_request_board(driver_id, since=None):
+    # drives + streets in one joined query, then stop requests with their
+    # residents and users in one select-in query: two round-trips in total
+    if since is None:
+        since = datetime.utcnow()
+    stmt = (
+        db.select(Drive)
+        .filter(Drive.driver_id == driver_id, Drive.arrive_at >= since)
+        .order_by(Drive.arrive_at.asc())
+        .options(
+            joinedload(Drive.street),
+            selectinload(Drive.stop_requests)
+            .joinedload(StopRequest.resident)
+            .joinedload(Resident.user),
+        )
+    )
+    return db.session.scalars(stmt).unique().all()
+
+def get_driver_request_board_json(driver_id, since=None):
+    board = []
+    for drive in get_driver_request_board(driver_id, since):
+        drive_json = drive.get_json()
+        drive_json["street_name"] = drive.street.name
+        drive_json["stop_requests"] = []
+        for req in sorted(drive.stop_requests, key=lambda r: r.id):
+            req_json = req.get_json()
+            req_json["username"] = req.resident.user.username
+            drive_json["stop_requests"].append(req_json)
+        board.append(drive_json)
+    return board
+
+
+# ---- nearest-driver lookups ----
+# Active drivers with coordinates live in a per-worker grid index. It is loaded
+# on first use, then kept current from committed Driver changes in this process
+# and from the "drivers" event topic for changes made by other processes.
+
+driver_index = GridIndex()
+_driver_statuses = {}
+_driver_index_state = {"loaded": False}
+_driver_index_lock = threading.Lock()
+
+def configure_driver_index(app):
+    with _driver_index_lock:
+        driver_index.cell_degrees = app.config['SPATIAL_CELL_DEGREES']
+        driver_index.clear()
+        _driver_statuses.clear()
+        _driver_index_state["loaded"] = False
+
+def _index_driver(driver_id, status, latitude, longitude):
+    if status == "OFF_DUTY" or latitude is None or longitude is None:
+        driver_index.remove(driver_id)
+        _driver_statuses.pop(driver_id, None)
+    else:
+        driver_index.update(driver_id, latitude, longitude)
+        _driver_statuses[driver_id] = status
+
+def _on_driver_event(event_name, data):
+    if event_name == "status" and _driver_index_state["loaded"]:
+        _index_driver(data["id"], data["status"], data.get("latitude"), data.get("longitude"))
+
+def _load_driver_index():
+    with _driver_index_lock:
+        if _driver_index_state["loaded"]:
+            return
+        hub.add_listener("drivers", _on_driver_event)
+        rows = db.session.execute(
+            db.select(Driver.id, Driver.status, Driver.latitude, Driver.longitude)
+            .filter(Driver.status != "OFF_DUTY", Driver.latitude.is_not(None), Driver.longitude.is_not(None))
+        )
+        for row in rows:
+            _index_driver(*row)
+        _driver_index_state["loaded"] = True
+
+def get_nearest_drivers(latitude, longitude, k=5):
+    _load_driver_index()
+    nearest = []
+    for driver_id, distance in driver_index.nearest(latitude, longitude, k):
+        lat, lon = driver_index.get(driver_id)
+        nearest.append({
+            "driver_id": driver_id,
+            "status": _driver_statuses.get(driver_id),
+            "latitude": lat,
+            "longitude": lon,
+            "distance_m": round(distance, 1)
+        })
+    return nearest
+
+def _track_driver_position(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("driver_positions", {})[target.id] = (
+            target.status, target.latitude, target.longitude)
+
+event.listen(Driver, "after_insert", _track_driver_position)
+event.listen(Driver, "after_update", _track_driver_position)
+
+@event.listens_for(Session, "after_commit")
+def _apply_driver_positions(session):
+    positions = session.info.pop("driver_positions", {})
+    if _driver_index_state["loaded"]:
+        for driver_id, (status, latitude, longitude) in positions.items():
+            _index_driver(driver_id, status, latitude, longitude)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_driver_positions(session):
+    session.info.pop("driver_positions", None)
+
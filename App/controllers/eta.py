@@ -0,0 +1,214 @@
+import threading, time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from App.models import Drive, StopRequest
+from App.database import db
+from App.cache import LRUCache
+from App.pubsub import hub
+from App.spatial import haversine_m
+from .route import get_drive_route
+from .location import get_driver_location
+
+EPOCH = datetime(1970, 1, 1)
+MOVING_STATUSES = ("EN_ROUTE", "DELAYED")
+IN_PROGRESS_STATUSES = ("EN_ROUTE", "ARRIVED")
+
+_eta_settings = {
+    "speed_mps": 25 / 3.6,
+    "dwell_seconds": 120,
+    "delay_seconds": 600,
+    "arrival_radius_m": 75,
+    "detour_factor": 1.3,
+    "recheck_seconds": 30,
+    "lead_seconds": 3600,
+}
+
+def configure_eta_engine(app):
+    _eta_settings["speed_mps"] = app.config['VAN_SPEED_KMH'] / 3.6
+    _eta_settings["dwell_seconds"] = app.config['STOP_DWELL_SECONDS']
+    _eta_settings["delay_seconds"] = app.config['DELAYED_STATUS_MINUTES'] * 60
+    _eta_settings["arrival_radius_m"] = app.config['STOP_ARRIVAL_RADIUS_M']
+    _eta_settings["detour_factor"] = app.config['ROAD_DETOUR_FACTOR']
+    _eta_settings["recheck_seconds"] = app.config['ETA_ROUTE_RECHECK_SECONDS']
+    _eta_settings["lead_seconds"] = app.config['ETA_DRIVE_LEAD_MINUTES'] * 60
+
+def _travel_seconds(meters):
+    return meters * _eta_settings["detour_factor"] / _eta_settings["speed_mps"]
+
+def _timestamp(dt):
+    return (dt - EPOCH).total_seconds()
+
+
+class DriveEta:
+    """
+    Arrival estimates for one drive's routed stops. Stop offsets from the first
+    stop are fixed by the route (travel plus dwell), so a driver update only
+    re-anchors the stops still ahead of the van: etas[next:] = anchor + offsets.
+    No stop is ever due before its scheduled time, arrive_at + its offset.
+    """
+
+    def __init__(self, drive, route):
+        self.drive_id = drive.id
+        self.driver_id = drive.driver_id
+        self.arrive_at = _timestamp(drive.arrive_at)
+        self.status = drive.status
+        self.route = route
+        stops = route["stops"]
+        self.stop_ids = [stop["stop_request_id"] for stop in stops]
+        self.latitudes = [stop["latitude"] for stop in stops]
+        self.longitudes = [stop["longitude"] for stop in stops]
+        self.leg_m = [
+            haversine_m(self.latitudes[i], self.longitudes[i], self.latitudes[i + 1], self.longitudes[i + 1])
+            for i in range(len(stops) - 1)
+        ]
+        legs = [_travel_seconds(m) + _eta_settings["dwell_seconds"] for m in self.leg_m]
+        self.offsets = list(accumulate(legs, initial=0.0))
+        self.next_index = 0
+        self.updated_at = None
+        # before the van reports a position, the first stop is due at the drive's arrival time
+        self.etas = [self.arrive_at + offset for offset in self.offsets]
+        self.checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.next_index >= len(self.stop_ids)
+
+    def in_progress(self, reported_at):
+        """
+        Whether the driver is on this drive at reported_at: the drive is marked
+        EN_ROUTE or ARRIVED, or it is still SCHEDULED and reported_at falls
+        between ETA_DRIVE_LEAD_MINUTES before arrive_at and as long after the
+        last stop's scheduled time.
+        """
+        if self.status in IN_PROGRESS_STATUSES:
+            return True
+        if self.status != "SCHEDULED":
+            return False
+        lead = _eta_settings["lead_seconds"]
+        return self.arrive_at - lead <= _timestamp(reported_at) <= self.arrive_at + self.offsets[-1] + lead
+
+    def apply_driver(self, status, latitude, longitude, reported_at):
+        if status not in MOVING_STATUSES or latitude is None or longitude is None or not self.stop_ids:
+            return
+        with self._lock:
+            k, n = self.next_index, len(self.stop_ids)
+            # skip stops the van has reached, or passed on its way to the next one
+            while k < n:
+                to_stop = haversine_m(latitude, longitude, self.latitudes[k], self.longitudes[k])
+                if to_stop <= _eta_settings["arrival_radius_m"]:
+                    k += 1
+                    continue
+                if k + 1 < n and haversine_m(latitude, longitude, self.latitudes[k + 1], self.longitudes[k + 1]) < self.leg_m[k]:
+                    k += 1
+                    continue
+                break
+            self.next_index = k
+            self.updated_at = reported_at
+            if k == n:
+                return
+            anchor = _timestamp(reported_at) + _travel_seconds(to_stop)
+            if status == "DELAYED":
+                anchor += _eta_settings["delay_seconds"]
+            # only the suffix still ahead of the van changes; a van running early is still due on schedule
+            base = max(anchor - self.offsets[k], self.arrive_at)
+            self.etas[k:] = [base + offset for offset in self.offsets[k:]]
+
+    def stop_json(self, i):
+        passed = i < self.next_index
+        return {
+            "stop_request_id": self.stop_ids[i],
+            "sequence": i + 1,
+            "passed": passed,
+            "eta": None if passed else (EPOCH + timedelta(seconds=self.etas[i])).isoformat()
+        }
+
+    def to_json(self):
+        with self._lock:
+            return {
+                "drive_id": self.drive_id,
+                "driver_id": self.driver_id,
+                "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+                "stops": [self.stop_json(i) for i in range(len(self.stop_ids))],
+                "unrouted": self.route["unrouted"]
+            }
+
+
+# Per-worker ETA state, pushed forward by driver status events. A state is
+# kept while its drive's route is unchanged; the route is re-validated at most
+# every ETA_ROUTE_RECHECK_SECONDS, so reads in between touch no database.
+eta_cache = LRUCache(maxsize=1024)
+_etas_by_driver = {}
+_eta_listener = {"registered": False}
+_eta_lock = threading.Lock()
+
+def _current_drive_eta(driver_id, reported_at, extra=None):
+    """
+    The cached state of the drive driver_id is on at reported_at: the earliest
+    unfinished one in progress. A driver's pings only ever move that drive, so
+    an afternoon drive doesn't follow the van around its morning round.
+    """
+    states = [extra] if extra is not None else []
+    for drive_id in list(_etas_by_driver.get(driver_id, ())):
+        state = eta_cache.get(drive_id)
+        if state is None:
+            _etas_by_driver[driver_id].discard(drive_id)
+        elif state is not extra:
+            states.append(state)
+    current = [state for state in states if not state.finished and state.in_progress(reported_at)]
+    return min(current, key=lambda state: state.arrive_at, default=None)
+
+def _on_driver_event(event_name, data):
+    if event_name != "status":
+        return
+    reported_at = datetime.fromisoformat(data["status_updated_at"])
+    state = _current_drive_eta(data["id"], reported_at)
+    if state is not None:
+        state.apply_driver(data["status"], data.get("latitude"), data.get("longitude"), reported_at)
+
+def _build_drive_eta(drive, route):
+    state = DriveEta(drive, route)
+    driver = get_driver_location(drive.driver_id)
+    reported_at = datetime.fromisoformat(driver["status_updated_at"])
+    if _current_drive_eta(drive.driver_id, reported_at, extra=state) is state:
+        state.apply_driver(driver["status"], driver["latitude"], driver["longitude"], reported_at)
+    return state
+
+def get_drive_etas(drive_id):
+    """
+    Estimated arrival per routed stop of a drive, following the optimised
+    route from the driver's last reported position. Returns None if the drive
+    doesn't exist.
+    """
+    with _eta_lock:
+        if not _eta_listener["registered"]:
+            hub.add_listener("drivers", _on_driver_event)
+            _eta_listener["registered"] = True
+    state = eta_cache.get(drive_id)
+    if state is not None and time.monotonic() - state.checked_at < _eta_settings["recheck_seconds"]:
+        return state.to_json()
+    drive = db.session.get(Drive, drive_id)
+    if not drive:
+        eta_cache.invalidate(drive_id)
+        return None
+    route = get_drive_route(drive_id)
+    # a rescheduled, started or finished drive gets a fresh state like a rerouted one
+    if state is not None and state.route is route and state.arrive_at == _timestamp(drive.arrive_at) \
+            and state.status == drive.status:
+        state.checked_at = time.monotonic()
+        return state.to_json()
+    state = _build_drive_eta(drive, route)
+    eta_cache.set(drive_id, state)
+    _etas_by_driver.setdefault(state.driver_id, set()).add(drive_id)
+    return state.to_json()
+
+def get_stop_request_eta(stop_request_id):
+    drive_id = db.session.scalar(db.select(StopRequest.drive_id).filter_by(id=stop_request_id))
+    if drive_id is None:
+        return None
+    for stop in get_drive_etas(drive_id)["stops"]:
+        if stop["stop_request_id"] == stop_request_id:
+            return dict(stop, drive_id=drive_id)
+    # not confirmed yet, or the resident has no coordinates to route to
+    return {"stop_request_id": stop_request_id, "drive_id": drive_id, "sequence": None, "passed": False, "eta": None}
@@ -0,0 +1,68 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import union_all
+
+from App.models import Drive, DriveArchive, Resident, StopRequest, StopRequestArchive, Street
+from App.database import db
+
+EXPORT_ENTITIES = ('drives', 'stop-requests')
+
+def _entity_select(entity, drive, stop_request, since, until, status):
+    if entity == 'drives':
+        stmt = (
+            db.select(drive.id, drive.driver_id, drive.street_id, Street.name.label('street_name'),
+                      drive.arrive_at, drive.created_at, drive.status)
+            .join(Street, Street.id == drive.street_id)
+        )
+        column, status_column = drive.arrive_at, drive.status
+    elif entity == 'stop-requests':
+        stmt = (
+            db.select(stop_request.id, stop_request.drive_id, stop_request.resident_id,
+                      Resident.user_id.label('resident_user_id'), Resident.street_id,
+                      Street.name.label('street_name'), stop_request.address,
+                      stop_request.requested_at, stop_request.status)
+            .join(Resident, Resident.id == stop_request.resident_id)
+            .join(Street, Street.id == Resident.street_id)
+        )
+        column, status_column = stop_request.requested_at, stop_request.status
+    else:
+        raise ValueError(f"unknown export entity '{entity}', expected one of {', '.join(EXPORT_ENTITIES)}")
+    if since is not None:
+        stmt = stmt.filter(column >= since)
+    if until is not None:
+        stmt = stmt.filter(column < until)
+    if status is not None:
+        stmt = stmt.filter(status_column == status)
+    return stmt
+
+def _export_statement(entity, since=None, until=None, status=None, include_archived=False):
+    stmt = _entity_select(entity, Drive, StopRequest, since, until, status)
+    if not include_archived:
+        return stmt.order_by(stmt.selected_columns.id.asc())
+    # archived rows keep their ids, so the union is still one id-ordered sequence
+    combined = union_all(stmt, _entity_select(entity, DriveArchive, StopRequestArchive, since, until, status)).subquery()
+    return db.select(combined).order_by(combined.c.id.asc())
+
+def export_rows(entity, since=None, until=None, status=None, batch_size=1000, include_archived=False):
+    """
+    Yield plain dicts for every drive or stop request in the range, archived
+    ones too with include_archived. Rows are read through a server-side cursor
+    in batches of batch_size, so memory use does not grow with the size of the
+    table.
+    """
+    stmt = _export_statement(entity, since, until, status, include_archived)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for row in result:
+        yield {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in row._mapping.items()
+        }
+
+def export_ndjson(entity, since=None, until=None, status=None, batch_size=1000, include_archived=False):
+    # validate eagerly so callers get the error before streaming starts
+    _export_statement(entity)
+    def generate():
+        for row in export_rows(entity, since, until, status, batch_size, include_archived):
+            yield json.dumps(row) + '\n'
+    return generate()
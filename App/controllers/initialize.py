@@ -1,8 +1,10 @@
 from .user import create_user
+from App.models import Job
 from App.database import db
 
 
 def initialize():
-    db.drop_all()
+    # the job queue is kept: initialize itself runs as a job (see /init)
+    db.metadata.drop_all(db.engine, tables=[t for t in db.metadata.sorted_tables if t is not Job.__table__])
     db.create_all()
     create_user('bob', 'bobpass')
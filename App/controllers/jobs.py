@@ -0,0 +1,188 @@
+import json, logging, os, random, signal, socket, threading, traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, update
+
+from App.models import Drive, Job
+from App.database import db
+from App.pubsub import hub
+from .initialize import initialize
+from .notification import notify_street_residents
+
+logger = logging.getLogger(__name__)
+
+# Jobs are rows in the job table. A worker claims the oldest runnable job with
+# SELECT ... FOR UPDATE SKIP LOCKED (so concurrent workers never wait on each
+# other) and a conditional UPDATE (which is what keeps databases without row
+# locks, like sqlite, from handing one job to two workers). A failed job is
+# queued again with exponential backoff until it runs out of attempts. While a
+# job runs its worker renews the lease every third of JOB_LEASE_SECONDS, so only
+# a job whose worker died is claimable again once its lease has expired.
+
+JOB_STATUSES = ("QUEUED", "RUNNING", "SUCCEEDED", "FAILED")
+JOBS_TOPIC = "jobs"
+
+_job_settings = {
+    "max_attempts": 5,
+    "backoff_seconds": 10,
+    "backoff_max_seconds": 3600,
+    "lease_seconds": 600,
+    "poll_seconds": 1.0,
+}
+job_handlers = {}
+
+def configure_jobs(app):
+    _job_settings["max_attempts"] = app.config['JOB_MAX_ATTEMPTS']
+    _job_settings["backoff_seconds"] = app.config['JOB_BACKOFF_SECONDS']
+    _job_settings["backoff_max_seconds"] = app.config['JOB_BACKOFF_MAX_SECONDS']
+    _job_settings["lease_seconds"] = app.config['JOB_LEASE_SECONDS']
+    _job_settings["poll_seconds"] = app.config['JOB_POLL_SECONDS']
+
+def job_handler(kind):
+    """Register func(payload) -> JSON-serialisable result as the handler of kind."""
+    def register(func):
+        job_handlers[kind] = func
+        return func
+    return register
+
+def enqueue_job(kind, payload=None, run_at=None, max_attempts=None):
+    """Queue a job and commit; returns the Job. Workers are woken through the hub."""
+    if kind not in job_handlers:
+        raise ValueError(f"unknown job kind '{kind}', expected one of {', '.join(sorted(job_handlers))}")
+    job = Job(kind=kind, payload=json.dumps(payload or {}), run_at=run_at or datetime.utcnow(),
+              max_attempts=max_attempts or _job_settings["max_attempts"])
+    db.session.add(job)
+    db.session.commit()
+    hub.publish(db.session, [JOBS_TOPIC], "queued", {"id": job.id, "kind": kind})
+    return job
+
+def get_job(job_id):
+    return db.session.get(Job, job_id)
+
+def _backoff(attempts):
+    delay = min(_job_settings["backoff_seconds"] * 2 ** (attempts - 1), _job_settings["backoff_max_seconds"])
+    # jitter, so jobs that failed together don't all retry together
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+def claim_job(worker_id):
+    """Mark the next runnable job RUNNING for worker_id and return it, or None."""
+    now = datetime.utcnow()
+    runnable = or_(
+        and_(Job.status == "QUEUED", Job.run_at <= now),
+        and_(Job.status == "RUNNING", Job.locked_at < now - timedelta(seconds=_job_settings["lease_seconds"])),
+    )
+    while True:
+        candidate = db.session.execute(
+            db.select(Job.id, Job.status, Job.attempts).filter(runnable)
+            .order_by(Job.run_at, Job.id).limit(1).with_for_update(skip_locked=True)
+        ).first()
+        if candidate is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(Job).where(Job.id == candidate.id, Job.status == candidate.status,
+                              Job.attempts == candidate.attempts)
+            .values(status="RUNNING", locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, candidate.id)
+        # another worker got there between our read and our write: look again
+
+def _renew_lease(engine, job_id, worker_id, stop):
+    # on a connection of its own, so the handler's transactions are left alone
+    while not stop.wait(_job_settings["lease_seconds"] / 3):
+        try:
+            with engine.begin() as conn:
+                renewed = conn.execute(
+                    update(Job.__table__)
+                    .where(Job.id == job_id, Job.status == "RUNNING", Job.locked_by == worker_id)
+                    .values(locked_at=datetime.utcnow())
+                ).rowcount
+        except Exception:
+            logger.exception("could not renew the lease on job %s", job_id)
+            continue
+        if not renewed:
+            logger.warning("job %s is no longer leased to %s", job_id, worker_id)
+            return
+
+def run_job(job):
+    """Run a claimed job's handler and record the outcome; returns the job's new status."""
+    job_id, kind, attempts, max_attempts = job.id, job.kind, job.attempts, job.max_attempts
+    payload = json.loads(job.payload)
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_renew_lease, args=(db.engine, job_id, job.locked_by, stop),
+                                 name=f"job-{job_id}-lease", daemon=True)
+    db.session.commit()
+    heartbeat.start()
+    try:
+        result = job_handlers[kind](payload)
+    except Exception as error:
+        db.session.rollback()
+        logger.warning("job %s (%s) failed on attempt %d/%d: %s", job_id, kind, attempts, max_attempts, error)
+        values = {"last_error": "".join(traceback.format_exception_only(type(error), error)).strip(),
+                  "locked_by": None}
+        if attempts < max_attempts:
+            values.update(status="QUEUED", run_at=datetime.utcnow() + _backoff(attempts))
+        else:
+            values.update(status="FAILED", finished_at=datetime.utcnow())
+    else:
+        values = {"status": "SUCCEEDED", "result": json.dumps(result), "finished_at": datetime.utcnow(),
+                  "locked_by": None, "last_error": None}
+    finally:
+        stop.set()
+        heartbeat.join()
+    db.session.execute(update(Job).where(Job.id == job_id).values(**values)
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+    return values["status"]
+
+def work(worker_id=None, burst=False, max_jobs=None, stop=None):
+    """
+    Claim and run jobs until stop (a threading.Event) is set, max_jobs have
+    run, or with burst, until nothing is runnable. Returns a count per outcome.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or threading.Event()
+    subscription = hub.subscribe(JOBS_TOPIC)
+    done = {"SUCCEEDED": 0, "QUEUED": 0, "FAILED": 0}
+    try:
+        while not stop.is_set() and (max_jobs is None or sum(done.values()) < max_jobs):
+            job = claim_job(worker_id)
+            if job is None:
+                if burst:
+                    break
+                # woken early when a job is queued; the timeout picks up retries and other processes' jobs
+                subscription.get(timeout=_job_settings["poll_seconds"])
+                continue
+            done[run_job(job)] += 1
+    finally:
+        subscription.close()
+        db.session.remove()
+    return done
+
+def stop_on_signals(stop):
+    """Finish the running job, then stop, on SIGTERM or SIGINT."""
+    def handle(signum, frame):
+        logger.info("signal %d: stopping after the current job", signum)
+        stop.set()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, handle)
+
+
+# ---- handlers ----
+
+@job_handler("initialize")
+def _initialize_job(payload):
+    initialize()
+    return {"message": "db initialized!"}
+
+@job_handler("notify_drives")
+def _notify_drives(payload):
+    kind = payload["kind"]
+    notified = notify_street_residents(payload["drive_ids"], kind, payload["change_id"])
+    drives = db.session.scalars(db.select(Drive).filter(Drive.id.in_(payload["drive_ids"]))).all()
+    # residents with the street open hear about it straight away too
+    hub.publish_many(db.session, [([f"street:{d.street_id}"], kind.lower(), d.get_json()) for d in drives])
+    return {"notified": notified}
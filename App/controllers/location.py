@@ -0,0 +1,271 @@
+import atexit, logging, threading, time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import Float, DateTime, Integer, String, and_, bindparam, column, values
+
+from App.models import Driver
+from App.database import db
+from App.pubsub import hub
+
+logger = logging.getLogger(__name__)
+
+# ---- write-behind location pings ----
+# Drivers' apps report their position every few seconds. A ping only replaces
+# the driver's entry in this worker's buffer; a background flush writes the
+# latest ping of every driver that moved in one batched UPDATE per interval, so
+# a driver pinging ten times between flushes costs one row write. Each row is
+# guarded by status_updated_at, so an older ping (from this worker or another)
+# never overwrites a newer position or status. Reads are answered from the
+# buffer, which also keeps the last known state of drivers it has seen for up
+# to LOCATION_CACHE_SECONDS; after that it is read from the database again, so
+# other workers' writes show up even without LISTEN/NOTIFY.
+
+_location_settings = {"flush_seconds": 2.0, "batch_size": 500, "app": None}
+
+
+class LocationBuffer:
+    """
+    Latest known state per driver, plus the ids whose ping isn't written yet.
+    At most maxsize states are kept, least recently stored dropped first, and
+    one stored more than ttl seconds ago reads as unknown. Unwritten pings are
+    never dropped or expired.
+    """
+
+    def __init__(self, maxsize=10000, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._latest = OrderedDict()
+        self._stored_at = {}
+        self._pending = set()
+        self.pings = 0
+        self.written = 0
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._evict()
+
+    def _store(self, state):
+        self._latest[state["id"]] = state
+        self._latest.move_to_end(state["id"])
+        self._stored_at[state["id"]] = time.monotonic()
+        self._evict()
+
+    def _evict(self):
+        while len(self._latest) > self.maxsize:
+            driver_id = next((key for key in self._latest if key not in self._pending), None)
+            if driver_id is None:
+                return
+            del self._latest[driver_id], self._stored_at[driver_id]
+
+    def record(self, state):
+        with self._lock:
+            current = self._latest.get(state["id"])
+            if current is not None and current["status_updated_at"] > state["status_updated_at"]:
+                return False
+            self._pending.add(state["id"])
+            self._store(state)
+            self.pings += 1
+            return True
+
+    def remember(self, state):
+        # a committed state, e.g. from a status change or another worker's flush
+        with self._lock:
+            current = self._latest.get(state["id"])
+            if current is not None and current["status_updated_at"] > state["status_updated_at"]:
+                if state["id"] in self._pending:
+                    # our unwritten ping is newer, but the status is news to us
+                    current["status"] = state["status"]
+                return
+            self._pending.discard(state["id"])
+            self._store(state)
+
+    def get(self, driver_id):
+        with self._lock:
+            state = self._latest.get(driver_id)
+            if state is None:
+                return None
+            if driver_id not in self._pending and time.monotonic() - self._stored_at[driver_id] > self.ttl:
+                del self._latest[driver_id], self._stored_at[driver_id]
+                return None
+            return dict(state)
+
+    def take_pending(self):
+        with self._lock:
+            pending = [dict(self._latest[driver_id]) for driver_id in self._pending]
+            self._pending.clear()
+            return pending
+
+    def restore_pending(self, states):
+        # a flush failed: put its pings back unless a newer one arrived meanwhile
+        with self._lock:
+            for state in states:
+                if self._latest.get(state["id"], state)["status_updated_at"] <= state["status_updated_at"]:
+                    self._pending.add(state["id"])
+                    self._store(state)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def clear(self):
+        with self._lock:
+            self._latest.clear()
+            self._stored_at.clear()
+            self._pending.clear()
+            self.pings = self.written = 0
+
+
+location_buffer = LocationBuffer()
+_flusher = {"thread": None, "stop": threading.Event(), "listening": False, "registered": False}
+_flusher_lock = threading.Lock()
+_flush_lock = threading.Lock()
+
+def configure_location_buffer(app):
+    _location_settings["flush_seconds"] = app.config['LOCATION_FLUSH_SECONDS']
+    _location_settings["batch_size"] = app.config['LOCATION_FLUSH_BATCH_SIZE']
+    _location_settings["app"] = app
+    location_buffer.clear()
+    location_buffer.configure(maxsize=app.config['LOCATION_CACHE_SIZE'], ttl=app.config['LOCATION_CACHE_SECONDS'])
+    if not _flusher["registered"]:
+        atexit.register(flush_location_buffer)
+        _flusher["registered"] = True
+
+def _driver_state(driver):
+    return {
+        "id": driver.id,
+        "user_id": driver.user_id,
+        "status": driver.status,
+        "location": driver.location,
+        "latitude": driver.latitude,
+        "longitude": driver.longitude,
+        "status_updated_at": driver.status_updated_at,
+    }
+
+def _state_json(state):
+    return dict(state, status_updated_at=state["status_updated_at"].isoformat())
+
+def _on_driver_event(event_name, data):
+    if event_name == "status":
+        location_buffer.remember(dict(data, status_updated_at=datetime.fromisoformat(data["status_updated_at"])))
+
+def _start_buffering():
+    thread = _flusher["thread"]
+    if _flusher["listening"] and thread is not None and thread.is_alive():
+        return
+    with _flusher_lock:
+        if not _flusher["listening"]:
+            hub.add_listener("drivers", _on_driver_event)
+            _flusher["listening"] = True
+        thread = _flusher["thread"]
+        if thread is None or not thread.is_alive():
+            _flusher["stop"].clear()
+            thread = threading.Thread(target=_flush_periodically, name="location-flush", daemon=True)
+            _flusher["thread"] = thread
+            thread.start()
+
+def _flush_periodically():
+    while not _flusher["stop"].wait(_location_settings["flush_seconds"]):
+        try:
+            flush_location_buffer()
+        except Exception:
+            logger.exception("flushing driver locations failed")
+
+def stop_location_flusher():
+    """Stop the background flush and write whatever is still buffered."""
+    _flusher["stop"].set()
+    thread = _flusher["thread"]
+    if thread is not None and thread is not threading.current_thread():
+        thread.join(_location_settings["flush_seconds"] + 5)
+    flush_location_buffer()
+
+def record_driver_location(driver_id, latitude, longitude, location=None, reported_at=None):
+    """
+    Buffer a position ping; it is written at the next flush. Returns the
+    driver's state as readers will now see it, or None if there's no such driver.
+    """
+    _start_buffering()
+    state = location_buffer.get(driver_id)
+    if state is None:
+        driver = db.session.get(Driver, driver_id)
+        if driver is None:
+            return None
+        state = _driver_state(driver)
+    state.update(latitude=latitude, longitude=longitude,
+                 status_updated_at=reported_at or datetime.utcnow())
+    if location:
+        state["location"] = location
+    location_buffer.record(state)
+    return _state_json(location_buffer.get(driver_id))
+
+def get_driver_location(driver_id):
+    """The driver's latest position and status, buffered pings included; None if unknown."""
+    state = location_buffer.get(driver_id)
+    if state is None:
+        driver = db.session.get(Driver, driver_id)
+        if driver is None:
+            return None
+        state = _driver_state(driver)
+        if _flusher["listening"]:
+            location_buffer.remember(state)
+    return _state_json(state)
+
+def _write_locations(states):
+    table = Driver.__table__
+    if db.session.get_bind().dialect.name == "postgresql":
+        # one statement per batch: UPDATE driver ... FROM (VALUES ...) AS ping
+        ping = values(
+            column("driver_id", Integer), column("latitude", Float), column("longitude", Float),
+            column("location", String), column("reported_at", DateTime), name="ping",
+        ).data([(s["id"], s["latitude"], s["longitude"], s["location"], s["status_updated_at"]) for s in states])
+        stmt = table.update().where(
+            table.c.id == ping.c.driver_id, table.c.status_updated_at < ping.c.reported_at
+        ).values(latitude=ping.c.latitude, longitude=ping.c.longitude,
+                 location=ping.c.location, status_updated_at=ping.c.reported_at)
+        return db.session.execute(stmt).rowcount
+    # elsewhere one executemany of the same guarded UPDATE
+    stmt = table.update().where(
+        and_(table.c.id == bindparam("ping_id"), table.c.status_updated_at < bindparam("ping_at"))
+    ).values(latitude=bindparam("ping_latitude"), longitude=bindparam("ping_longitude"),
+             location=bindparam("ping_location"), status_updated_at=bindparam("ping_at"))
+    rows = [{"ping_id": s["id"], "ping_latitude": s["latitude"], "ping_longitude": s["longitude"],
+             "ping_location": s["location"], "ping_at": s["status_updated_at"]} for s in states]
+    return db.session.connection().execute(stmt, rows).rowcount
+
+def _flush_batch(states):
+    written = _write_locations(states)
+    # publish what was committed, which for a driver whose row was newer
+    # than the ping is that newer state
+    drivers = db.session.scalars(db.select(Driver).filter(Driver.id.in_([s["id"] for s in states]))).all()
+    db.session.commit()
+    hub.publish_many(db.session, [(["drivers", f"driver:{driver.id}"], "status", driver.get_json())
+                                  for driver in drivers])
+    return written
+
+def flush_location_buffer():
+    """Write every buffered ping in batched UPDATEs; returns how many rows changed."""
+    app = _location_settings["app"]
+    if app is None:
+        # not configured yet: the pings stay buffered rather than being taken and lost
+        return 0
+    pending = location_buffer.take_pending()
+    if not pending:
+        return 0
+    written = 0
+    batch_size = _location_settings["batch_size"]
+    with _flush_lock, app.app_context():
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            try:
+                written += _flush_batch(batch)
+            except Exception:
+                db.session.rollback()
+                location_buffer.restore_pending(pending[start:])
+                raise
+    location_buffer.written += written
+    return written
@@ -0,0 +1,116 @@
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import and_, false, insert, literal, or_, select, true
+
+from App.models import Drive, Notification, NOTIFICATION_MESSAGES, Resident
+from App.database import db
+
+# Notifications are written once per drive change for everyone on the street,
+# by a single INSERT ... SELECT over the street's residents, so a fan-out costs
+# the same three statements however many residents there are. The inbox then
+# reads a resident's own rows off the (resident_id, read, created_at) index.
+
+NOTIFICATION_KINDS = tuple(NOTIFICATION_MESSAGES)
+
+INBOX_COLUMNS = (Notification.id, Notification.drive_id, Notification.street_id, Notification.kind,
+                 Notification.arrive_at, Notification.read, Notification.created_at)
+
+def new_change_id():
+    """An id for one change to a set of drives, made when the change is and passed to notify_street_residents."""
+    return uuid4().hex
+
+def notify_street_residents(drive_ids, kind, change_id):
+    """
+    Add a kind notification for every resident on the street of each of
+    drive_ids, and commit. Drives whose residents were already told about
+    change_id are skipped, so running it twice (a retried job) notifies nobody
+    twice, while a drive moved back and forth is announced every time.
+    Returns the rows written.
+    """
+    if kind not in NOTIFICATION_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(NOTIFICATION_KINDS)}")
+    # locking the drives keeps two fan-outs for the same change from both passing the check below
+    drive_ids = set(db.session.scalars(
+        select(Drive.id).filter(Drive.id.in_(drive_ids)).with_for_update()
+    ).all())
+    drive_ids -= set(db.session.scalars(
+        select(Notification.drive_id).distinct()
+        .filter(Notification.drive_id.in_(drive_ids), Notification.change_id == change_id)
+    ).all())
+    if not drive_ids:
+        db.session.commit()
+        return 0
+    result = db.session.execute(
+        insert(Notification).from_select(
+            ["resident_id", "drive_id", "street_id", "kind", "arrive_at", "read", "created_at", "change_id"],
+            select(Resident.id, Drive.id, Drive.street_id, literal(kind), Drive.arrive_at, false(),
+                   literal(datetime.utcnow(), db.DateTime), literal(change_id))
+            .join(Drive, Drive.street_id == Resident.street_id)
+            .filter(Drive.id.in_(drive_ids))
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+def _inbox_json(row):
+    return {
+        "id": row.id,
+        "drive_id": row.drive_id,
+        "street_id": row.street_id,
+        "kind": row.kind,
+        "message": NOTIFICATION_MESSAGES[row.kind].format(row.arrive_at),
+        "arrive_at": row.arrive_at.isoformat(),
+        "read": row.read,
+        "created_at": row.created_at.isoformat()
+    }
+
+def _cursor(row):
+    return f"{int(row.read)}_{row.created_at.isoformat()}_{row.id}"
+
+def parse_inbox_cursor(cursor):
+    """(read, created_at, id) from a cursor returned by get_inbox, or None if it is malformed."""
+    try:
+        read, created_at, id = cursor.split("_")
+        return bool(int(read)), datetime.fromisoformat(created_at), int(id)
+    except ValueError:
+        return None
+
+def get_inbox(resident_id, limit=50, after=None):
+    """
+    A page of the resident's notifications, unread first and newest first
+    within each, with the unread count. after is the (read, created_at, id)
+    of the last notification on the previous page (keyset pagination).
+    """
+    stmt = (
+        select(*INBOX_COLUMNS).filter(Notification.resident_id == resident_id)
+        .order_by(Notification.read.asc(), Notification.created_at.desc(), Notification.id.desc())
+        .limit(limit + 1)
+    )
+    if after is not None:
+        read, created_at, id = after
+        older = or_(Notification.created_at < created_at,
+                    and_(Notification.created_at == created_at, Notification.id < id))
+        # past an unread notification come the older unread ones and then every read one
+        stmt = stmt.filter(and_(Notification.read == true(), older) if read else or_(Notification.read == true(), older))
+    rows = db.session.execute(stmt).all()
+    return {
+        "notifications": [_inbox_json(row) for row in rows[:limit]],
+        "unread": get_unread_count(resident_id),
+        "next": _cursor(rows[limit - 1]) if len(rows) > limit else None
+    }
+
+def get_unread_count(resident_id):
+    return db.session.scalar(
+        select(db.func.count()).select_from(Notification)
+        .filter(Notification.resident_id == resident_id, Notification.read == false())
+    )
+
+def mark_notifications_read(resident_id, notification_ids=None):
+    """Mark the resident's notifications (all of them by default) read; returns how many changed."""
+    stmt = db.update(Notification).filter(Notification.resident_id == resident_id, Notification.read == false())
+    if notification_ids is not None:
+        stmt = stmt.filter(Notification.id.in_(notification_ids))
+    result = db.session.execute(stmt.values(read=True).execution_options(synchronize_session=False))
+    db.session.commit()
+    return result.rowcount
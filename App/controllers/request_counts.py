@@ -0,0 +1,163 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import get_history
+
+from App.models import Drive, StopRequest, Street
+from App.database import db
+
+# Drive.pending_requests/confirmed_requests/total_requests count the drive's
+# stop requests. ORM writes to StopRequest are noted per flush and applied as
+# relative UPDATEs (count = count + delta) in the same transaction, so
+# concurrent writers never lose each other's changes. Set-based writes that
+# bypass the ORM call adjust_request_counts themselves. Counter changes don't
+# bump the drive table version: they always come with a stop_request write.
+
+COUNTED_STATUSES = {"PENDING": "pending_requests", "CONFIRMED": "confirmed_requests"}
+COUNTER_COLUMNS = ("pending_requests", "confirmed_requests", "total_requests")
+
+DRIVES = Drive.__table__
+REQUESTS = StopRequest.__table__
+
+def request_count_deltas(status, sign=1):
+    """The counter changes for adding (sign=1) or removing (sign=-1) one request with status."""
+    deltas = Counter(total_requests=sign)
+    if status in COUNTED_STATUSES:
+        deltas[COUNTED_STATUSES[status]] += sign
+    return deltas
+
+def adjust_request_counts(connection, deltas):
+    """Apply {drive_id: {column: delta}} as relative UPDATEs, one per drive."""
+    # a fixed order keeps concurrent adjustments from deadlocking on the drive rows
+    for drive_id in sorted(deltas):
+        values = {column: DRIVES.c[column] + delta for column, delta in deltas[drive_id].items() if delta}
+        if values:
+            connection.execute(DRIVES.update().where(DRIVES.c.id == drive_id).values(**values))
+
+def _note(session, drive_id, status, sign):
+    pending = session.info.setdefault("request_count_deltas", {})
+    pending.setdefault(drive_id, Counter()).update(request_count_deltas(status, sign))
+
+def _previous(target, attribute):
+    history = get_history(target, attribute)
+    return history.deleted[0] if history.deleted else getattr(target, attribute)
+
+def _count_inserted(mapper, connection, target):
+    _note(object_session(target), target.drive_id, target.status, 1)
+
+def _count_updated(mapper, connection, target):
+    before = (_previous(target, "drive_id"), _previous(target, "status"))
+    if before != (target.drive_id, target.status):
+        session = object_session(target)
+        _note(session, before[0], before[1], -1)
+        _note(session, target.drive_id, target.status, 1)
+
+def _count_deleted(mapper, connection, target):
+    _note(object_session(target), _previous(target, "drive_id"), _previous(target, "status"), -1)
+
+def _keep_previous(target, value, oldvalue, initiator):
+    pass
+
+# load the old value when one of these is set on an expired request, so its
+# history still says which counter to take it off
+for _attribute in (StopRequest.drive_id, StopRequest.status):
+    event.listen(_attribute, "set", _keep_previous, active_history=True)
+
+event.listen(StopRequest, "after_insert", _count_inserted)
+event.listen(StopRequest, "after_update", _count_updated)
+event.listen(StopRequest, "after_delete", _count_deleted)
+
+@event.listens_for(Session, "after_flush")
+def _apply_request_counts(session, flush_context):
+    deltas = session.info.pop("request_count_deltas", None)
+    if deltas:
+        adjust_request_counts(session.connection(), deltas)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_request_counts(session):
+    session.info.pop("request_count_deltas", None)
+
+
+def _actual_counts(drive_ids):
+    # what the counters should be, straight from stop_request
+    return (
+        select(
+            REQUESTS.c.drive_id,
+            func.sum(case((REQUESTS.c.status == "PENDING", 1), else_=0)).label("pending_requests"),
+            func.sum(case((REQUESTS.c.status == "CONFIRMED", 1), else_=0)).label("confirmed_requests"),
+            func.count().label("total_requests"),
+        )
+        .where(REQUESTS.c.drive_id.in_(drive_ids))
+        .group_by(REQUESTS.c.drive_id)
+    )
+
+def recount_requests(connection, drive_ids=None):
+    """Set the counters of drive_ids (all drives by default) from their stop requests, e.g. after a bulk load."""
+    def count(condition=None):
+        stmt = select(func.count()).where(REQUESTS.c.drive_id == DRIVES.c.id)
+        return stmt.where(condition).scalar_subquery() if condition is not None else stmt.scalar_subquery()
+    stmt = DRIVES.update()
+    if drive_ids is not None:
+        stmt = stmt.where(DRIVES.c.id.in_(drive_ids))
+    connection.execute(
+        stmt.values(
+            pending_requests=count(REQUESTS.c.status == "PENDING"),
+            confirmed_requests=count(REQUESTS.c.status == "CONFIRMED"),
+            total_requests=count(),
+        )
+    )
+
+def reconcile_request_counts(repair=True, chunk_size=1000):
+    """
+    Compare every drive's counters with its stop requests, chunk_size drives
+    per transaction, and with repair reset the ones that drifted. Returns a
+    report with the number of drives checked and the drifted ones.
+    """
+    report = {'checked': 0, 'drifted': [], 'repaired': 0}
+    last_id = 0
+    while True:
+        drive_ids = db.session.scalars(
+            select(Drive.id).filter(Drive.id > last_id).order_by(Drive.id).limit(chunk_size)
+        ).all()
+        if not drive_ids:
+            break
+        last_id = drive_ids[-1]
+        report['checked'] += len(drive_ids)
+        actual = _actual_counts(drive_ids).subquery()
+        stored = db.session.execute(
+            select(DRIVES.c.id, *(DRIVES.c[column] for column in COUNTER_COLUMNS),
+                   *(func.coalesce(actual.c[column], 0) for column in COUNTER_COLUMNS))
+            .select_from(DRIVES.outerjoin(actual, actual.c.drive_id == DRIVES.c.id))
+            .where(DRIVES.c.id.in_(drive_ids))
+        ).all()
+        drifted = [
+            {'drive_id': row[0], 'stored': list(row[1:4]), 'actual': list(row[4:7])}
+            for row in stored if tuple(row[1:4]) != tuple(row[4:7])
+        ]
+        report['drifted'].extend(drifted)
+        if repair and drifted:
+            ids = [d['drive_id'] for d in drifted]
+            # wait for writers holding these drives, so the recount sees their requests
+            db.session.execute(select(Drive.id).filter(Drive.id.in_(ids)).with_for_update()).all()
+            recount_requests(db.session.connection(), ids)
+            report['repaired'] += len(ids)
+        db.session.commit()
+    return report
+
+def get_driver_day(driver_id, day=None):
+    """
+    A driver's drives arriving on day (today by default) with street names
+    and request counts: one query on the (driver_id, arrive_at) index, however
+    many stop requests the drives have.
+    """
+    start = datetime.combine(day or datetime.utcnow().date(), datetime.min.time())
+    rows = db.session.execute(
+        select(Drive.id, Drive.street_id, Street.name.label("street_name"), Drive.arrive_at, Drive.status,
+               Drive.pending_requests, Drive.confirmed_requests, Drive.total_requests)
+        .join(Street, Street.id == Drive.street_id)
+        .filter(Drive.driver_id == driver_id, Drive.arrive_at >= start, Drive.arrive_at < start + timedelta(days=1))
+        .order_by(Drive.arrive_at.asc())
+    ).mappings()
+    return [dict(row, arrive_at=row["arrive_at"].isoformat()) for row in rows]
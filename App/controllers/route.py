@@ -0,0 +1,74 @@
+import time
+
+from App.models import Drive, Driver, Resident, StopRequest
+from App.database import db
+from App.cache import LRUCache
+
+# Optimised routes keyed by drive. An entry is reused for as long as the
+# drive's confirmed stops (and their coordinates) are unchanged.
+route_cache = LRUCache(maxsize=256)
+_route_settings = {"time_budget": 0.5}
+
+def configure_route_optimizer(app):
+    route_cache.configure(maxsize=app.config['ROUTE_CACHE_SIZE'])
+    _route_settings["time_budget"] = app.config['ROUTE_TIME_BUDGET']
+
+def _confirmed_stops(drive_id):
+    return db.session.execute(
+        db.select(StopRequest.id, StopRequest.address, Resident.latitude, Resident.longitude)
+        .join(Resident, Resident.id == StopRequest.resident_id)
+        .filter(StopRequest.drive_id == drive_id, StopRequest.status == "CONFIRMED")
+        .order_by(StopRequest.id.asc())
+    ).all()
+
+def get_drive_route(drive_id, time_budget=None):
+    """
+    Visiting order for a drive's CONFIRMED stop requests, starting from the
+    driver's position when it is known. Stops whose resident has no
+    coordinates can't be placed and are listed separately as unrouted.
+    Returns None if the drive doesn't exist.
+    """
+    drive = db.session.get(Drive, drive_id)
+    if not drive:
+        return None
+    stops = _confirmed_stops(drive_id)
+    signature = tuple(stops)
+    cached = route_cache.get(drive_id)
+    if cached is not None and cached["signature"] == signature:
+        return cached["route"]
+
+    located = [stop for stop in stops if stop.latitude is not None and stop.longitude is not None]
+    unrouted = [stop for stop in stops if stop.latitude is None or stop.longitude is None]
+    driver = db.session.get(Driver, drive.driver_id)
+    start = None
+    if driver.latitude is not None and driver.longitude is not None:
+        start = (driver.latitude, driver.longitude)
+
+    # NumPy is only loaded once a route is actually optimised
+    from App.routing import optimize_route
+    began = time.perf_counter()
+    order, meters = optimize_route(
+        [stop.latitude for stop in located],
+        [stop.longitude for stop in located],
+        start=start,
+        time_budget=_route_settings["time_budget"] if time_budget is None else time_budget
+    )
+    route = {
+        "drive_id": drive_id,
+        "start": {"latitude": start[0], "longitude": start[1]} if start else None,
+        "stops": [
+            {
+                "sequence": sequence,
+                "stop_request_id": located[index].id,
+                "address": located[index].address,
+                "latitude": located[index].latitude,
+                "longitude": located[index].longitude
+            }
+            for sequence, index in enumerate(order, start=1)
+        ],
+        "unrouted": [{"stop_request_id": stop.id, "address": stop.address} for stop in unrouted],
+        "distance_m": round(meters, 1),
+        "optimized_ms": round((time.perf_counter() - began) * 1000, 2)
+    }
+    route_cache.set(drive_id, {"signature": signature, "route": route})
+    return route
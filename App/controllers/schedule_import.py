@@ -0,0 +1,232 @@
+import csv, json, time
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from App.models import Drive, Driver, Resident, Street, User
+from App.database import db
+from .booking import describe_conflicts, load_booking_index
+from .drive import invalidate_street_drives
+from .jobs import enqueue_job
+from .notification import new_change_id
+
+IMPORT_ROW_TYPES = ('street', 'resident', 'drive')
+DRIVE_STATUSES = ('SCHEDULED', 'EN_ROUTE', 'ARRIVED', 'COMPLETE', 'CANCELLED')
+
+def read_schedule_file(path):
+    """
+    Yield one dict per row of a .csv (with a header) or .jsonl schedule file.
+    Every row has a "type" of street, resident or drive:
+      street:   name
+      resident: username, street, address, [latitude, longitude]
+      drive:    driver (driver id or username), street, arrive_at, [status]
+    """
+    with open(path, newline='') as f:
+        if path.endswith('.jsonl') or path.endswith('.ndjson'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+def _parse_arrival(value):
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+def _parse_coordinates(latitude, longitude):
+    # (None, None) when both are blank, None when invalid
+    if not latitude and not longitude:
+        return (None, None)
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except ValueError:
+        return None
+    if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+        return (latitude, longitude)
+    return None
+
+def _field(row, name):
+    value = row.get(name)
+    return str(value).strip() if value is not None else ''
+
+class _ScheduleImport:
+
+    def __init__(self):
+        # one query each up front; new streets are added to the map as they are inserted
+        self.streets = {name.lower(): id for id, name in db.session.execute(db.select(Street.id, Street.name))}
+        self.drivers, self.driver_users = {}, set()
+        for driver_id, user_id, username in db.session.execute(
+                db.select(Driver.id, Driver.user_id, User.username).join(User, User.id == Driver.user_id)):
+            self.drivers[str(driver_id)] = driver_id
+            self.drivers[username.lower()] = driver_id
+            self.driver_users.add(user_id)
+        self.inserted = {row_type: 0 for row_type in IMPORT_ROW_TYPES}
+        self.rejected = []
+
+    def reject(self, line, reason):
+        self.rejected.append({'line': line, 'reason': reason})
+
+    def run_chunk(self, chunk):
+        rejected_before = len(self.rejected)
+        rows = {row_type: [] for row_type in IMPORT_ROW_TYPES}
+        for line, row in chunk:
+            row_type = _field(row, 'type').lower()
+            if row_type not in IMPORT_ROW_TYPES:
+                self.reject(line, f"type must be one of {', '.join(IMPORT_ROW_TYPES)}")
+            else:
+                rows[row_type].append((line, row))
+        new_streets = []
+        try:
+            new_streets = self.insert_streets(rows['street'])
+            residents = self.validate_residents(rows['resident'])
+            drives = self.validate_drives(rows['drive'])
+            if residents:
+                db.session.execute(insert(Resident), residents)
+            scheduled = []
+            if drives:
+                inserted = db.session.execute(insert(Drive).returning(Drive.id, Drive.status), drives)
+                scheduled = [id for id, status in inserted if status == 'SCHEDULED']
+            if scheduled:
+                # committed with the chunk; a worker tells the streets' residents
+                enqueue_job("notify_drives", {"drive_ids": scheduled, "kind": "DRIVE_SCHEDULED",
+                                              "change_id": new_change_id()})
+            else:
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for name in new_streets:
+                self.streets.pop(name, None)
+            del self.rejected[rejected_before:]
+            for line, row in chunk:
+                self.reject(line, f"chunk rolled back: {e.__class__.__name__}")
+            return
+        self.inserted['street'] += len(new_streets)
+        self.inserted['resident'] += len(residents)
+        self.inserted['drive'] += len(drives)
+        # bulk inserts skip the Drive mapper events, so invalidate by hand
+        invalidate_street_drives({drive['street_id'] for drive in drives})
+
+    def insert_streets(self, rows):
+        names = {}
+        for line, row in rows:
+            name = _field(row, 'name')
+            if not name:
+                self.reject(line, "street name is required")
+            elif name.lower() in self.streets or name.lower() in names:
+                self.reject(line, f"street '{name}' already exists")
+            else:
+                names[name.lower()] = name
+        if names:
+            inserted = db.session.execute(insert(Street).returning(Street.id, Street.name),
+                                          [{'name': name} for name in names.values()])
+            for id, name in inserted:
+                self.streets[name.lower()] = id
+        return list(names)
+
+    def validate_residents(self, rows):
+        usernames = {_field(row, 'username').lower() for line, row in rows}
+        users = {}
+        if usernames:
+            users = {
+                username.lower(): (id, resident_id)
+                for id, username, resident_id in db.session.execute(
+                    db.select(User.id, User.username, Resident.id)
+                    .outerjoin(Resident, Resident.user_id == User.id)
+                    .filter(db.func.lower(User.username).in_(usernames)))
+            }
+        residents, seen = [], set()
+        for line, row in rows:
+            username, street, address = _field(row, 'username'), _field(row, 'street'), _field(row, 'address')
+            user = users.get(username.lower())
+            coordinates = _parse_coordinates(_field(row, 'latitude'), _field(row, 'longitude'))
+            if not username or not street or not address:
+                self.reject(line, "resident rows need username, street and address")
+            elif user is None:
+                self.reject(line, f"unknown user '{username}'")
+            elif user[1] is not None or user[0] in seen:
+                self.reject(line, f"user '{username}' is already a resident")
+            elif user[0] in self.driver_users:
+                self.reject(line, f"user '{username}' is a driver")
+            elif street.lower() not in self.streets:
+                self.reject(line, f"unknown street '{street}'")
+            elif coordinates is None:
+                self.reject(line, "latitude and longitude must be given together as degrees")
+            else:
+                seen.add(user[0])
+                residents.append({'user_id': user[0], 'street_id': self.streets[street.lower()], 'address': address,
+                                  'latitude': coordinates[0], 'longitude': coordinates[1]})
+        return residents
+
+    def validate_drives(self, rows):
+        now = datetime.utcnow()
+        drives, lines = [], []
+        for line, row in rows:
+            driver, street = _field(row, 'driver').lower(), _field(row, 'street').lower()
+            arrive_at = _parse_arrival(_field(row, 'arrive_at'))
+            status = _field(row, 'status').upper() or 'SCHEDULED'
+            if driver not in self.drivers:
+                self.reject(line, f"unknown driver '{_field(row, 'driver')}'")
+            elif street not in self.streets:
+                self.reject(line, f"unknown street '{_field(row, 'street')}'")
+            elif arrive_at is None:
+                self.reject(line, "arrive_at must be YYYY-MM-DD HH:MM")
+            elif arrive_at <= now:
+                self.reject(line, "arrive_at must be in the future")
+            elif status not in DRIVE_STATUSES:
+                self.reject(line, f"status must be one of {', '.join(DRIVE_STATUSES)}")
+            else:
+                drives.append({'driver_id': self.drivers[driver], 'street_id': self.streets[street],
+                               'arrive_at': arrive_at, 'status': status})
+                lines.append(line)
+        return self.check_bookings(drives, lines)
+
+    def check_bookings(self, drives, lines):
+        # one query loads the chunk's drivers' bookings; each row then costs two bisects
+        booking = [drive for drive in drives if drive['status'] != 'CANCELLED']
+        if not booking:
+            return drives
+        index = load_booking_index({drive['driver_id'] for drive in booking},
+                                   min(drive['arrive_at'] for drive in booking),
+                                   max(drive['arrive_at'] for drive in booking))
+        accepted = []
+        for line, drive in zip(lines, drives):
+            if drive['status'] != 'CANCELLED':
+                conflicts = index.overlapping(drive['driver_id'], drive['arrive_at'])
+                if conflicts:
+                    self.reject(line, f"driver is already booked then ({describe_conflicts(conflicts)})")
+                    continue
+                index.add(drive['driver_id'], drive['arrive_at'], f"line {line}")
+            accepted.append(drive)
+        return accepted
+
+def import_schedule(rows, chunk_size=1000):
+    """
+    Validate and bulk-insert schedule rows, one transaction per chunk of
+    chunk_size rows. Drives that would double-book their driver are
+    rejected. Returns a report with inserted counts, rejected rows
+    (1-based line numbers, header excluded) and throughput.
+    """
+    started = time.perf_counter()
+    schedule_import = _ScheduleImport()
+    numbered = enumerate(rows, start=1)
+    total = 0
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            break
+        total += len(chunk)
+        schedule_import.run_chunk(chunk)
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': total,
+        'inserted': schedule_import.inserted,
+        'rejected': sorted(schedule_import.rejected, key=lambda r: r['line']),
+        'seconds': elapsed,
+        'rows_per_second': total / elapsed if elapsed else 0.0
+    }
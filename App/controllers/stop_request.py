@@ -0,0 +1,199 @@
+import hashlib, json
+from datetime import datetime, timedelta
+
+from sqlalchemy import literal, union_all
+
+from App.models import (Drive, DriveArchive, DriveSchedule, Driver, IdempotencyKey, Resident, StopRequest,
+                        StopRequestArchive, Street, User)
+from App.database import db
+from .booking import check_booking, describe_conflicts
+from .drive import get_upcoming_drives_for_street, invalidate_street_drives
+from .drive_schedule import is_occurrence
+from .request_counts import adjust_request_counts, request_count_deltas
+
+MAX_ADDRESS_LENGTH = 200
+
+def _insert_ignoring_conflicts(model, *index_elements):
+    # INSERT ... ON CONFLICT DO NOTHING: the unique index arbitrates between
+    # concurrent submissions instead of a read-then-write race
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"no upsert support for {dialect}")
+    return insert(model).on_conflict_do_nothing(index_elements=index_elements)
+
+def _request_hash(drive_id, address):
+    payload = json.dumps({"drive_id": drive_id, "address": address}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _stored_response(user_id, key):
+    return db.session.execute(
+        db.select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response)
+        .filter_by(user_id=user_id, key=key)
+    ).first()
+
+def _replay(stored, request_hash):
+    if stored.request_hash != request_hash:
+        return 422, {"message": "Idempotency-Key was already used for a different request"}
+    return stored.status_code, json.loads(stored.response)
+
+def _validate(user_id, drive_id, address):
+    # returns (error, resident, address); error is a (status, body) pair or None
+    resident = db.session.execute(
+        db.select(Resident.id, Resident.street_id, Resident.address).filter_by(user_id=user_id)
+    ).first()
+    if resident is None:
+        return (403, {"message": "only residents can request stops"}), None, None
+    address = (address if address is not None else resident.address).strip()
+    if not address or len(address) > MAX_ADDRESS_LENGTH:
+        return (400, {"message": f"address must be 1-{MAX_ADDRESS_LENGTH} characters"}), None, None
+    # the street's upcoming drives are cached, so the usual case costs no query
+    drive = next((d for d in get_upcoming_drives_for_street(resident.street_id) if d.id == drive_id), None)
+    if drive is None:
+        # not in this process's cache: unknown, elsewhere, past, or scheduled moments ago
+        drive = db.session.execute(
+            db.select(Drive.street_id, Drive.arrive_at, Drive.status).filter_by(id=drive_id)
+        ).first()
+        if drive is None:
+            return (404, {"message": f"drive {drive_id} not found"}), None, None
+        if drive.street_id != resident.street_id:
+            return (403, {"message": f"drive {drive_id} does not visit your street"}), None, None
+        if drive.arrive_at < datetime.utcnow():
+            return (409, {"message": f"drive {drive_id} has already left"}), None, None
+    if drive.status in ("CANCELLED", "COMPLETE"):
+        return (409, {"message": f"drive {drive_id} is {drive.status.lower()}"}), None, None
+    return None, resident, address
+
+def submit_stop_request(user_id, drive_id, address=None, idempotency_key=None):
+    """
+    Request a stop on an upcoming drive of the resident's street. Returns
+    (status_code, body): 201 when the request was created, 200 with the
+    existing request when this resident already asked for this drive, or an
+    error status with a message. With an idempotency_key, a retry gets the
+    first attempt's response back without writing anything.
+    """
+    request_hash = _request_hash(drive_id, address)
+    if idempotency_key is not None:
+        stored = _stored_response(user_id, idempotency_key)
+        if stored is not None:
+            return _replay(stored, request_hash)
+
+    error, resident, address = _validate(user_id, drive_id, address)
+    if error is not None:
+        status, body = error
+    else:
+        stmt = _insert_ignoring_conflicts(StopRequest, "resident_id", "drive_id").values(
+            resident_id=resident.id, drive_id=drive_id, address=address,
+            status="PENDING", requested_at=datetime.utcnow()
+        ).returning(StopRequest)
+        req = db.session.scalars(stmt).first()
+        status = 201 if req is not None else 200
+        if req is not None:
+            # a bulk insert skips the ORM events that keep the drive's counters
+            adjust_request_counts(db.session.connection(), {drive_id: request_count_deltas("PENDING")})
+        else:
+            req = db.session.scalars(
+                db.select(StopRequest).filter_by(resident_id=resident.id, drive_id=drive_id)
+            ).one()
+        body = {"created": status == 201, "stop_request": req.get_json()}
+
+    if idempotency_key is not None:
+        stored = db.session.scalars(
+            _insert_ignoring_conflicts(IdempotencyKey, "user_id", "key").values(
+                user_id=user_id, key=idempotency_key, request_hash=request_hash,
+                status_code=status, response=json.dumps(body), created_at=datetime.utcnow()
+            ).returning(IdempotencyKey.key)
+        ).first()
+        if stored is None:
+            # a concurrent retry with the same key committed first: answer as it did
+            db.session.rollback()
+            return _replay(_stored_response(user_id, idempotency_key), request_hash)
+    db.session.commit()
+    return status, body
+
+def materialize_occurrence(schedule, arrive_at):
+    """
+    The id of the drive standing in for schedule's occurrence at arrive_at,
+    inserting it first if there isn't one yet. Doesn't commit. Raises
+    ValueError, leaving the insert for the caller to roll back, if the new
+    drive would double-book the driver.
+    """
+    # concurrent first requests for one occurrence race on the (schedule_id, arrive_at) index, not on a read
+    drive_id = db.session.scalar(
+        _insert_ignoring_conflicts(Drive, "schedule_id", "arrive_at").values(
+            driver_id=schedule.driver_id, street_id=schedule.street_id, arrive_at=arrive_at,
+            status="SCHEDULED", schedule_id=schedule.id, created_at=datetime.utcnow()
+        ).returning(Drive.id)
+    )
+    if drive_id is None:
+        return db.session.scalar(db.select(Drive.id).filter_by(schedule_id=schedule.id, arrive_at=arrive_at))
+    # the schedule was checked when it was made, but a drive may have been booked over an occurrence since
+    conflicts = check_booking(schedule.driver_id, arrive_at, drive_id)
+    if conflicts:
+        raise ValueError(f"driver {schedule.driver_id} is already booked then ({describe_conflicts(conflicts)})")
+    # a Core insert skips the Drive mapper events
+    invalidate_street_drives([schedule.street_id])
+    return drive_id
+
+def submit_occurrence_stop_request(user_id, schedule_id, arrive_at, address=None, idempotency_key=None):
+    """
+    Request a stop on an occurrence of a recurring drive, making the occurrence
+    a drive first if nobody has asked for a stop on it yet. Returns
+    (status_code, body) as submit_stop_request does.
+    """
+    schedule = db.session.get(DriveSchedule, schedule_id)
+    if schedule is None or not is_occurrence(schedule, arrive_at):
+        return 404, {"message": f"schedule {schedule_id} has no drive at {arrive_at.isoformat()}"}
+    street_id = db.session.scalar(db.select(Resident.street_id).filter_by(user_id=user_id))
+    if street_id is None:
+        return 403, {"message": "only residents can request stops"}
+    if street_id != schedule.street_id:
+        return 403, {"message": f"schedule {schedule_id} does not visit your street"}
+    if arrive_at < datetime.utcnow():
+        return 409, {"message": f"the drive at {arrive_at.isoformat()} has already left"}
+    if address is not None and not 0 < len(address.strip()) <= MAX_ADDRESS_LENGTH:
+        return 400, {"message": f"address must be 1-{MAX_ADDRESS_LENGTH} characters"}
+    # nothing is written for a request that is going to be refused
+    try:
+        drive_id = materialize_occurrence(schedule, arrive_at)
+    except ValueError as e:
+        db.session.rollback()
+        return 409, {"message": str(e)}
+    return submit_stop_request(user_id, drive_id, address, idempotency_key)
+
+def purge_idempotency_keys(older_than=timedelta(hours=24)):
+    """Forget stored responses older than older_than; returns how many were removed."""
+    result = db.session.execute(
+        db.delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.utcnow() - older_than)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def _resident_requests_select(resident_id, stop_request, drive, archived):
+    return (
+        db.select(stop_request.id, stop_request.drive_id, stop_request.address, stop_request.status,
+                  stop_request.requested_at, drive.arrive_at, drive.status.label("drive_status"),
+                  Street.name.label("street_name"), User.username.label("driver_username"),
+                  literal(archived).label("archived"))
+        .join(drive, drive.id == stop_request.drive_id)
+        .join(Street, Street.id == drive.street_id)
+        .join(Driver, Driver.id == drive.driver_id)
+        .join(User, User.id == Driver.user_id)
+        .filter(stop_request.resident_id == resident_id)
+    )
+
+def get_resident_stop_requests(resident_id, include_archived=False):
+    """A resident's stop requests with their drives, newest first; archived ones too with include_archived."""
+    stmt = _resident_requests_select(resident_id, StopRequest, Drive, False)
+    if include_archived:
+        combined = union_all(stmt, _resident_requests_select(resident_id, StopRequestArchive, DriveArchive, True)).subquery()
+        stmt = db.select(combined).order_by(combined.c.requested_at.desc(), combined.c.id.desc())
+    else:
+        stmt = stmt.order_by(StopRequest.requested_at.desc(), StopRequest.id.desc())
+    return [
+        {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+        for row in db.session.execute(stmt).mappings()
+    ]
@@ -0,0 +1,71 @@
+import time
+from itertools import chain
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from App.models import TableVersion
+from App.database import db
+
+# Per-table version counters for cheap change detection (ETags). Tables written
+# by ORM flushes and ORM bulk statements are noted as they go and bumped once,
+# right before the transaction commits, so the counter rows stay locked for as
+# short a time as possible. Plain Core writes call bump_table_versions.
+
+VERSIONED = TableVersion.__table__
+
+def _initial_version():
+    # start from the clock so a recreated database never repeats old versions
+    return int(time.time() * 1000)
+
+def bump_table_versions(connection, tables):
+    tables = sorted(set(tables) - {VERSIONED.name})
+    if tables:
+        connection.execute(
+            update(VERSIONED).where(VERSIONED.c.name.in_(tables)).values(version=VERSIONED.c.version + 1)
+        )
+
+def get_table_versions(tables):
+    """Map each table name to its current version, 0 for tables never seeded."""
+    rows = db.session.execute(select(VERSIONED.c.name, VERSIONED.c.version).where(VERSIONED.c.name.in_(tables)))
+    versions = dict.fromkeys(tables, 0)
+    versions.update(rows.all())
+    return versions
+
+
+@event.listens_for(VERSIONED, "after_create")
+def _seed_table_versions(target, connection, **kw):
+    start = _initial_version()
+    connection.execute(insert(VERSIONED), [
+        {"name": table.name, "version": start}
+        for table in target.metadata.sorted_tables if table is not VERSIONED
+    ])
+
+def _touched_tables(session):
+    return session.info.setdefault("touched_tables", set())
+
+@event.listens_for(Session, "after_flush")
+def _note_flushed_tables(session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    _touched_tables(session).update(
+        obj.__table__.name
+        for obj in chain(session.new, session.deleted, (o for o in session.dirty if session.is_modified(o)))
+    )
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_tables(orm_execute_state):
+    # insert(Model)/update(Model)/delete(Model) run through session.execute skip the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _touched_tables(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+@event.listens_for(Session, "before_commit")
+def _bump_touched_tables(session):
+    # commit flushes after this hook runs, so flush first to see every write
+    session.flush()
+    tables = session.info.pop("touched_tables", None)
+    if tables:
+        bump_table_versions(session.connection(), tables)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched_tables(session):
+    session.info.pop("touched_tables", None)
@@ -1,5 +1,6 @@
 from App.models import User
 from App.database import db
+from .auth import invalidate_user_identity
 
 def create_user(username, password):
     newuser = User(username=username, password=password)
@@ -18,11 +19,25 @@ def get_all_users():
     return db.session.scalars(db.select(User)).all()
 
 def get_all_users_json():
-    users = get_all_users()
-    if not users:
-        return []
-    users = [user.get_json() for user in users]
-    return users
+    # only the public columns; never hydrate full User objects for a listing
+    rows = db.session.execute(db.select(User.id, User.username).order_by(User.id.asc()))
+    return [{'id': id, 'username': username} for id, username in rows]
+
+def get_users_page(limit=50, after=None):
+    # keyset pagination on id: returns (rows, next_cursor)
+    stmt = db.select(User.id, User.username).order_by(User.id.asc()).limit(limit + 1)
+    if after is not None:
+        stmt = stmt.filter(User.id > after)
+    rows = db.session.execute(stmt).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def get_users_page_json(limit=50, after=None):
+    rows, next_cursor = get_users_page(limit, after)
+    return {
+        'users': [{'id': id, 'username': username} for id, username in rows],
+        'next': next_cursor
+    }
 
 def update_user(id, username):
     user = get_user(id)
@@ -30,5 +45,6 @@ def update_user(id, username):
         user.username = username
         # user is already in the session; no need to re-add
         db.session.commit()
+        invalidate_user_identity(id)
         return True
     return None
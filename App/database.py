@@ -1,6 +1,11 @@
+import logging, threading, time
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 
+logger = logging.getLogger(__name__)
 
 db = SQLAlchemy()
 
@@ -9,6 +14,132 @@ def get_migrate(app):
 
 def create_db():
     db.create_all()
-    
+
+
+class PoolWaitStats:
+    """Running totals of how long connection checkouts waited on the pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.waited = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.timeouts = 0
+
+    def record(self, seconds, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if seconds >= 0.001:
+                self.waited += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "waited": self.waited,
+                "timeouts": self.timeouts,
+                "wait_ms_total": round(self.wait_seconds * 1000, 3),
+                "wait_ms_max": round(self.max_wait_seconds * 1000, 3),
+            }
+
+
+pool_wait_stats = PoolWaitStats()
+_pool_settings = {"slow_checkout_seconds": 0.5}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection
+    (including connecting a new one), so an undersized pool shows up as numbers."""
+
+    def _do_get(self):
+        began = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_wait_stats.record(time.perf_counter() - began, timed_out=True)
+            raise
+        waited = time.perf_counter() - began
+        pool_wait_stats.record(waited)
+        if waited >= _pool_settings["slow_checkout_seconds"]:
+            logger.warning("waited %.0fms for a database connection (%s)", waited * 1000, self.status())
+        return connection
+
+
+def get_pool_stats():
+    stats = pool_wait_stats.snapshot()
+    pool = db.engine.pool
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return stats
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    # psycogreen's callback: hand every socket wait of libpq to the gevent hub
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import extensions, OperationalError
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+
+def set_cooperative_driver(enabled):
+    """
+    Make psycopg2 yield to other greenlets while it waits on PostgreSQL
+    instead of blocking the whole gevent worker. Returns whether it is on.
+    """
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+    extensions.set_wait_callback(_gevent_wait_callback if enabled else None)
+    return enabled
+
+
+def _gevent_active():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+def configure_engine(app):
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    _pool_settings["slow_checkout_seconds"] = app.config['DB_POOL_SLOW_CHECKOUT_MS'] / 1000
+    if uri.startswith("sqlite"):
+        # sqlite uses its own pools and has no server connections to size
+        return
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    options.setdefault('poolclass', TimedQueuePool)
+    options.setdefault('pool_size', app.config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', app.config['DB_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', app.config['DB_POOL_TIMEOUT'])
+    options.setdefault('pool_pre_ping', app.config['DB_POOL_PRE_PING'])
+    options.setdefault('pool_recycle', app.config['DB_POOL_RECYCLE'])
+    # psycopg (3) waits through the selectors module, which gevent already
+    # patches; psycopg2 blocks inside libpq unless given a wait callback
+    if make_url(uri).get_dialect().driver == "psycopg2":
+        gevent_mode = app.config['DB_GEVENT']
+        if gevent_mode == "auto":
+            gevent_mode = _gevent_active()
+        set_cooperative_driver(bool(gevent_mode))
+
 def init_db(app):
-    db.init_app(app)
\ No newline at end of file
+    configure_engine(app)
+    db.init_app(app)
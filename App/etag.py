@@ -0,0 +1,60 @@
+import hashlib, time
+from functools import wraps
+
+from flask import Response, current_app, request, session
+
+from App.cache import LRUCache
+from App.controllers import get_table_versions
+
+# Conditional GET for list endpoints. A response's ETag is derived from the
+# request and the versions of the tables it reads, so one indexed lookup of
+# table_version decides between a 304, a cached body and a fresh render.
+
+response_cache = LRUCache(maxsize=512, ttl=10)
+
+def configure_conditional_get(app):
+    response_cache.configure(maxsize=app.config['RESPONSE_CACHE_SIZE'], ttl=app.config['RESPONSE_CACHE_TTL'])
+
+def _viewer():
+    # who the page is rendered for: the JWT from the cookie or the header
+    cookie = request.cookies.get(current_app.config['JWT_ACCESS_COOKIE_NAME'], '')
+    return f"{cookie}|{request.headers.get('Authorization', '')}"
+
+def conditional_get(*tables, expires=None, per_user=False):
+    """
+    Serve a view's 200 responses with a strong ETag built from the versions of
+    tables. expires bounds how long an ETag holds for views whose output also
+    changes with the clock (e.g. "upcoming" drives); per_user separates
+    responses that depend on who is logged in.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if per_user and session.get('_flashes'):
+                # a one-off flash message must render and must not be cached
+                return view(*args, **kwargs)
+            versions = get_table_versions(tables)
+            key = [request.full_path, *(f"{name}={versions[name]}" for name in tables)]
+            if expires:
+                key.append(str(int(time.time() // expires)))
+            if per_user:
+                key.append(_viewer())
+            etag = hashlib.sha1("\n".join(key).encode()).hexdigest()[:32]
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                cached = response_cache.get(etag)
+                if cached is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    response_cache.set(etag, (response.get_data(), response.mimetype))
+                else:
+                    response = Response(cached[0], mimetype=cached[1])
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            if per_user:
+                response.vary.update(('Cookie', 'Authorization'))
+            return response
+        return wrapper
+    return decorator
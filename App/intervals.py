@@ -0,0 +1,57 @@
+from bisect import bisect_left, bisect_right
+
+
+class IntervalIndex:
+    """
+    Equal-length intervals [start, start + length) kept per key (e.g. per
+    driver) as a sorted list of starts. Two such intervals overlap exactly when
+    their starts are less than length apart, so finding the overlaps of a new
+    interval is two bisects, O(log n) however many intervals the key holds.
+    Not thread-safe: build one per operation.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self._starts = {}
+        self._items = {}
+
+    def __len__(self):
+        return sum(len(starts) for starts in self._starts.values())
+
+    def add(self, key, start, item):
+        starts = self._starts.setdefault(key, [])
+        items = self._items.setdefault(key, [])
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        items.insert(i, item)
+
+    def remove(self, key, start, item):
+        starts, items = self._starts.get(key, []), self._items.get(key, [])
+        i = bisect_left(starts, start)
+        while i < len(starts) and starts[i] == start:
+            if items[i] == item:
+                del starts[i], items[i]
+                return True
+            i += 1
+        return False
+
+    def overlapping(self, key, start):
+        """(start, item) of every interval of key overlapping [start, start + length)."""
+        starts = self._starts.get(key)
+        if not starts:
+            return []
+        items = self._items[key]
+        lo = bisect_right(starts, start - self.length)
+        hi = bisect_left(starts, start + self.length)
+        return [(starts[i], items[i]) for i in range(lo, hi)]
+
+    def overlaps(self):
+        """Yield (key, (start, item), (start, item)) for every overlapping pair, one sweep per key."""
+        for key, starts in self._starts.items():
+            items = self._items[key]
+            first = 0
+            for j in range(len(starts)):
+                while starts[j] - starts[first] >= self.length:
+                    first += 1
+                for i in range(first, j):
+                    yield key, (starts[i], items[i]), (starts[j], items[j])
@@ -1,41 +1,85 @@
 import os
-from flask import Flask, render_template
-from flask_uploads import DOCUMENTS, IMAGES, TEXT, UploadSet, configure_uploads
+from flask import Flask, jsonify, render_template
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import  FileStorage
 
-from App.database import init_db
+from App.database import db, init_db
 from App.config import load_config
+from App.passwords import configure_password_hashing
+from App.pubsub import hub
+from App.metrics import configure_metrics
+from App.etag import configure_conditional_get
 
 
 from App.controllers import (
     setup_jwt,
-    add_auth_context
+    add_auth_context,
+    configure_drive_cache,
+    configure_identity_cache,
+    configure_driver_index,
+    configure_route_optimizer,
+    configure_eta_engine,
+    configure_location_buffer,
+    configure_archive,
+    configure_jobs,
+    configure_bookings,
+    configure_drive_schedules
 )
 
 from App.views import views, setup_admin
 
+# What each APP_PROFILE sets up on top of the database, caches and JWT:
+#   web - everything: pages, API, admin, uploads and the template context
+#   api - API and page routes, JSON 401s, no admin, uploads or template context
+#   cli - nothing served over HTTP, for `flask <command>` and scripts
+APP_PROFILES = ('web', 'api', 'cli')
 
 
 def add_views(app):
     for view in views:
         app.register_blueprint(view)
 
+def configure_uploads_for(app):
+    from flask_uploads import DOCUMENTS, IMAGES, TEXT, UploadSet, configure_uploads
+    photos = UploadSet('photos', TEXT + DOCUMENTS + IMAGES)
+    configure_uploads(app, photos)
+
 def create_app(overrides={}):
     app = Flask(__name__, static_url_path='/static')
     load_config(app, overrides)
-    CORS(app)
-    add_auth_context(app)
-    photos = UploadSet('photos', TEXT + DOCUMENTS + IMAGES)
-    configure_uploads(app, photos)
-    add_views(app)
+    profile = app.config['APP_PROFILE']
+    if profile not in APP_PROFILES:
+        raise ValueError(f"APP_PROFILE must be one of {', '.join(APP_PROFILES)}, not {profile!r}")
+    configure_password_hashing(app)
+    if profile != 'cli':
+        CORS(app)
+        configure_metrics(app)
+        configure_conditional_get(app)
+        add_views(app)
+    if profile == 'web':
+        add_auth_context(app)
+        configure_uploads_for(app)
     init_db(app)
+    configure_drive_cache(app)
+    configure_identity_cache(app)
+    configure_driver_index(app)
+    configure_route_optimizer(app)
+    configure_eta_engine(app)
+    configure_location_buffer(app)
+    configure_archive(app)
+    configure_jobs(app)
+    configure_bookings(app)
+    configure_drive_schedules(app)
     jwt = setup_jwt(app)
-    setup_admin(app)
+    if profile == 'web':
+        setup_admin(app)
     @jwt.invalid_token_loader
     @jwt.unauthorized_loader
     def custom_unauthorized_response(error):
-        return render_template('401.html', error=error), 401
+        if profile == 'web':
+            return render_template('401.html', error=error), 401
+        return jsonify(message=error), 401
     app.app_context().push()
-    return app
\ No newline at end of file
+    hub.init_app(app, db.engine)
+    return app
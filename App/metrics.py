@@ -0,0 +1,266 @@
+import atexit, glob, json, logging, os, re, threading, time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from App.database import pool_wait_stats
+
+logger = logging.getLogger(__name__)
+
+# Per-endpoint request latency, SQL query counts and database time, rendered in
+# the Prometheus text format. Every gunicorn worker keeps its own totals; with
+# METRICS_DIR set each one also writes them to <METRICS_DIR>/metrics-<pid>.json
+# every METRICS_FLUSH_SECONDS and /metrics sums the files of all workers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_metrics_settings = {"dir": None, "flush_seconds": 5, "n_plus_one_threshold": 10}
+_flushed = {"at": 0.0}
+
+# a run of bound parameters, e.g. an expanded IN list: "(?, ?, ?)" -> "(?)"
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+|\$\d+))*\s*\)")
+
+
+def statement_shape(statement):
+    return _PARAMETER_LIST.sub("(?)", " ".join(statement.split()))
+
+
+def _observe_buckets(buckets, bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            buckets[i] += 1
+            return
+    buckets[-1] += 1
+
+
+class Metrics:
+    """Request and query totals of one process, keyed by "METHOD endpoint"."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, method, endpoint, status, seconds, queries, db_seconds, n_plus_one=0):
+        key = f"{method} {endpoint}"
+        with self._lock:
+            entry = self._endpoints.get(key)
+            if entry is None:
+                entry = self._endpoints[key] = {
+                    "method": method,
+                    "endpoint": endpoint,
+                    "statuses": {},
+                    "count": 0,
+                    "latency": [0] * (len(LATENCY_BUCKETS) + 1),
+                    "latency_sum": 0.0,
+                    "queries": [0] * (len(QUERY_BUCKETS) + 1),
+                    "queries_sum": 0,
+                    "db_seconds": 0.0,
+                    "n_plus_one": 0,
+                }
+            entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+            entry["count"] += 1
+            _observe_buckets(entry["latency"], LATENCY_BUCKETS, seconds)
+            entry["latency_sum"] += seconds
+            _observe_buckets(entry["queries"], QUERY_BUCKETS, queries)
+            entry["queries_sum"] += queries
+            entry["db_seconds"] += db_seconds
+            entry["n_plus_one"] += n_plus_one
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = json.loads(json.dumps(self._endpoints))
+        return {"endpoints": endpoints, "pool": pool_wait_stats.snapshot()}
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+def merge_snapshots(snapshots):
+    merged = {"endpoints": {}, "pool": Counter()}
+    for snapshot in snapshots:
+        for key, entry in snapshot["endpoints"].items():
+            total = merged["endpoints"].get(key)
+            if total is None:
+                merged["endpoints"][key] = json.loads(json.dumps(entry))
+                continue
+            for status, count in entry["statuses"].items():
+                total["statuses"][status] = total["statuses"].get(status, 0) + count
+            for name in ("latency", "queries"):
+                total[name] = [a + b for a, b in zip(total[name], entry[name])]
+            for name in ("count", "latency_sum", "queries_sum", "db_seconds", "n_plus_one"):
+                total[name] += entry[name]
+        for name in ("checkouts", "waited", "timeouts", "wait_ms_total"):
+            merged["pool"][name] += snapshot["pool"].get(name, 0)
+    return merged
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def _histogram(lines, name, labels, bounds, buckets, total, count):
+    cumulative = 0
+    for bound, bucket in zip(bounds, buckets):
+        cumulative += bucket
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+    lines.append(f"{name}_sum{{{labels}}} {total}")
+    lines.append(f"{name}_count{{{labels}}} {count}")
+
+
+def render_prometheus(snapshot):
+    endpoints = sorted(snapshot["endpoints"].values(), key=lambda e: (e["endpoint"], e["method"]))
+    lines = [
+        "# HELP breadvan_http_requests_total Requests handled, by response status.",
+        "# TYPE breadvan_http_requests_total counter",
+    ]
+    for entry in endpoints:
+        for status, count in sorted(entry["statuses"].items()):
+            labels = _labels(method=entry["method"], endpoint=entry["endpoint"], status=status)
+            lines.append(f"breadvan_http_requests_total{{{labels}}} {count}")
+    lines += [
+        "# HELP breadvan_http_request_duration_seconds Time from request start to teardown.",
+        "# TYPE breadvan_http_request_duration_seconds histogram",
+    ]
+    for entry in endpoints:
+        labels = _labels(method=entry["method"], endpoint=entry["endpoint"])
+        _histogram(lines, "breadvan_http_request_duration_seconds", labels, LATENCY_BUCKETS,
+                   entry["latency"], entry["latency_sum"], entry["count"])
+    lines += [
+        "# HELP breadvan_db_queries_per_request SQL statements executed per request.",
+        "# TYPE breadvan_db_queries_per_request histogram",
+    ]
+    for entry in endpoints:
+        labels = _labels(method=entry["method"], endpoint=entry["endpoint"])
+        _histogram(lines, "breadvan_db_queries_per_request", labels, QUERY_BUCKETS,
+                   entry["queries"], entry["queries_sum"], entry["count"])
+    lines += [
+        "# HELP breadvan_db_query_seconds_total Time spent executing SQL statements.",
+        "# TYPE breadvan_db_query_seconds_total counter",
+    ]
+    for entry in endpoints:
+        labels = _labels(method=entry["method"], endpoint=entry["endpoint"])
+        lines.append(f"breadvan_db_query_seconds_total{{{labels}}} {entry['db_seconds']}")
+    lines += [
+        "# HELP breadvan_n_plus_one_total Requests that repeated one statement shape too often.",
+        "# TYPE breadvan_n_plus_one_total counter",
+    ]
+    for entry in endpoints:
+        labels = _labels(method=entry["method"], endpoint=entry["endpoint"])
+        lines.append(f"breadvan_n_plus_one_total{{{labels}}} {entry['n_plus_one']}")
+    pool = snapshot["pool"]
+    lines += [
+        "# HELP breadvan_db_pool_checkouts_total Connections checked out of the pool.",
+        "# TYPE breadvan_db_pool_checkouts_total counter",
+        f"breadvan_db_pool_checkouts_total {pool.get('checkouts', 0)}",
+        "# HELP breadvan_db_pool_wait_seconds_total Time spent waiting for a pooled connection.",
+        "# TYPE breadvan_db_pool_wait_seconds_total counter",
+        f"breadvan_db_pool_wait_seconds_total {pool.get('wait_ms_total', 0) / 1000}",
+        "# HELP breadvan_db_pool_timeouts_total Checkouts that gave up waiting.",
+        "# TYPE breadvan_db_pool_timeouts_total counter",
+        f"breadvan_db_pool_timeouts_total {pool.get('timeouts', 0)}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _metrics_path():
+    return os.path.join(_metrics_settings["dir"], f"metrics-{os.getpid()}.json")
+
+def flush_metrics():
+    if not _metrics_settings["dir"]:
+        return
+    path = _metrics_path()
+    # write then rename, so a reader never sees half a file
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(metrics.snapshot(), f)
+    os.replace(f"{path}.tmp", path)
+    _flushed["at"] = time.monotonic()
+
+def collect_metrics():
+    """This process's totals, plus every other worker's last flush when METRICS_DIR is set."""
+    snapshots = [metrics.snapshot()]
+    if _metrics_settings["dir"]:
+        own = _metrics_path()
+        for path in glob.glob(os.path.join(_metrics_settings["dir"], "metrics-*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                logger.debug("skipping unreadable metrics file %s", path)
+    return merge_snapshots(snapshots)
+
+
+class _RequestStats:
+    __slots__ = ("started", "queries", "db_seconds", "shapes")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.shapes = Counter()
+
+
+# the start time rides on the statement's execution context, which is dropped
+# with it, so a statement that fails leaves nothing behind to skew the next one
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None or not has_request_context():
+        return
+    stats = g.get("request_stats")
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+        stats.shapes[statement_shape(statement)] += 1
+
+
+def _start_request():
+    g.request_stats = _RequestStats()
+
+def _record_status(response):
+    g.response_status = response.status_code
+    return response
+
+def _finish_request(exc):
+    stats = g.pop("request_stats", None)
+    if stats is None:
+        return
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    status = 500 if exc is not None else g.get("response_status", 500)
+    threshold = _metrics_settings["n_plus_one_threshold"]
+    repeated = [(shape, count) for shape, count in stats.shapes.items() if count > threshold]
+    for shape, count in repeated:
+        logger.warning("possible N+1: %s %s ran the same statement %d times: %s",
+                       request.method, rule, count, shape[:300])
+    metrics.observe(request.method, rule, status, time.perf_counter() - stats.started,
+                    stats.queries, stats.db_seconds, 1 if repeated else 0)
+    if _metrics_settings["dir"] and time.monotonic() - _flushed["at"] >= _metrics_settings["flush_seconds"]:
+        flush_metrics()
+
+
+def configure_metrics(app):
+    _metrics_settings["dir"] = app.config['METRICS_DIR']
+    _metrics_settings["flush_seconds"] = app.config['METRICS_FLUSH_SECONDS']
+    _metrics_settings["n_plus_one_threshold"] = app.config['N_PLUS_ONE_THRESHOLD']
+    if _metrics_settings["dir"]:
+        os.makedirs(_metrics_settings["dir"], exist_ok=True)
+        if not _flushed.get("registered"):
+            atexit.register(flush_metrics)
+            _flushed["registered"] = True
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_request)
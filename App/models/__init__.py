@@ -1,6 +1,13 @@
 from .user import *
 from .driver import *
 from .drive import *
+from .drive_schedule import *
 from .street import *
 from .resident import *
-from .stop_request import *
\ No newline at end of file
+from .stop_request import *
+from .table_version import *
+from .idempotency_key import *
+from .drive_archive import *
+from .stop_request_archive import *
+from .job import *
+from .notification import *
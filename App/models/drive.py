@@ -3,12 +3,27 @@ from App.database import db
 
 
 class Drive(db.Model):
+    __table_args__ = (
+        # upcoming drives for a street (resident inbox) and for a driver (driver board)
+        db.Index("ix_drive_street_id_arrive_at", "street_id", "arrive_at"),
+        db.Index("ix_drive_driver_id_arrive_at", "driver_id", "arrive_at"),
+        # at most one drive per schedule occurrence; materializing one upserts against this
+        db.UniqueConstraint("schedule_id", "arrive_at", name="uq_drive_schedule_id_arrive_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=False)
     street_id = db.Column(db.Integer, db.ForeignKey("street.id"), nullable=False)
     arrive_at = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     status = db.Column(db.String(20), default="SCHEDULED", nullable=False)  # SCHEDULED|EN_ROUTE|ARRIVED|COMPLETE|CANCELLED
+    # the recurring schedule this drive is an occurrence of, if any
+    schedule_id = db.Column(db.Integer, db.ForeignKey("drive_schedule.id", name="fk_drive_schedule_id_drive_schedule"),
+                            nullable=True)
+    # stop request counts, kept in step with stop_request writes (controllers/request_counts.py)
+    pending_requests = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    confirmed_requests = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    total_requests = db.Column(db.Integer, default=0, server_default="0", nullable=False)
 
     driver = db.relationship("Driver", backref="drives")
     street = db.relationship("Street", backref="drives")
@@ -20,7 +35,11 @@ class Drive(db.Model):
             "street_id": self.street_id,
             "arrive_at": self.arrive_at.isoformat(),
             "created_at": self.created_at.isoformat(),
-            "status": self.status
+            "status": self.status,
+            "schedule_id": self.schedule_id,
+            "pending_requests": self.pending_requests,
+            "confirmed_requests": self.confirmed_requests,
+            "total_requests": self.total_requests
         }
 
     def __repr__(self):
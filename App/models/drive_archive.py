@@ -0,0 +1,22 @@
+from datetime import datetime
+from App.database import db
+
+
+class DriveArchive(db.Model):
+    """A drive moved out of the live drive table once it was old enough; same id and columns."""
+    __tablename__ = "drive_archive"
+    __table_args__ = (
+        db.Index("ix_drive_archive_street_id_arrive_at", "street_id", "arrive_at"),
+        db.Index("ix_drive_archive_driver_id_arrive_at", "driver_id", "arrive_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=False)
+    street_id = db.Column(db.Integer, db.ForeignKey("street.id"), nullable=False)
+    arrive_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<DriveArchive {self.id} - Driver {self.driver_id} to Street {self.street_id} at {self.arrive_at}>"
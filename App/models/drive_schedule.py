@@ -0,0 +1,38 @@
+import json
+from datetime import date, datetime
+from App.database import db
+
+
+class DriveSchedule(db.Model):
+    """A recurring weekly drive. Its occurrences are expanded on demand, not stored as drives."""
+    __tablename__ = "drive_schedule"
+
+    id = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey("driver.id"), nullable=False, index=True)
+    street_id = db.Column(db.Integer, db.ForeignKey("street.id"), nullable=False, index=True)
+    weekday = db.Column(db.Integer, nullable=False)  # 0 Monday .. 6 Sunday
+    time_of_day = db.Column(db.Time, nullable=False)
+    interval_weeks = db.Column(db.Integer, default=1, nullable=False)  # every n weeks from starts_on
+    starts_on = db.Column(db.Date, nullable=False)
+    ends_on = db.Column(db.Date, nullable=True)  # last day an occurrence may fall on
+    exceptions = db.Column(db.Text, default="[]", nullable=False)  # JSON list of ISO dates without a drive
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def skipped_dates(self):
+        return {date.fromisoformat(day) for day in json.loads(self.exceptions or "[]")}
+
+    def get_json(self):
+        return {
+            "id": self.id,
+            "driver_id": self.driver_id,
+            "street_id": self.street_id,
+            "weekday": self.weekday,
+            "time_of_day": self.time_of_day.strftime("%H:%M"),
+            "interval_weeks": self.interval_weeks,
+            "starts_on": self.starts_on.isoformat(),
+            "ends_on": self.ends_on.isoformat() if self.ends_on else None,
+            "exceptions": sorted(json.loads(self.exceptions or "[]"))
+        }
+
+    def __repr__(self):
+        return f"<DriveSchedule {self.id} - Driver {self.driver_id} to Street {self.street_id} on weekday {self.weekday}>"
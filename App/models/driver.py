@@ -6,6 +6,8 @@ class Driver(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), unique=True, nullable=False)
     status = db.Column(db.String(20), default="OFF_DUTY", nullable=False)  # OFF_DUTY|EN_ROUTE|DELAYED|COMPLETE
     location = db.Column(db.String(120), default="UNSPECIFIED", nullable=False)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
     status_updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     user = db.relationship("User", backref=db.backref("driver_profile", uselist=False))
@@ -16,6 +18,8 @@ class Driver(db.Model):
             "user_id": self.user_id,
             "status": self.status,
             "location": self.location,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
             "status_updated_at": self.status_updated_at.isoformat()
         }
 
@@ -0,0 +1,16 @@
+from datetime import datetime
+from App.database import db
+
+
+class IdempotencyKey(db.Model):
+    """The stored outcome of a request made with an Idempotency-Key header, replayed on retries."""
+    __tablename__ = "idempotency_key"
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key} (user:{self.user_id}) -> {self.status_code}>"
@@ -0,0 +1,43 @@
+import json
+from datetime import datetime
+from App.database import db
+
+
+class Job(db.Model):
+    """A unit of background work, claimed and run by `flask worker`."""
+    __table_args__ = (
+        # the claim query: runnable jobs in run_at order
+        db.Index("ix_job_status_run_at", "status", "run_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(db.String(20), default="QUEUED", nullable=False)  # QUEUED|RUNNING|SUCCEEDED|FAILED
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(120), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True)
+
+    def get_json(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "run_at": self.run_at.isoformat(),
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.locked_at.isoformat() if self.locked_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "last_error": self.last_error,
+            "result": json.loads(self.result) if self.result else None
+        }
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status} ({self.attempts}/{self.max_attempts})>"
@@ -0,0 +1,45 @@
+from datetime import datetime
+from App.database import db
+
+NOTIFICATION_MESSAGES = {
+    "DRIVE_SCHEDULED": "A drive is coming to your street at {:%Y-%m-%d %H:%M}",
+    "DRIVE_RESCHEDULED": "A drive to your street now arrives at {:%Y-%m-%d %H:%M}",
+    "DRIVE_CANCELLED": "The drive to your street at {:%Y-%m-%d %H:%M} is cancelled",
+}
+
+
+class Notification(db.Model):
+    """What a resident was told about a drive to their street, as it was at the time."""
+    __table_args__ = (
+        # the inbox: a resident's unread notifications first, newest first
+        db.Index("ix_notification_resident_id_read_created_at", "resident_id", "read", "created_at"),
+        # has this change to the drive been announced yet
+        db.Index("ix_notification_drive_id_change_id", "drive_id", "change_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    resident_id = db.Column(db.Integer, db.ForeignKey("resident.id"), nullable=False)
+    # no foreign key: notifications outlive drives moved to the archive
+    drive_id = db.Column(db.Integer, nullable=False)
+    street_id = db.Column(db.Integer, db.ForeignKey("street.id"), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)  # DRIVE_SCHEDULED|DRIVE_RESCHEDULED|DRIVE_CANCELLED
+    arrive_at = db.Column(db.DateTime, nullable=False)
+    read = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # the drive change this tells of, shared by everyone told about it
+    change_id = db.Column(db.String(32))
+
+    def get_json(self):
+        return {
+            "id": self.id,
+            "drive_id": self.drive_id,
+            "street_id": self.street_id,
+            "kind": self.kind,
+            "message": NOTIFICATION_MESSAGES[self.kind].format(self.arrive_at),
+            "arrive_at": self.arrive_at.isoformat(),
+            "read": self.read,
+            "created_at": self.created_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f"<Notification {self.id} {self.kind} - Resident {self.resident_id} for Drive {self.drive_id}>"
@@ -6,6 +6,8 @@ class Resident(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), unique=True, nullable=False)
     street_id = db.Column(db.Integer, db.ForeignKey("street.id"), nullable=False)
     address = db.Column(db.String(120), nullable=False)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
 
     user = db.relationship("User", backref=db.backref("resident_profile", uselist=False))
     street = db.relationship("Street", backref="residents")
@@ -15,7 +17,9 @@ class Resident(db.Model):
             "id": self.id,
             "user_id": self.user_id,
             "street_id": self.street_id,
-            "address": self.address
+            "address": self.address,
+            "latitude": self.latitude,
+            "longitude": self.longitude
         }
 
     def __repr__(self):
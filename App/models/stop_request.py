@@ -3,9 +3,14 @@ from App.database import db
 
 
 class StopRequest(db.Model):
+    # one request per resident per drive; retried submissions upsert against this
+    __table_args__ = (
+        db.UniqueConstraint("resident_id", "drive_id", name="uq_stop_request_resident_id_drive_id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     resident_id = db.Column(db.Integer, db.ForeignKey("resident.id"), nullable=False)
-    drive_id = db.Column(db.Integer, db.ForeignKey("drive.id"), nullable=False)
+    drive_id = db.Column(db.Integer, db.ForeignKey("drive.id"), nullable=False, index=True)
     requested_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     status = db.Column(db.String(20), default="PENDING", nullable=False)  # PENDING|CONFIRMED|CANCELLED|COMPLETED
     address = db.Column(db.String(200), nullable=False)
@@ -24,4 +29,8 @@ class StopRequest(db.Model):
         }
 
     def __repr__(self):
-        return f"<StopRequest {self.id} - Resident {self.resident_id} for Drive {self.drive_id}>"
\ No newline at end of file
+        return f"<StopRequest {self.id} - Resident {self.resident_id} for Drive {self.drive_id}>"
+
+
+# a resident's requests, newest first (resident-request-status)
+db.Index("ix_stop_request_resident_id_requested_at", StopRequest.resident_id, StopRequest.requested_at.desc())
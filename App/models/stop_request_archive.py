@@ -0,0 +1,23 @@
+from datetime import datetime
+from App.database import db
+
+
+class StopRequestArchive(db.Model):
+    """A stop request archived together with its drive; same id and columns."""
+    __tablename__ = "stop_request_archive"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    resident_id = db.Column(db.Integer, db.ForeignKey("resident.id"), nullable=False)
+    drive_id = db.Column(db.Integer, db.ForeignKey("drive_archive.id"), nullable=False, index=True)
+    requested_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    address = db.Column(db.String(200), nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<StopRequestArchive {self.id} - Resident {self.resident_id} for Drive {self.drive_id}>"
+
+
+# a resident's request history, newest first
+db.Index("ix_stop_request_archive_resident_id_requested_at",
+         StopRequestArchive.resident_id, StopRequestArchive.requested_at.desc())
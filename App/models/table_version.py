@@ -0,0 +1,10 @@
+from App.database import db
+
+class TableVersion(db.Model):
+    """A counter per table, bumped by every transaction that writes to it."""
+    __tablename__ = "table_version"
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<TableVersion {self.name} - {self.version}>"
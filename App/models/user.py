@@ -1,5 +1,5 @@
-from werkzeug.security import check_password_hash, generate_password_hash
 from App.database import db
+from App.passwords import hash_password, verify_password, needs_rehash
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -18,11 +18,15 @@ class User(db.Model):
 
     def set_password(self, password):
         """Create hashed password."""
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
     
     def check_password(self, password):
         """Check hashed password."""
-        return check_password_hash(self.password, password)
+        return verify_password(self.password, password)
+
+    def password_needs_rehash(self):
+        """Check whether the hash predates the configured method or cost."""
+        return needs_rehash(self.password)
 
     def __repr__(self):
         return f'<User {self.id} - {self.username}>'
@@ -0,0 +1,60 @@
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing is CPU bound for tens of milliseconds. Under gevent workers
+# it runs on a pool of real OS threads (hashlib releases the GIL while hashing)
+# so the worker's event loop keeps serving other requests meanwhile.
+
+_settings = {"method": None, "salt_length": 16, "threads": 4}
+_method_prefix = None
+_pool = None
+_pool_lock = threading.Lock()
+
+def configure_password_hashing(app):
+    global _method_prefix, _pool
+    _settings["method"] = app.config['PASSWORD_HASH_METHOD']
+    _settings["salt_length"] = app.config['PASSWORD_HASH_SALT_LENGTH']
+    _settings["threads"] = app.config['PASSWORD_HASH_THREADS']
+    _method_prefix = None
+    if _pool is not None:
+        _pool.kill()
+        _pool = None
+
+def _gevent_active():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+def _run(func, *args):
+    global _pool
+    if _settings["threads"] <= 0 or not _gevent_active():
+        return func(*args)
+    if _pool is None:
+        # created lazily so each forked worker gets its own threads
+        with _pool_lock:
+            if _pool is None:
+                from gevent.threadpool import ThreadPool
+                _pool = ThreadPool(_settings["threads"])
+    return _pool.apply(func, args)
+
+def _generate(password):
+    if _settings["method"]:
+        return generate_password_hash(password, method=_settings["method"], salt_length=_settings["salt_length"])
+    return generate_password_hash(password, salt_length=_settings["salt_length"])
+
+def hash_password(password):
+    return _run(_generate, password)
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+def needs_rehash(pwhash):
+    """True when pwhash was made with a different method or cost than configured."""
+    global _method_prefix
+    if _method_prefix is None:
+        # werkzeug fills in default parameters, so read them back from a real hash
+        _method_prefix = hash_password("").split("$", 1)[0]
+    return pwhash.split("$", 1)[0] != _method_prefix
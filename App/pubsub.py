@@ -0,0 +1,185 @@
+import json, logging, queue, select, threading
+from collections import defaultdict
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "bread_van_events"
+
+
+class Subscription:
+    """One listener's mailbox. Blocking in get() costs nothing while idle (a
+    cooperative wait under gevent's monkey patching)."""
+
+    def __init__(self, hub, topics, maxsize):
+        self.hub = hub
+        self.topics = topics
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, item):
+        # a slow reader loses its oldest events rather than blocking publishers
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Return the next (event, data) pair, or None after timeout seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    """In-process topic fan-out. With a PostgreSQL database, events travel between
+    processes through LISTEN/NOTIFY, so every worker and the CLI see each other's
+    updates; otherwise they only reach subscribers in the publishing process."""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._topics = defaultdict(set)
+        self._callbacks = defaultdict(list)
+        self._lock = threading.Lock()
+        self._engine = None
+        self._listener = None
+
+    def init_app(self, app, engine):
+        self.maxsize = app.config['EVENT_QUEUE_SIZE']
+        self._engine = engine if engine.dialect.name == "postgresql" else None
+
+    def subscribe(self, *topics):
+        self._ensure_listener()
+        subscription = Subscription(self, topics, self.maxsize)
+        with self._lock:
+            for topic in topics:
+                self._topics[topic].add(subscription)
+        return subscription
+
+    def add_listener(self, topic, callback):
+        """Call callback(event, data) synchronously for every event on topic,
+        e.g. to keep an in-memory index in step with other processes."""
+        self._ensure_listener()
+        with self._lock:
+            self._callbacks[topic].append(callback)
+
+    def remove_listener(self, topic, callback):
+        with self._lock:
+            if callback in self._callbacks.get(topic, ()):
+                self._callbacks[topic].remove(callback)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._topics.values())
+
+    def deliver(self, topics, event, data):
+        """Fan an event out to this process's subscribers."""
+        with self._lock:
+            subscriptions, callbacks = set(), []
+            for topic in topics:
+                subscriptions.update(self._topics.get(topic, ()))
+                callbacks.extend(self._callbacks.get(topic, ()))
+        for callback in callbacks:
+            try:
+                callback(event, data)
+            except Exception:
+                logger.exception("event listener for %s failed", topics)
+        for subscription in subscriptions:
+            subscription.put((event, data))
+
+    def publish(self, session, topics, event, data):
+        """Publish after the data change has been committed."""
+        self.publish_many(session, [(topics, event, data)])
+
+    def publish_many(self, session, events):
+        """
+        Publish (topics, event, data) triples about changes session has already
+        committed. The NOTIFYs go out in a transaction of their own, so the
+        session is left alone; with changes still pending in it, nothing is
+        published on either backend, as the events would announce changes
+        that could yet be rolled back.
+        """
+        if session.new or session.dirty or session.deleted:
+            raise RuntimeError("commit the session before publishing its changes")
+        if self._engine is None:
+            for topics, event, data in events:
+                self.deliver(topics, event, data)
+            return
+        with self._engine.begin() as conn:
+            for topics, event, data in events:
+                payload = json.dumps({"topics": list(topics), "event": event, "data": data})
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                             {"channel": NOTIFY_CHANNEL, "payload": payload})
+
+    def _ensure_listener(self):
+        if self._engine is None or self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="pubsub-listener", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        # a dedicated connection outside the pool; select() yields to other
+        # greenlets under gevent, so this never polls the database
+        while True:
+            conn = None
+            try:
+                conn = self._engine.raw_connection()
+                conn.detach()
+                dbapi_conn = conn.dbapi_connection
+                dbapi_conn.autocommit = True
+                with dbapi_conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                while True:
+                    select.select([dbapi_conn], [], [], 60)
+                    dbapi_conn.poll()
+                    while dbapi_conn.notifies:
+                        message = json.loads(dbapi_conn.notifies.pop(0).payload)
+                        self.deliver(message["topics"], message["event"], message["data"])
+            except Exception:
+                logger.exception("event listener lost its connection, reconnecting")
+                if conn is not None:
+                    try:
+                        conn.dbapi_connection.close()
+                    except Exception:
+                        pass
+                threading.Event().wait(5)
+
+
+def sse_stream(subscription, keepalive=15, initial=()):
+    """Format (event, data) pairs as a text/event-stream body. The subscription
+    is closed when the client disconnects and the server closes the generator."""
+    try:
+        for event, data in initial:
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        while True:
+            item = subscription.get(timeout=keepalive)
+            if item is None:
+                yield ": keepalive\n\n"
+            else:
+                event, data = item
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    finally:
+        subscription.close()
+
+
+hub = Hub()
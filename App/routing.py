@@ -0,0 +1,122 @@
+import time
+
+import numpy as np
+
+from App.spatial import EARTH_RADIUS_M
+
+# Open-path stop sequencing: start at the van, visit every stop once, finish
+# anywhere. Nearest-neighbour builds the first route, then 2-opt segment
+# reversals and Or-opt segment moves improve it until nothing helps or the
+# time budget runs out. Each move is evaluated against all positions at once
+# with NumPy, so a pass over n stops is n vectorised steps rather than n**2.
+
+EPSILON = 1e-6
+
+
+def distance_matrix(latitudes, longitudes):
+    """Pairwise haversine distances in meters as an (n, n) array."""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _with_open_ends(dist, has_start):
+    # Add a free end node (zero distance to everything) so the path may end
+    # anywhere, and a free start node too when the van's position is unknown.
+    n = dist.shape[0]
+    offset = 0 if has_start else 1
+    padded = np.zeros((n + offset + 1, n + offset + 1))
+    padded[offset:offset + n, offset:offset + n] = dist
+    return padded
+
+
+def nearest_neighbour(dist, start=0):
+    n = dist.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    route = [start]
+    visited[start] = True
+    current = start
+    for _ in range(n - 1):
+        candidates = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(candidates))
+        visited[current] = True
+        route.append(current)
+    return np.array(route)
+
+
+def two_opt_pass(route, dist, deadline=float("inf")):
+    """One best-improvement sweep of segment reversals; returns True if improved."""
+    improved = False
+    m = len(route)
+    for i in range(1, m - 2):
+        if time.perf_counter() >= deadline:
+            break
+        a, b = route[i - 1], route[i]
+        c, d = route[i + 1:m - 1], route[i + 2:m]
+        delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+        j = int(np.argmin(delta))
+        if delta[j] < -EPSILON:
+            j += i + 1
+            route[i:j + 1] = route[i:j + 1][::-1].copy()
+            improved = True
+    return improved
+
+
+def or_opt_pass(route, dist, max_segment=3, deadline=float("inf")):
+    """Move segments of 1..max_segment stops (optionally reversed) to a better
+    position; returns True if improved."""
+    improved = False
+    m = len(route)
+    for length in range(1, max_segment + 1):
+        i = 1
+        while i + length < m and time.perf_counter() < deadline:
+            first, last = route[i], route[i + length - 1]
+            prev, nxt = route[i - 1], route[i + length]
+            removal_gain = dist[prev, first] + dist[last, nxt] - dist[prev, nxt]
+            rest = np.concatenate([route[:i], route[i + length:]])
+            left, right = rest[:-1], rest[1:]
+            edge = dist[left, right]
+            forward = dist[left, first] + dist[last, right] - edge
+            backward = dist[left, last] + dist[first, right] - edge
+            best_forward, best_backward = int(np.argmin(forward)), int(np.argmin(backward))
+            if forward[best_forward] <= backward[best_backward]:
+                k, cost, segment = best_forward, forward[best_forward], route[i:i + length]
+            else:
+                k, cost, segment = best_backward, backward[best_backward], route[i:i + length][::-1]
+            if cost - removal_gain < -EPSILON:
+                route[:] = np.concatenate([rest[:k + 1], segment, rest[k + 1:]])
+                improved = True
+            i += 1
+    return improved
+
+
+def route_length(route, dist):
+    return float(dist[route[:-1], route[1:]].sum())
+
+
+def optimize_route(latitudes, longitudes, start=None, time_budget=0.5):
+    """
+    Order stops given by their coordinates. start is the van's (lat, lon) or
+    None. Returns (order, meters): indices into the inputs in visiting order,
+    and the path length from the start (or from the first stop).
+    """
+    n = len(latitudes)
+    if n == 0:
+        return [], 0.0
+    deadline = time.perf_counter() + time_budget
+    if start is not None:
+        latitudes, longitudes = [start[0], *latitudes], [start[1], *longitudes]
+    dist = _with_open_ends(distance_matrix(latitudes, longitudes), start is not None)
+    free_end = dist.shape[0] - 1
+    route = nearest_neighbour(dist[:free_end, :free_end], start=0)
+    route = np.append(route, free_end)
+    while time.perf_counter() < deadline:
+        improved = two_opt_pass(route, dist, deadline)
+        improved = or_opt_pass(route, dist, deadline=deadline) or improved
+        if not improved:
+            break
+    # node 0 is the van (or the free start), so stop k is node k + 1
+    return [int(node) - 1 for node in route[1:-1]], route_length(route, dist)
@@ -0,0 +1,122 @@
+import math, threading
+
+EARTH_RADIUS_M = 6_371_000
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """
+    Uniform lat/lon grid of points for k-nearest lookups. Updates are O(1);
+    a query scans rings of cells outwards from the query point and stops once
+    the next ring cannot hold anything closer than the k-th best match.
+    """
+
+    def __init__(self, cell_degrees=0.01):
+        self.cell_degrees = cell_degrees
+        self._cells = {}
+        self._points = {}
+        self._bounds = None
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def get(self, key):
+        point = self._points.get(key)
+        return point[:2] if point else None
+
+    def update(self, key, lat, lon):
+        cell = self._cell(lat, lon)
+        with self._lock:
+            old = self._points.get(key)
+            if old is not None and old[2] != cell:
+                self._discard(key, old[2])
+            self._points[key] = (lat, lon, cell)
+            self._cells.setdefault(cell, {})[key] = (lat, lon)
+            if self._bounds is None:
+                self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+            else:
+                b = self._bounds
+                b[0], b[1] = min(b[0], cell[0]), max(b[1], cell[0])
+                b[2], b[3] = min(b[2], cell[1]), max(b[3], cell[1])
+
+    def remove(self, key):
+        with self._lock:
+            old = self._points.pop(key, None)
+            if old is not None:
+                self._discard(key, old[2])
+
+    def _discard(self, key, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.pop(key, None)
+            if not members:
+                del self._cells[cell]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+            self._bounds = None
+
+    def nearest(self, lat, lon, k=1):
+        """Return up to k (key, distance_m) pairs, closest first."""
+        with self._lock:
+            if not self._points or k <= 0:
+                return []
+            row, col = self._cell(lat, lon)
+            b = self._bounds
+            # every occupied cell lies within this many rings of the query cell
+            max_ring = max(abs(row - b[0]), abs(row - b[1]), abs(col - b[2]), abs(col - b[3]))
+            found = []
+            for ring in range(max_ring + 1):
+                if len(found) >= k and self._ring_min_distance(lat, ring) > found[k - 1][1]:
+                    break
+                if 8 * ring > len(self._cells):
+                    # sparse outskirts: cheaper to visit the remaining occupied cells directly
+                    cells = (cell for cell in self._cells if max(abs(cell[0] - row), abs(cell[1] - col)) >= ring)
+                else:
+                    cells = self._ring(row, col, ring)
+                for cell in cells:
+                    for key, (plat, plon) in self._cells.get(cell, {}).items():
+                        found.append((key, haversine_m(lat, lon, plat, plon)))
+                found.sort(key=lambda item: item[1])
+                del found[k:]
+                if 8 * ring > len(self._cells):
+                    break
+            return found
+
+    def _ring_min_distance(self, lat, ring):
+        # a cell r rings away is at least r - 1 whole cells away in latitude or
+        # in longitude; bound the haversine distance for both cases
+        if ring <= 1:
+            return 0.0
+        gap = math.radians((ring - 1) * self.cell_degrees)
+        highest_lat = math.radians(min(abs(lat) + (ring + 1) * self.cell_degrees, 90.0))
+        along_meridian = EARTH_RADIUS_M * gap
+        along_parallel = 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.cos(highest_lat) * math.sin(gap / 2)))
+        return min(along_meridian, along_parallel)
+
+    def _ring(self, row, col, ring):
+        if ring == 0:
+            yield (row, col)
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield (row - ring, c)
+            yield (row + ring, c)
+        for r in range(row - ring + 1, row + ring):
+            yield (r, col - ring)
+            yield (r, col + ring)
@@ -1,6 +1,6 @@
-
-async function getUserData(){
-    const response = await fetch('/api/users');
+async function getUserData(after){
+    const url = after ? `/api/users?after=${after}` : '/api/users';
+    const response = await fetch(url);
     return response.json();
 }
 
@@ -14,9 +14,12 @@ function loadTable(users){
     }
 }
 
-async function main(){
-    const users = await getUserData();
-    loadTable(users);
+async function loadPage(after){
+    const page = await getUserData(after);
+    loadTable(page.users);
+    const more = document.querySelector('#more');
+    more.style.display = page.next ? '' : 'none';
+    more.onclick = () => loadPage(page.next);
 }
 
-main();
\ No newline at end of file
+loadPage(null);
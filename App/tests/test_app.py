@@ -1,17 +1,70 @@
-import os, tempfile, pytest, logging, unittest
+import os, tempfile, pytest, logging, unittest, json, threading
+from flask import Flask, current_app, g
+from flask.globals import app_ctx
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import create_engine, event, insert, exc as sqlalchemy_exc
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from App.main import create_app
-from App.database import db, create_db
-from App.models import User
+from App.config import load_config
+from App.database import db, create_db, TimedQueuePool, pool_wait_stats, configure_engine
+from App.models import User, Driver, Drive, Street, Resident, StopRequest, DriveArchive, StopRequestArchive, Job, Notification, DriveSchedule
 from App.controllers import (
     create_user,
     get_all_users_json,
     login,
     get_user,
     get_user_by_username,
-    update_user
+    update_user,
+    get_driver_request_board,
+    get_driver_request_board_json,
+    get_upcoming_drives_for_street,
+    get_users_page,
+    export_ndjson,
+    import_schedule,
+    get_user_identity,
+    set_driver_status,
+    get_nearest_drivers,
+    get_drive_route,
+    get_drive_etas,
+    get_stop_request_eta,
+    eta_cache,
+    get_driver,
+    get_table_versions,
+    submit_stop_request,
+    configure_location_buffer,
+    flush_location_buffer,
+    location_buffer,
+    LocationBuffer,
+    record_driver_location,
+    archive_drives,
+    get_resident_stop_requests,
+    get_driver_day,
+    reconcile_request_counts,
+    enqueue_job,
+    configure_jobs,
+    claim_job,
+    run_job,
+    work,
+    job_handler,
+    get_job,
+    schedule_drive,
+    reschedule_drive,
+    cancel_drive,
+    get_inbox,
+    notify_street_residents,
+    find_double_bookings,
+    create_drive_schedule,
+    skip_schedule_occurrence,
+    expand_schedule,
+    street_drives_cache
 )
+from App.cache import LRUCache
+from App.pubsub import hub
+from App.metrics import Metrics, merge_snapshots, render_prometheus, statement_shape
+from App.spatial import GridIndex, haversine_m
+from App.routing import optimize_route
+from App.intervals import IntervalIndex
 
 
 LOGGER = logging.getLogger(__name__)
@@ -19,6 +72,68 @@ LOGGER = logging.getLogger(__name__)
 '''
    Unit Tests
 '''
+class LRUCacheUnitTests(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        self.assertDictEqual(cache.stats(), {"size": 2, "maxsize": 2, "hits": 2, "misses": 1, "evictions": 1})
+
+    def test_expired_entry_is_a_miss(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1, ttl=0)
+        assert cache.get("a") is None
+
+class GridIndexUnitTests(unittest.TestCase):
+
+    def test_nearest_matches_brute_force(self):
+        index = GridIndex(cell_degrees=0.05)
+        points = {i: (10 + (i * 7919 % 1000) / 1000, -61.5 + (i * 104729 % 1000) / 1000) for i in range(500)}
+        for key, (lat, lon) in points.items():
+            index.update(key, lat, lon)
+        index.update(0, 45.0, 2.0)
+        points[0] = (45.0, 2.0)
+        index.remove(1)
+        del points[1]
+        for lat, lon in [(10.5, -61.0), (9.0, -63.0), (44.0, 2.0)]:
+            expected = sorted(points, key=lambda key: haversine_m(lat, lon, *points[key]))[:7]
+            assert [key for key, distance in index.nearest(lat, lon, k=7)] == expected
+
+class IntervalIndexUnitTests(unittest.TestCase):
+
+    def test_overlaps_match_brute_force(self):
+        index = IntervalIndex(length=30)
+        starts = {i: (i * 7919) % 2000 for i in range(300)}
+        for i, start in starts.items():
+            index.add(i % 3, start, i)
+        assert index.remove(0, starts[0], 0) and not index.remove(0, starts[0], 0)
+        del starts[0]
+        for key, start in [(1, 100), (2, 1999), (1, -40)]:
+            expected = sorted(i for i, s in starts.items() if i % 3 == key and abs(s - start) < 30)
+            assert sorted(item for s, item in index.overlapping(key, start)) == expected
+        expected = {(min(i, j), max(i, j)) for i in starts for j in starts
+                    if i != j and i % 3 == j % 3 and abs(starts[i] - starts[j]) < 30}
+        assert {(min(a[1], b[1]), max(a[1], b[1])) for key, a, b in index.overlaps()} == expected
+
+class RouteOptimizerUnitTests(unittest.TestCase):
+
+    def test_orders_stops_along_a_line(self):
+        latitudes = [10.64, 10.60, 10.63, 10.61, 10.62]
+        order, meters = optimize_route(latitudes, [-61.5] * 5, start=(10.595, -61.5))
+        assert order == [1, 3, 4, 2, 0]
+        assert round(meters) == round(haversine_m(10.595, -61.5, 10.64, -61.5))
+
+    def test_every_stop_visited_once(self):
+        latitudes = [10.6 + (i * 37 % 100) / 1000 for i in range(120)]
+        longitudes = [-61.5 + (i * 61 % 100) / 1000 for i in range(120)]
+        order, meters = optimize_route(latitudes, longitudes, time_budget=0.2)
+        assert sorted(order) == list(range(120))
+
 class UserUnitTests(unittest.TestCase):
 
     def test_new_user(self):
@@ -75,5 +190,884 @@ class UsersIntegrationTests(unittest.TestCase):
         update_user(1, "ronnie")
         user = get_user(1)
         assert user.username == "ronnie"
-        
 
+
+class DriverIntegrationTests(unittest.TestCase):
+
+    def test_driver_request_board(self):
+        driver_user = create_user("dave", "davepass")
+        street = Street(name="Baguette")
+        db.session.add(street)
+        db.session.flush()
+        driver = Driver(user_id=driver_user.id)
+        db.session.add(driver)
+        db.session.flush()
+        later = datetime.utcnow() + timedelta(hours=1)
+        drives = [Drive(driver_id=driver.id, street_id=street.id, arrive_at=later + timedelta(hours=i)) for i in range(3)]
+        db.session.add_all(drives)
+        db.session.flush()
+        for i in range(3):
+            resident_user = create_user(f"res{i}", "respass")
+            resident = Resident(user_id=resident_user.id, street_id=street.id, address=f"{i} Crust")
+            db.session.add(resident)
+            db.session.flush()
+            for drive in drives:
+                db.session.add(StopRequest(resident_id=resident.id, drive_id=drive.id, address=resident.address))
+        db.session.commit()
+        driver_id, drive_ids = driver.id, [d.id for d in drives]
+        db.session.expunge_all()
+
+        statements = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            board = get_driver_request_board_json(driver_id)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+
+        assert len(statements) == 2
+        assert [d["id"] for d in board] == drive_ids
+        assert board[0]["street_name"] == "Baguette"
+        assert [r["username"] for r in board[0]["stop_requests"]] == ["res0", "res1", "res2"]
+        assert get_driver_request_board(driver_id, since=later + timedelta(hours=2))[0].id == drive_ids[2]
+
+    def test_upcoming_drives_cache_invalidated_on_write(self):
+        street = Street(name="Focaccia")
+        db.session.add(street)
+        db.session.commit()
+        driver = Driver.query.first()
+        first = Drive(driver_id=driver.id, street_id=street.id, arrive_at=datetime.utcnow() + timedelta(hours=3))
+        db.session.add(first)
+        db.session.commit()
+
+        misses = street_drives_cache.misses
+        assert [d.id for d in get_upcoming_drives_for_street(street.id)] == [first.id]
+        assert [d.id for d in get_upcoming_drives_for_street(street.id)] == [first.id]
+        assert street_drives_cache.misses == misses + 1
+
+        second = Drive(driver_id=driver.id, street_id=street.id, arrive_at=datetime.utcnow() + timedelta(hours=1))
+        db.session.add(second)
+        db.session.commit()
+        assert [d.id for d in get_upcoming_drives_for_street(street.id)] == [second.id, first.id]
+
+        db.session.delete(second)
+        db.session.commit()
+        assert [d.id for d in get_upcoming_drives_for_street(street.id)] == [first.id]
+
+
+class UserPaginationIntegrationTests(unittest.TestCase):
+
+    def test_get_users_page_walks_every_user(self):
+        expected = [user["id"] for user in get_all_users_json()]
+        seen, after = [], None
+        while True:
+            rows, after = get_users_page(limit=2, after=after)
+            seen.extend(row.id for row in rows)
+            if after is None:
+                break
+        assert seen == expected
+
+    def test_users_api_returns_next_cursor(self):
+        client = current_app.test_client()
+        first = client.get('/api/users?limit=1').get_json()
+        assert first["users"] == [{"id": 1, "username": "ronnie"}]
+        assert first["next"] == 1
+        second = client.get(f'/api/users?limit=1&after={first["next"]}').get_json()
+        assert second["users"][0]["id"] == 2
+        assert client.get('/api/users?limit=abc').status_code == 400
+
+
+class ExportIntegrationTests(unittest.TestCase):
+
+    def test_export_drives(self):
+        rows = [json.loads(line) for line in export_ndjson('drives', batch_size=2)]
+        assert [row["id"] for row in rows] == [d.id for d in Drive.query.order_by(Drive.id).all()]
+        assert rows[0]["street_name"] == "Baguette"
+        assert list(export_ndjson('drives', status='CANCELLED')) == []
+
+    def test_export_stop_requests_in_range(self):
+        now = datetime.utcnow()
+        rows = [json.loads(line) for line in export_ndjson('stop-requests', since=now - timedelta(days=1), until=now)]
+        assert len(rows) == StopRequest.query.count()
+        assert rows[0]["street_name"] == "Baguette"
+        assert list(export_ndjson('stop-requests', since=now)) == []
+
+    def test_export_unknown_entity(self):
+        with pytest.raises(ValueError):
+            export_ndjson('users')
+
+
+class ScheduleImportIntegrationTests(unittest.TestCase):
+
+    def test_import_schedule(self):
+        create_user("importer", "importpass")
+        rows = [
+            {"type": "street", "name": "Pumpernickel"},
+            {"type": "resident", "username": "importer", "street": "Pumpernickel", "address": "9 Loaf"},
+            {"type": "drive", "driver": "dave", "street": "pumpernickel", "arrive_at": "2099-01-01 09:00"},
+            {"type": "drive", "driver": "dave", "street": "Pumpernickel", "arrive_at": "tomorrow"},
+            {"type": "resident", "username": "importer", "street": "Pumpernickel", "address": "9 Loaf"},
+            {"type": "street", "name": "Baguette"},
+        ]
+        report = import_schedule(rows, chunk_size=4)
+        self.assertDictEqual(report["inserted"], {"street": 1, "resident": 1, "drive": 1})
+        assert [r["line"] for r in report["rejected"]] == [4, 5, 6]
+        street = Street.query.filter_by(name="Pumpernickel").one()
+        assert [d.arrive_at for d in get_upcoming_drives_for_street(street.id)] == [datetime(2099, 1, 1, 9, 0)]
+
+
+class IdentityCacheIntegrationTests(unittest.TestCase):
+
+    def test_authenticated_requests_skip_identity_queries(self):
+        create_user("ida", "idapass")
+        client = current_app.test_client()
+        headers = {"Authorization": f"Bearer {login('ida', 'idapass')}"}
+        client.get('/identify', headers=headers)
+
+        statements = []
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            response = client.get('/identify', headers=headers)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+        assert response.status_code == 200
+        assert "ida" in response.get_data(as_text=True)
+        assert statements == []
+
+    def test_update_user_refreshes_identity(self):
+        user = get_user_by_username("ida")
+        assert get_user_identity(user.id).username == "ida"
+        update_user(user.id, "idabel")
+        assert get_user_identity(user.id).username == "idabel"
+
+
+class PasswordRehashIntegrationTests(unittest.TestCase):
+
+    def test_login_upgrades_legacy_hash(self):
+        user = create_user("lena", "lenapass")
+        assert not user.password_needs_rehash()
+        user.password = generate_password_hash("lenapass", method="pbkdf2:sha256:1000")
+        db.session.commit()
+        assert user.password_needs_rehash()
+
+        assert login("lena", "lenapass") is not None
+        user = get_user_by_username("lena")
+        assert not user.password_needs_rehash()
+        assert user.check_password("lenapass")
+
+
+class DriverEventsIntegrationTests(unittest.TestCase):
+
+    def test_status_update_reaches_street_subscribers(self):
+        drive = Drive.query.join(Street).filter(Street.name == "Baguette").first()
+        subscription = hub.subscribe(f"street:{drive.street_id}")
+        try:
+            set_driver_status(drive.driver_id, "DELAYED", "Flour Mill")
+            event, data = subscription.get(timeout=1)
+        finally:
+            subscription.close()
+        assert event == "status"
+        assert (data["status"], data["location"]) == ("DELAYED", "Flour Mill")
+        assert hub.subscriber_count() == 0
+
+    def test_status_update_needs_a_json_object(self):
+        driver = Driver.query.join(User).filter(User.username == "dave").one()
+        client = current_app.test_client()
+        headers = {"Authorization": f"Bearer {login('dave', 'davepass')}"}
+        url = f'/api/drivers/{driver.id}/status'
+        for body in ([], "EN_ROUTE", None):
+            assert client.put(url, json=body, headers=headers).status_code == 400
+        assert client.put(url, data="not json", headers=headers).status_code == 400
+        response = client.put(url, json={"status": "OFF_DUTY"}, headers=headers)
+        assert response.status_code == 200 and response.get_json()["status"] == "OFF_DUTY"
+
+    def test_publish_leaves_pending_changes_alone(self):
+        driver = Driver.query.join(User).filter(User.username == "dave").one()
+        location = driver.location
+        driver.location = "Somewhere uncommitted"
+        subscription = hub.subscribe(f"driver:{driver.id}")
+        try:
+            with self.assertRaises(RuntimeError):
+                hub.publish(db.session, [f"driver:{driver.id}"], "status", driver.get_json())
+            assert subscription.get(timeout=0) is None
+        finally:
+            subscription.close()
+        assert driver in db.session.dirty
+        db.session.rollback()
+        assert db.session.get(Driver, driver.id).location == location
+
+    def test_driver_event_stream_starts_with_current_status(self):
+        driver = Driver.query.join(User).filter(User.username == "dave").one()
+        client = current_app.test_client()
+        headers = {"Authorization": f"Bearer {login('dave', 'davepass')}"}
+        response = client.get(f'/api/drivers/{driver.id}/events', headers=headers, buffered=False)
+        assert response.mimetype == "text/event-stream"
+        first = next(response.response).decode()
+        response.close()
+        assert first.startswith("event: status\n")
+        assert json.loads(first.split("data: ")[1]) == driver.get_json()
+
+
+class NearestDriverIntegrationTests(unittest.TestCase):
+
+    def test_nearest_drivers_follow_status_updates(self):
+        driver = Driver.query.join(User).filter(User.username == "dave").one()
+        set_driver_status(driver.id, "EN_ROUTE", "Port of Spain", 10.6549, -61.5019)
+        nearest = get_nearest_drivers(10.66, -61.50, k=3)
+        assert [d["driver_id"] for d in nearest] == [driver.id]
+        assert nearest[0]["distance_m"] < 1000
+
+        client = current_app.test_client()
+        assert client.get('/api/drivers/nearest?lat=10.66&lon=-61.5&k=1').get_json()[0]["driver_id"] == driver.id
+        assert client.get('/api/drivers/nearest?lat=100&lon=0').status_code == 400
+
+        set_driver_status(driver.id, "OFF_DUTY")
+        assert get_nearest_drivers(10.66, -61.50) == []
+
+
+class DriveRouteIntegrationTests(unittest.TestCase):
+
+    def test_route_cached_until_stops_change(self):
+        drive = Drive.query.join(Street).filter(Street.name == "Baguette").order_by(Drive.id).first()
+        requests = StopRequest.query.filter_by(drive_id=drive.id).order_by(StopRequest.id).all()
+        for i, req in enumerate(requests):
+            req.resident.latitude, req.resident.longitude = 10.60 + 0.01 * (len(requests) - i), -61.5
+            req.status = "CONFIRMED"
+        db.session.commit()
+
+        route = get_drive_route(drive.id)
+        assert [s["stop_request_id"] for s in route["stops"]] in ([r.id for r in requests], [r.id for r in reversed(requests)])
+        assert get_drive_route(drive.id) is route
+
+        requests[0].status = "CANCELLED"
+        db.session.commit()
+        rerouted = get_drive_route(drive.id)
+        assert rerouted is not route
+        assert len(rerouted["stops"]) == len(requests) - 1
+        assert get_drive_route(999999) is None
+
+
+class DriveEtaIntegrationTests(unittest.TestCase):
+
+    def test_etas_follow_driver_progress(self):
+        drive = Drive.query.join(Street).filter(Street.name == "Baguette").order_by(Drive.id).first()
+        set_driver_status(drive.driver_id, "OFF_DUTY")
+        etas = get_drive_etas(drive.id)
+        stops = etas["stops"]
+        assert len(stops) >= 2
+        assert stops[0]["eta"] == drive.arrive_at.isoformat()
+        assert not any(stop["passed"] for stop in stops)
+
+        # the next drive's stops are on the same streets, but the van isn't on that drive yet
+        later = Drive.query.filter(Drive.driver_id == drive.driver_id, Drive.arrive_at > drive.arrive_at).order_by(Drive.arrive_at).first()
+        for req in StopRequest.query.filter_by(drive_id=later.id):
+            req.status = "CONFIRMED"
+        db.session.commit()
+        later_stops = get_drive_etas(later.id)["stops"]
+        assert later_stops[0]["eta"] == later.arrive_at.isoformat()
+
+        route = get_drive_route(drive.id)["stops"]
+        first, second = route[0], route[1]
+        # the van is at the first stop ahead of time: the rest stay due on schedule
+        set_driver_status(drive.driver_id, "EN_ROUTE", "first stop", first["latitude"], first["longitude"])
+        early = get_drive_etas(drive.id)["stops"]
+        assert early[0]["passed"] and early[0]["eta"] is None
+        assert not early[1]["passed"] and early[1]["eta"] == stops[1]["eta"]
+        assert get_drive_etas(later.id)["stops"] == later_stops
+
+        # running an hour behind, the ETAs follow the van
+        scheduled_at = drive.arrive_at
+        drive.arrive_at = datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+        eta_cache.invalidate(drive.id)
+        set_driver_status(drive.driver_id, "EN_ROUTE", "first stop", first["latitude"], first["longitude"])
+        on_time = get_drive_etas(drive.id)["stops"]
+        assert on_time[0]["passed"] and not on_time[1]["passed"]
+        reported = datetime.fromisoformat(get_driver(drive.driver_id).get_json()["status_updated_at"])
+        assert datetime.fromisoformat(on_time[1]["eta"]) > reported
+
+        set_driver_status(drive.driver_id, "DELAYED", "first stop", first["latitude"], first["longitude"])
+        delayed = get_stop_request_eta(second["stop_request_id"])
+        assert delayed["drive_id"] == drive.id and delayed["sequence"] == 2
+        assert datetime.fromisoformat(delayed["eta"]) - datetime.fromisoformat(on_time[1]["eta"]) >= timedelta(minutes=10)
+
+        client = current_app.test_client()
+        headers = {"Authorization": f"Bearer {login('dave', 'davepass')}"}
+        assert client.get(f'/api/drives/{drive.id}/etas', headers=headers).get_json()["stops"][1] == {
+            key: value for key, value in delayed.items() if key != "drive_id"
+        }
+        assert client.get('/api/drives/999999/etas', headers=headers).status_code == 404
+        drive.arrive_at = scheduled_at
+        db.session.commit()
+
+
+class DatabasePoolUnitTests(unittest.TestCase):
+
+    def test_timed_pool_records_checkout_waits(self):
+        path = os.path.join(tempfile.mkdtemp(), "pool.db")
+        engine = create_engine(f"sqlite:///{path}", poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05)
+        pool_wait_stats.reset()
+        held = engine.connect()
+        with pytest.raises(sqlalchemy_exc.TimeoutError):
+            engine.connect()
+        held.close()
+        engine.connect().close()
+        stats = pool_wait_stats.snapshot()
+        assert stats["checkouts"] == 3 and stats["timeouts"] == 1
+        assert stats["wait_ms_max"] >= 50
+        engine.dispose()
+
+    def test_engine_options_for_server_databases(self):
+        app = Flask(__name__)
+        load_config(app, {"SQLALCHEMY_DATABASE_URI": "postgresql+psycopg2://localhost/breadvan", "DB_GEVENT": False, "DB_POOL_SIZE": 3})
+        configure_engine(app)
+        options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        assert options['poolclass'] is TimedQueuePool and options['pool_size'] == 3 and options['pool_pre_ping']
+        assert 'poolclass' not in current_app.config['SQLALCHEMY_ENGINE_OPTIONS']
+
+
+class MetricsIntegrationTests(unittest.TestCase):
+
+    def test_metrics_endpoint_reports_requests_and_queries(self):
+        client = current_app.test_client()
+        assert client.get('/api/users?limit=2').status_code == 200
+        body = client.get('/metrics').get_data(as_text=True)
+        assert 'breadvan_http_requests_total{method="GET",endpoint="/api/users",status="200"}' in body
+        assert 'breadvan_db_queries_per_request_count{method="GET",endpoint="/api/users"}' in body
+        assert 'breadvan_http_request_duration_seconds_bucket{method="GET",endpoint="/api/users",le="+Inf"}' in body
+
+    def test_metrics_summed_across_workers(self):
+        worker = Metrics()
+        worker.observe("GET", "/health", 200, 0.002, 0, 0.0)
+        worker.observe("GET", "/health", 200, 0.3, 0, 0.0)
+        merged = merge_snapshots([worker.snapshot(), worker.snapshot()])
+        assert merged["endpoints"]["GET /health"]["count"] == 4
+        assert merged["endpoints"]["GET /health"]["latency"][0] == 2
+        assert 'breadvan_http_requests_total{method="GET",endpoint="/health",status="200"} 4' in render_prometheus(merged)
+
+    def test_repeated_statements_flagged_as_n_plus_one(self):
+        app = current_app._get_current_object()
+        with app.test_request_context('/api/users'):
+            app.preprocess_request()
+            for user_id in range(12):
+                db.session.get(User, 100000 + user_id)
+            with self.assertLogs('App.metrics', level='WARNING') as logs:
+                app.do_teardown_request()
+        assert "possible N+1" in logs.output[0]
+        assert statement_shape("SELECT a FROM t WHERE id IN (?, ?, ?)") == "SELECT a FROM t WHERE id IN (?)"
+
+    def test_failed_statements_are_not_timed(self):
+        app = current_app._get_current_object()
+        with app.test_request_context('/api/users'):
+            app.preprocess_request()
+            with self.assertRaises(sqlalchemy_exc.OperationalError):
+                db.session.execute(db.text("SELECT * FROM no_such_table"))
+            db.session.rollback()
+            db.session.get(User, 100000)
+            stats = g.request_stats
+            assert stats.queries == 1 and 0 <= stats.db_seconds < 1
+            app.do_teardown_request()
+
+
+class AppProfileIntegrationTests(unittest.TestCase):
+
+    def create_profile_app(self, profile):
+        app = create_app({"SQLALCHEMY_DATABASE_URI": current_app.config["SQLALCHEMY_DATABASE_URI"], "APP_PROFILE": profile})
+        # create_app pushes its own context; go back to the suite's app
+        self.addCleanup(app_ctx._get_current_object().pop)
+        return app
+
+    def test_api_profile_skips_admin_and_answers_json(self):
+        app = self.create_profile_app("api")
+        assert "admin" not in app.blueprints and "_uploads" not in app.blueprints
+        response = app.test_client().get('/api/identify')
+        assert response.status_code == 401 and "message" in response.get_json()
+
+    def test_cli_profile_serves_nothing(self):
+        app = self.create_profile_app("cli")
+        assert [rule.rule for rule in app.url_map.iter_rules()] == ['/static/<path:filename>']
+        assert len(get_users_page(limit=1)[0]) == 1
+
+    def test_unknown_profile_rejected(self):
+        with pytest.raises(ValueError):
+            create_app({"APP_PROFILE": "mobile"})
+
+
+class ConditionalGetIntegrationTests(unittest.TestCase):
+
+    def test_users_api_revalidates_with_etag(self):
+        client = current_app.test_client()
+        first = client.get('/api/users?limit=5')
+        etag = first.headers['ETag']
+        cached = client.get('/api/users?limit=5', headers={'If-None-Match': etag})
+        assert cached.status_code == 304 and cached.headers['ETag'] == etag and not cached.data
+
+        create_user("uma", "umapass")
+        changed = client.get('/api/users?limit=5', headers={'If-None-Match': etag})
+        assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+    def test_flushes_and_bulk_writes_bump_table_versions(self):
+        before = get_table_versions(['street', 'drive'])
+        db.session.add(Street(name="Versioned Lane"))
+        db.session.commit()
+        middle = get_table_versions(['street', 'drive'])
+        assert middle['street'] == before['street'] + 1 and middle['drive'] == before['drive']
+
+        db.session.execute(insert(Street), [{"name": "Versioned Row"}, {"name": "Versioned Close"}])
+        db.session.commit()
+        assert get_table_versions(['street'])['street'] == middle['street'] + 1
+
+
+class StopRequestIngestionIntegrationTests(unittest.TestCase):
+
+    def test_submissions_are_idempotent(self):
+        street = Street(name="Idempotent Way")
+        db.session.add(street)
+        db.session.flush()
+        user = create_user("ivy", "ivypass")
+        db.session.add(Resident(user_id=user.id, street_id=street.id, address="1 Idempotent Way"))
+        driver = Driver.query.first()
+        upcoming = Drive(driver_id=driver.id, street_id=street.id, arrive_at=datetime.utcnow() + timedelta(hours=2))
+        past = Drive(driver_id=driver.id, street_id=street.id, arrive_at=datetime.utcnow() - timedelta(hours=2))
+        db.session.add_all([upcoming, past])
+        db.session.commit()
+
+        client = current_app.test_client()
+        headers = {"Authorization": f"Bearer {login('ivy', 'ivypass')}", "Idempotency-Key": "retry-1"}
+        url = f'/api/drives/{upcoming.id}/stop-requests'
+        first = client.post(url, json={"address": "By the mango tree"}, headers=headers)
+        assert first.status_code == 201 and first.get_json()["created"]
+        retried = client.post(url, json={"address": "By the mango tree"}, headers=headers)
+        assert retried.status_code == 201 and retried.get_json() == first.get_json()
+        assert client.post(url, json={"address": "Elsewhere"}, headers=headers).status_code == 422
+        assert client.post(url, json=["By the mango tree"], headers=headers).status_code == 400
+
+        fresh_key = dict(headers, **{"Idempotency-Key": "retry-2"})
+        again = client.post(url, json={"address": "By the mango tree"}, headers=fresh_key)
+        assert again.status_code == 200 and not again.get_json()["created"]
+        assert again.get_json()["stop_request"]["id"] == first.get_json()["stop_request"]["id"]
+        assert StopRequest.query.filter_by(drive_id=upcoming.id).count() == 1
+
+        assert submit_stop_request(user.id, past.id)[0] == 409
+        assert submit_stop_request(user.id, 999999)[0] == 404
+        assert submit_stop_request(driver.user_id, upcoming.id)[0] == 403
+
+
+class DriverLocationBufferIntegrationTests(unittest.TestCase):
+
+    def test_pings_coalesce_until_flushed(self):
+        current_app.config['LOCATION_FLUSH_SECONDS'] = 3600  # flushed by hand below
+        configure_location_buffer(current_app)
+        driver = Driver.query.join(User).filter(User.username == "dave").one()
+        stored = (driver.latitude, driver.longitude)
+        client = current_app.test_client()
+        headers = {"Authorization": f"Bearer {login('dave', 'davepass')}"}
+        url = f'/api/drivers/{driver.id}/location'
+        for step in range(3):
+            response = client.post(url, json={"latitude": 10.6 + step / 100, "longitude": -61.5}, headers=headers)
+            assert response.status_code == 202
+        assert client.post(url, json={"latitude": 91, "longitude": 0}, headers=headers).status_code == 400
+        assert client.post(url, json=[10.6, -61.5], headers=headers).status_code == 400
+
+        assert client.get(url).get_json()["latitude"] == 10.62
+        assert location_buffer.pending_count() == 1
+        db.session.expire_all()
+        row = db.session.get(Driver, driver.id)
+        assert (row.latitude, row.longitude) == stored
+
+        assert flush_location_buffer() == 1
+        db.session.expire_all()
+        assert db.session.get(Driver, driver.id).latitude == 10.62
+        assert location_buffer.pending_count() == 0
+
+        # a ping older than the stored row (e.g. buffered by another worker) is not written
+        location_buffer.clear()
+        record_driver_location(driver.id, 0.0, 0.0, reported_at=datetime.utcnow() - timedelta(hours=1))
+        assert flush_location_buffer() == 0
+        db.session.expire_all()
+        assert db.session.get(Driver, driver.id).latitude == 10.62
+
+        # another worker's write shows up once the state known here is stale
+        db.session.execute(db.update(Driver).filter_by(id=driver.id).values(location="Elsewhere"))
+        db.session.commit()
+        assert client.get(url).get_json()["location"] != "Elsewhere"
+        location_buffer.configure(ttl=-1)
+        assert client.get(url).get_json()["location"] == "Elsewhere"
+        configure_location_buffer(current_app)
+
+    def test_known_states_are_bounded_but_unwritten_pings_kept(self):
+        now = datetime.utcnow()
+        buffer = LocationBuffer(maxsize=2, ttl=60)
+        buffer.record({"id": 1, "status": "EN_ROUTE", "status_updated_at": now})
+        buffer.remember({"id": 2, "status": "EN_ROUTE", "status_updated_at": now})
+        buffer.remember({"id": 3, "status": "EN_ROUTE", "status_updated_at": now})
+        assert buffer.get(1) and buffer.get(2) is None and buffer.get(3)
+        buffer.configure(ttl=-1)
+        assert buffer.get(3) is None and buffer.get(1)["id"] == 1
+        assert [state["id"] for state in buffer.take_pending()] == [1]
+
+
+class ArchiveIntegrationTests(unittest.TestCase):
+
+    def test_old_drives_move_to_archive_with_their_requests(self):
+        street = Street(name="Archive Row")
+        db.session.add(street)
+        db.session.flush()
+        user = create_user("otto", "ottopass")
+        resident = Resident(user_id=user.id, street_id=street.id, address="3 Archive Row")
+        driver = Driver.query.first()
+        old = Drive(driver_id=driver.id, street_id=street.id, arrive_at=datetime.utcnow() - timedelta(days=40),
+                    status="COMPLETE")
+        recent = Drive(driver_id=driver.id, street_id=street.id, arrive_at=datetime.utcnow() - timedelta(days=2))
+        db.session.add_all([resident, old, recent])
+        db.session.flush()
+        db.session.add_all([
+            StopRequest(resident_id=resident.id, drive_id=old.id, address="3 Archive Row", status="COMPLETED",
+                        requested_at=datetime.utcnow() - timedelta(days=41)),
+            StopRequest(resident_id=resident.id, drive_id=recent.id, address="3 Archive Row"),
+        ])
+        db.session.commit()
+        old_id, recent_id = old.id, recent.id
+
+        report = archive_drives(timedelta(days=30), chunk_size=1)
+        assert report["done"] and report["drives"] >= 1 and report["stop_requests"] >= 1
+        assert db.session.get(Drive, old_id) is None and db.session.get(Drive, recent_id) is not None
+        assert db.session.get(DriveArchive, old_id).status == "COMPLETE"
+        assert StopRequestArchive.query.filter_by(drive_id=old_id).count() == 1
+        assert archive_drives(timedelta(days=30))["drives"] == 0
+
+        assert [r["drive_id"] for r in get_resident_stop_requests(resident.id)] == [recent_id]
+        history = get_resident_stop_requests(resident.id, include_archived=True)
+        assert [(r["drive_id"], r["archived"]) for r in history] == [(recent_id, False), (old_id, True)]
+
+        exported = [json.loads(line) for line in export_ndjson("drives", include_archived=True)]
+        assert old_id in [row["id"] for row in exported]
+        assert old_id not in [json.loads(line)["id"] for line in export_ndjson("drives")]
+
+        client = current_app.test_client()
+        headers = {"Authorization": f"Bearer {login('otto', 'ottopass')}"}
+        assert len(client.get('/api/stop-requests', headers=headers).get_json()) == 1
+        assert len(client.get('/api/stop-requests?archived=true', headers=headers).get_json()) == 2
+
+
+class RequestCountIntegrationTests(unittest.TestCase):
+
+    def test_counters_follow_request_writes_and_reconcile(self):
+        street = Street(name="Counter Close")
+        db.session.add(street)
+        db.session.flush()
+        users = [create_user(f"counter{i}", "counterpass") for i in range(3)]
+        residents = [Resident(user_id=u.id, street_id=street.id, address=f"{i} Counter Close")
+                     for i, u in enumerate(users)]
+        driver = Driver.query.join(User).filter(User.username == "dave").one()
+        drive = Drive(driver_id=driver.id, street_id=street.id, arrive_at=datetime.utcnow() + timedelta(hours=1))
+        db.session.add_all(residents + [drive])
+        db.session.flush()
+        first, second = (StopRequest(resident_id=r.id, drive_id=drive.id, address=r.address) for r in residents[:2])
+        db.session.add_all([first, second])
+        db.session.commit()
+        counts = lambda: db.session.execute(db.select(
+            Drive.pending_requests, Drive.confirmed_requests, Drive.total_requests).filter_by(id=drive.id)).one()
+        assert counts() == (2, 0, 2)
+
+        first.status = "CONFIRMED"
+        db.session.commit()
+        assert counts() == (1, 1, 2)
+        assert submit_stop_request(users[2].id, drive.id)[0] == 201
+        assert counts() == (2, 1, 3)
+        db.session.delete(second)
+        db.session.commit()
+        assert counts() == (1, 1, 2)
+
+        day = [d for d in get_driver_day(driver.id, drive.arrive_at.date()) if d["id"] == drive.id]
+        assert (day[0]["street_name"], day[0]["total_requests"]) == ("Counter Close", 2)
+        client = current_app.test_client()
+        headers = {"Authorization": f"Bearer {login('dave', 'davepass')}"}
+        response = client.get(f'/api/drivers/{driver.id}/drives?date={drive.arrive_at.date()}', headers=headers)
+        assert drive.id in [d["id"] for d in response.get_json()]
+
+        db.session.execute(db.update(Drive).filter_by(id=drive.id).values(pending_requests=9))
+        db.session.commit()
+        report = reconcile_request_counts(repair=False)
+        assert [d["drive_id"] for d in report["drifted"]] == [drive.id] and counts() == (9, 1, 2)
+        assert reconcile_request_counts()["repaired"] == 1
+        assert counts() == (1, 1, 2)
+        assert reconcile_request_counts()["drifted"] == []
+
+
+class JobQueueIntegrationTests(unittest.TestCase):
+
+    def setUp(self):
+        # run what earlier tests queued (imports queue notifications) out of the way
+        work(burst=True)
+
+    def test_failed_jobs_retry_with_backoff_until_they_run_out_of_attempts(self):
+        calls = []
+        @job_handler("test_flaky")
+        def flaky(payload):
+            calls.append(payload["n"])
+            if len(calls) < 2:
+                raise RuntimeError("try again")
+            return {"calls": len(calls)}
+
+        job_id = enqueue_job("test_flaky", {"n": 1}, max_attempts=3).id
+        assert work(burst=True) == {"SUCCEEDED": 0, "QUEUED": 1, "FAILED": 0}
+        job = get_job(job_id)
+        assert job.status == "QUEUED" and job.run_at > datetime.utcnow() and "try again" in job.last_error
+        # not due yet, so a burst worker leaves it alone
+        assert sum(work(burst=True).values()) == 0
+
+        db.session.execute(db.update(Job).filter_by(id=job_id).values(run_at=datetime.utcnow()))
+        db.session.commit()
+        assert work(burst=True)["SUCCEEDED"] == 1
+        job = get_job(job_id)
+        assert (job.status, job.attempts, json.loads(job.result)) == ("SUCCEEDED", 2, {"calls": 2})
+
+        calls.clear()
+        doomed_id = enqueue_job("test_flaky", {"n": 2}, max_attempts=1).id
+        assert work(burst=True)["FAILED"] == 1
+        assert get_job(doomed_id).status == "FAILED"
+
+    def test_claimed_job_is_not_claimed_again_until_its_lease_expires(self):
+        @job_handler("test_noop")
+        def noop(payload):
+            return payload
+
+        job = enqueue_job("test_noop", {"ok": True})
+        claimed = claim_job("worker-a")
+        assert claimed.id == job.id and claimed.locked_by == "worker-a"
+        assert claim_job("worker-b") is None
+
+        db.session.execute(db.update(Job).filter_by(id=job.id).values(locked_at=datetime.utcnow() - timedelta(hours=1)))
+        db.session.commit()
+        reclaimed = claim_job("worker-b")
+        assert (reclaimed.id, reclaimed.locked_by, reclaimed.attempts) == (job.id, "worker-b", 2)
+        assert run_job(reclaimed) == "SUCCEEDED"
+
+    def test_running_job_keeps_its_lease(self):
+        @job_handler("test_slow")
+        def slow(payload):
+            threading.Event().wait(payload["seconds"])
+            # outlived its lease, but the worker renewed it all along
+            return {"taken_over": claim_job("worker-b") is not None}
+
+        current_app.config['JOB_LEASE_SECONDS'] = 0.3
+        configure_jobs(current_app)
+        try:
+            job_id = enqueue_job("test_slow", {"seconds": 0.6}).id
+            assert work(burst=True)["SUCCEEDED"] == 1
+        finally:
+            current_app.config['JOB_LEASE_SECONDS'] = 600
+            configure_jobs(current_app)
+        assert json.loads(get_job(job_id).result) == {"taken_over": False}
+
+    def test_init_only_queues_the_rebuild(self):
+        client = current_app.test_client()
+        # it drops every table, so nobody anonymous gets to queue it
+        assert client.get('/init').status_code == 401
+        assert Job.query.filter_by(kind="initialize").count() == 0
+        response = client.get('/init', headers={"Authorization": f"Bearer {login('dave', 'davepass')}"})
+        assert response.status_code == 202
+        job_id = response.get_json()["job"]["id"]
+        status = client.get(response.headers["Location"]).get_json()
+        assert (status["id"], status["kind"], status["status"]) == (job_id, "initialize", "QUEUED")
+        assert client.get('/api/jobs/999999').status_code == 404
+        # no worker should rebuild the test database
+        db.session.execute(db.delete(Job).filter_by(id=job_id))
+        db.session.commit()
+
+
+class NotificationInboxIntegrationTests(unittest.TestCase):
+
+    def test_drive_changes_fan_out_to_the_street_inbox(self):
+        street = Street(name="Notice Lane")
+        db.session.add(street)
+        db.session.flush()
+        users = [create_user(f"notice{i}", "noticepass") for i in range(3)]
+        db.session.add_all([Resident(user_id=u.id, street_id=street.id, address=f"{i} Notice Lane")
+                            for i, u in enumerate(users)])
+        db.session.commit()
+        street_id = street.id
+        resident_id = Resident.query.filter_by(user_id=users[0].id).one().id
+        driver_id = Driver.query.first().id
+
+        first = schedule_drive(driver_id, street_id, datetime.utcnow() + timedelta(days=20, hours=3)).id
+        second = schedule_drive(driver_id, street_id, datetime.utcnow() + timedelta(days=20, hours=5)).id
+        reschedule_drive(second, datetime.utcnow() + timedelta(days=20, hours=6))
+        cancel_drive(first)
+        with self.assertRaises(ValueError):
+            reschedule_drive(first, datetime.utcnow() + timedelta(days=20, hours=7))
+        assert work(burst=True)["SUCCEEDED"] == 4
+        assert Notification.query.filter_by(street_id=street_id).count() == 12
+        # a retried fan-out doesn't tell anyone twice
+        payloads = [json.loads(job.payload) for job in Job.query.filter_by(kind="notify_drives")]
+        cancelled = next(p for p in payloads if p["drive_ids"] == [first] and p["kind"] == "DRIVE_CANCELLED")
+        assert notify_street_residents([first], "DRIVE_CANCELLED", cancelled["change_id"]) == 0
+
+        client = current_app.test_client()
+        headers = {"Authorization": f"Bearer {login('notice0', 'noticepass')}"}
+        inbox = client.get('/api/notifications?limit=3', headers=headers).get_json()
+        assert inbox["unread"] == 4 and len(inbox["notifications"]) == 3 and inbox["next"]
+        assert inbox["notifications"][0]["kind"] == "DRIVE_CANCELLED"
+        read_id = inbox["notifications"][1]["id"]
+        marked = client.post('/api/notifications/read', json={"ids": [read_id]}, headers=headers).get_json()
+        assert marked == {"marked": 1}
+
+        page = get_inbox(resident_id, limit=2)
+        assert [n["read"] for n in page["notifications"]] == [False, False] and page["unread"] == 3
+        rest = client.get(f'/api/notifications?limit=2&after={page["next"]}', headers=headers).get_json()
+        assert [n["read"] for n in rest["notifications"]] == [False, True] and rest["next"] is None
+        assert client.get('/api/notifications?after=nonsense', headers=headers).status_code == 400
+        assert client.post('/api/notifications/read', json=[read_id], headers=headers).status_code == 400
+        assert client.post('/api/notifications/read', headers=headers).get_json() == {"marked": 3}
+
+        # moved back and forth, the drive is announced every time it moves
+        moved_to = db.session.get(Drive, second).arrive_at
+        reschedule_drive(second, moved_to - timedelta(hours=1))
+        reschedule_drive(second, moved_to)
+        assert work(burst=True)["SUCCEEDED"] == 2
+        assert Notification.query.filter_by(drive_id=second, kind="DRIVE_RESCHEDULED").count() == 9
+
+
+class DoubleBookingIntegrationTests(unittest.TestCase):
+
+    def test_overlapping_drives_are_rejected_everywhere(self):
+        driver = Driver.query.join(User).filter(User.username == "dave").one()
+        driver_id, username = driver.id, "dave"
+        street_id = Street.query.first().id
+        base = (datetime.utcnow() + timedelta(days=30)).replace(hour=9, minute=0, second=0, microsecond=0)
+        first = schedule_drive(driver_id, street_id, base).id
+        note = Street(name="Pending Parade")
+        db.session.add(note)
+        with self.assertRaisesRegex(ValueError, f"drive #{first}"):
+            schedule_drive(driver_id, street_id, base + timedelta(minutes=20))
+        # the clash is the caller's to handle: its own pending work is still there
+        assert Street.query.filter_by(name="Pending Parade").one() is note
+        db.session.rollback()
+        assert Street.query.filter_by(name="Pending Parade").first() is None
+        second = schedule_drive(driver_id, street_id, base + timedelta(minutes=30)).id
+        with self.assertRaises(ValueError):
+            reschedule_drive(second, base + timedelta(minutes=10))
+        # a drive never clashes with itself
+        assert reschedule_drive(second, base + timedelta(minutes=40)).id == second
+
+        street_name = db.session.get(Street, street_id).name
+        rows = [
+            {"type": "drive", "driver": username, "street": street_name, "arrive_at": f"{base + timedelta(minutes=50):%Y-%m-%d %H:%M}"},
+            {"type": "drive", "driver": username, "street": street_name, "arrive_at": f"{base + timedelta(hours=2):%Y-%m-%d %H:%M}"},
+            {"type": "drive", "driver": username, "street": street_name, "arrive_at": f"{base + timedelta(hours=2, minutes=15):%Y-%m-%d %H:%M}"},
+            {"type": "drive", "driver": username, "street": street_name, "arrive_at": f"{base:%Y-%m-%d %H:%M}", "status": "CANCELLED"},
+        ]
+        report = import_schedule(rows)
+        assert report["inserted"]["drive"] == 2
+        assert [(r["line"], r["reason"].split(" (")[0]) for r in report["rejected"]] == [
+            (1, "driver is already booked then"), (3, "driver is already booked then")]
+        assert "line 2" in report["rejected"][1]["reason"]
+
+        # drives that got in some other way are reported
+        db.session.add(Drive(driver_id=driver_id, street_id=street_id, arrive_at=base + timedelta(hours=2, minutes=5)))
+        db.session.commit()
+        overlaps = find_double_bookings(base - timedelta(hours=1), base + timedelta(hours=3))
+        assert [(o["driver_id"], o["overlapping_booking"], o["overlapping_arrive_at"]) for o in overlaps] == [
+            (driver_id, f"drive #{Drive.query.order_by(Drive.id.desc()).first().id}", (base + timedelta(hours=2, minutes=5)).isoformat())]
+        work(burst=True)
+
+
+class DriveScheduleIntegrationTests(unittest.TestCase):
+
+    def test_expansion_follows_interval_exceptions_and_end(self):
+        # Mondays, every other week from 2030-01-07, skipping 2030-02-04, until 2030-03-04
+        schedule = DriveSchedule(weekday=0, time_of_day=time(9, 30), interval_weeks=2, starts_on=date(2030, 1, 2),
+                                 ends_on=date(2030, 3, 4), exceptions='["2030-02-04"]')
+        occurrences = list(expand_schedule(schedule, datetime(2030, 1, 7, 10), datetime(2031, 1, 1)))
+        assert occurrences == [datetime(2030, 1, 21, 9, 30), datetime(2030, 2, 18, 9, 30), datetime(2030, 3, 4, 9, 30)]
+
+    def test_occurrences_stay_virtual_until_a_stop_request_attaches(self):
+        street = Street(name="Weekly Walk")
+        db.session.add(street)
+        db.session.flush()
+        users = [create_user(f"weekly{i}", "weeklypass") for i in range(2)]
+        db.session.add_all([Resident(user_id=u.id, street_id=street.id, address=f"{i} Weekly Walk")
+                            for i, u in enumerate(users)])
+        db.session.commit()
+        street_id = street.id
+        driver_id = Driver.query.join(User).filter(User.username == "dave").one().id
+        starts_on = date.today() + timedelta(days=1)
+        schedule_id = create_drive_schedule(driver_id, street_id, starts_on.weekday(), time(6, 15), starts_on).id
+        drives_before = Drive.query.count()
+
+        upcoming = get_upcoming_drives_for_street(street_id)
+        assert len(upcoming) == 4 and all(d.id is None and d.schedule_id == schedule_id for d in upcoming)
+        first = upcoming[0].arrive_at
+        with self.assertRaisesRegex(ValueError, f"schedule #{schedule_id}"):
+            schedule_drive(driver_id, street_id, first + timedelta(minutes=10))
+
+        client = current_app.test_client()
+        responses = [
+            client.post(f'/api/schedules/{schedule_id}/stop-requests', json={"arrive_at": first.isoformat()},
+                        headers={"Authorization": f"Bearer {login(f'weekly{i}', 'weeklypass')}"})
+            for i in range(2)
+        ]
+        assert [r.status_code for r in responses] == [201, 201]
+        drive_ids = {r.get_json()["stop_request"]["drive_id"] for r in responses}
+        assert len(drive_ids) == 1 and Drive.query.count() == drives_before + 1
+        drive = db.session.get(Drive, drive_ids.pop())
+        assert (drive.schedule_id, drive.arrive_at, drive.total_requests) == (schedule_id, first, 2)
+
+        upcoming = get_upcoming_drives_for_street(street_id)
+        assert [d.id for d in upcoming] == [drive.id, None, None, None]
+        headers = {"Authorization": f"Bearer {login('weekly0', 'weeklypass')}"}
+        missing = client.post(f'/api/schedules/{schedule_id}/stop-requests',
+                              json={"arrive_at": (first + timedelta(hours=1)).isoformat()}, headers=headers)
+        assert missing.status_code == 404
+        for body in ([first.isoformat()], {"arrive_at": 20300107}):
+            assert client.post(f'/api/schedules/{schedule_id}/stop-requests', json=body, headers=headers).status_code == 400
+
+        with self.assertRaises(ValueError):
+            skip_schedule_occurrence(schedule_id, first.date())
+        skip_schedule_occurrence(schedule_id, upcoming[1].arrive_at.date())
+        assert [d.arrive_at for d in get_upcoming_drives_for_street(street_id)] == [
+            first, upcoming[2].arrive_at, upcoming[3].arrive_at]
+
+        # moving the drive doesn't bring its occurrence back
+        moved = first + timedelta(days=1)
+        reschedule_drive(drive.id, moved)
+        assert [(d.id, d.arrive_at) for d in get_upcoming_drives_for_street(street_id)][:1] == [(drive.id, moved)]
+        work(burst=True)
+
+    def test_schedule_clashes_are_caught_beyond_the_listing_horizon(self):
+        driver_user = create_user("farout", "faroutpass")
+        driver = Driver(user_id=driver_user.id)
+        street = Street(name="Far Out Way")
+        db.session.add_all([driver, street])
+        db.session.flush()
+        resident_user = create_user("faroutres", "faroutpass")
+        db.session.add(Resident(user_id=resident_user.id, street_id=street.id, address="1 Far Out Way"))
+        db.session.commit()
+        driver_id, street_id = driver.id, street.id
+        far = (datetime.utcnow() + timedelta(days=40)).replace(hour=9, minute=0, second=0, microsecond=0)
+        booked = schedule_drive(driver_id, street_id, far).id
+        with self.assertRaisesRegex(ValueError, f"drive #{booked}"):
+            create_drive_schedule(driver_id, street_id, far.weekday(), time(9, 0), date.today())
+        db.session.rollback()
+        # ending before the drive, it doesn't clash
+        create_drive_schedule(driver_id, street_id, far.weekday(), time(9, 0), date.today(),
+                              ends_on=far.date() - timedelta(days=1))
+
+        # a drive that got in over an occurrence some other way is reported, and never becomes a second drive
+        schedule_id = create_drive_schedule(driver_id, street_id, far.weekday(), time(15, 0), far.date()).id
+        occurrence = far.replace(hour=15) + timedelta(weeks=1)
+        db.session.add(Drive(driver_id=driver_id, street_id=street_id, arrive_at=occurrence + timedelta(minutes=10)))
+        db.session.commit()
+        overlaps = find_double_bookings(occurrence - timedelta(hours=1), occurrence + timedelta(hours=1))
+        assert [(o["booking"], o["arrive_at"]) for o in overlaps] == [(f"schedule #{schedule_id}", occurrence.isoformat())]
+        drives_before = Drive.query.count()
+        response = current_app.test_client().post(
+            f'/api/schedules/{schedule_id}/stop-requests', json={"arrive_at": occurrence.isoformat()},
+            headers={"Authorization": f"Bearer {login('faroutres', 'faroutpass')}"})
+        assert response.status_code == 409 and "already booked" in response.get_json()["message"]
+        assert Drive.query.count() == drives_before
+        work(burst=True)
@@ -3,8 +3,14 @@
 from .user import user_views
 from .index import index_views
 from .auth import auth_views
+from .driver import driver_views
+from .drive import drive_views
+from .export import export_views
+from .metrics import metrics_views
+from .jobs import job_views
+from .notification import notification_views
 from .admin import setup_admin
 
 
-views = [user_views, index_views, auth_views] 
+views = [user_views, index_views, auth_views, driver_views, drive_views, export_views, metrics_views, job_views, notification_views] 
 # blueprints must be added to this list
\ No newline at end of file
@@ -0,0 +1,109 @@
+from datetime import datetime, timezone
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, current_user
+
+from App.database import db
+from App.models import Resident
+from App.pubsub import hub, sse_stream
+from App.etag import conditional_get
+from App.controllers import (
+    get_drive_etas,
+    get_drive_route,
+    get_resident_stop_requests,
+    get_stop_request_eta,
+    submit_stop_request,
+    submit_occurrence_stop_request,
+    get_upcoming_drives_for_street_json
+)
+
+drive_views = Blueprint('drive_views', __name__, template_folder='../templates')
+
+'''
+API Routes
+'''
+
+@drive_views.route('/api/streets/<int:street_id>/drives', methods=['GET'])
+@conditional_get('drive', 'drive_schedule', expires=30)
+def street_drives_action(street_id):
+    return jsonify(get_upcoming_drives_for_street_json(street_id))
+
+@drive_views.route('/api/streets/<int:street_id>/events', methods=['GET'])
+@jwt_required()
+def street_events_action(street_id):
+    subscription = hub.subscribe(f"street:{street_id}")
+    stream = sse_stream(subscription, current_app.config['SSE_KEEPALIVE_SECONDS'])
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@drive_views.route('/api/drives/<int:drive_id>/route', methods=['GET'])
+@jwt_required()
+def drive_route_action(drive_id):
+    route = get_drive_route(drive_id)
+    if route is None:
+        return jsonify(message=f"drive {drive_id} not found"), 404
+    return jsonify(route)
+
+@drive_views.route('/api/drives/<int:drive_id>/etas', methods=['GET'])
+@jwt_required()
+def drive_etas_action(drive_id):
+    etas = get_drive_etas(drive_id)
+    if etas is None:
+        return jsonify(message=f"drive {drive_id} not found"), 404
+    return jsonify(etas)
+
+@drive_views.route('/api/stop-requests/<int:stop_request_id>/eta', methods=['GET'])
+@jwt_required()
+def stop_request_eta_action(stop_request_id):
+    eta = get_stop_request_eta(stop_request_id)
+    if eta is None:
+        return jsonify(message=f"stop request {stop_request_id} not found"), 404
+    return jsonify(eta)
+
+@drive_views.route('/api/drives/<int:drive_id>/stop-requests', methods=['POST'])
+@jwt_required()
+def submit_stop_request_action(drive_id):
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify(message='body must be a JSON object'), 400
+    address = data.get('address')
+    if address is not None and not isinstance(address, str):
+        return jsonify(message='address must be a string'), 400
+    key = request.headers.get('Idempotency-Key')
+    if key is not None and not 0 < len(key) <= 255:
+        return jsonify(message='Idempotency-Key must be 1-255 characters'), 400
+    status, body = submit_stop_request(current_user.id, drive_id, address, idempotency_key=key)
+    return jsonify(body), status
+
+@drive_views.route('/api/schedules/<int:schedule_id>/stop-requests', methods=['POST'])
+@jwt_required()
+def submit_occurrence_stop_request_action(schedule_id):
+    # for recurring drives listed with an id of null: the occurrence is named by its arrive_at
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify(message='body must be a JSON object'), 400
+    address = data.get('address')
+    if address is not None and not isinstance(address, str):
+        return jsonify(message='address must be a string'), 400
+    try:
+        arrive_at = datetime.fromisoformat(data.get('arrive_at') or '')
+    except (TypeError, ValueError):
+        return jsonify(message='arrive_at must be the ISO 8601 arrival of one of the schedule\'s drives'), 400
+    if arrive_at.tzinfo is not None:
+        # arrivals are stored as naive UTC
+        arrive_at = arrive_at.astimezone(timezone.utc).replace(tzinfo=None)
+    key = request.headers.get('Idempotency-Key')
+    if key is not None and not 0 < len(key) <= 255:
+        return jsonify(message='Idempotency-Key must be 1-255 characters'), 400
+    status, body = submit_occurrence_stop_request(current_user.id, schedule_id, arrive_at, address,
+                                                  idempotency_key=key)
+    return jsonify(body), status
+
+@drive_views.route('/api/stop-requests', methods=['GET'])
+@jwt_required()
+def resident_stop_requests_action():
+    resident_id = db.session.scalar(db.select(Resident.id).filter_by(user_id=current_user.id))
+    if resident_id is None:
+        return jsonify(message="only residents have stop requests"), 403
+    # ?archived=true adds requests on drives moved to the archive
+    include_archived = request.args.get('archived', '').lower() in ('1', 'true')
+    return jsonify(get_resident_stop_requests(resident_id, include_archived))
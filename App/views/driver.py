@@ -0,0 +1,129 @@
+from datetime import datetime
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, current_user
+
+from App.database import db
+from App.pubsub import hub, sse_stream
+from App.etag import conditional_get
+from App.controllers import (
+    DRIVER_STATUSES,
+    get_driver,
+    get_driver_day,
+    get_driver_location,
+    get_driver_request_board_json,
+    get_nearest_drivers,
+    record_driver_location,
+    set_driver_status
+)
+
+driver_views = Blueprint('driver_views', __name__, template_folder='../templates')
+
+'''
+API Routes
+'''
+
+@driver_views.route('/api/drivers/<int:driver_id>/requests', methods=['GET'])
+@jwt_required()
+@conditional_get('drive', 'street', 'stop_request', 'resident', 'user', expires=30)
+def driver_request_board_action(driver_id):
+    if not get_driver(driver_id):
+        return jsonify(message=f"driver {driver_id} not found"), 404
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify(message='since must be an ISO 8601 datetime'), 400
+    return jsonify(get_driver_request_board_json(driver_id, since))
+
+@driver_views.route('/api/drivers/<int:driver_id>/drives', methods=['GET'])
+@jwt_required()
+@conditional_get('drive', 'street', 'stop_request', expires=30)
+def driver_day_action(driver_id):
+    if not get_driver(driver_id):
+        return jsonify(message=f"driver {driver_id} not found"), 404
+    day = request.args.get('date')
+    if day:
+        try:
+            day = datetime.strptime(day, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify(message='date must be YYYY-MM-DD'), 400
+    return jsonify(get_driver_day(driver_id, day))
+
+@driver_views.route('/api/drivers/<int:driver_id>/status', methods=['PUT'])
+@jwt_required()
+def driver_status_action(driver_id):
+    driver = get_driver(driver_id)
+    if not driver:
+        return jsonify(message=f"driver {driver_id} not found"), 404
+    if driver.user_id != current_user.id:
+        return jsonify(message="drivers can only update their own status"), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(message='body must be a JSON object'), 400
+    if data.get('status') not in DRIVER_STATUSES:
+        return jsonify(message=f"status must be one of {', '.join(DRIVER_STATUSES)}"), 400
+    latitude, longitude = data.get('latitude'), data.get('longitude')
+    if (latitude is None) != (longitude is None) or (latitude is not None and not _valid_coordinates(latitude, longitude)):
+        return jsonify(message='latitude and longitude must be given together as degrees'), 400
+    driver = set_driver_status(driver_id, data['status'], data.get('location'), latitude, longitude)
+    return jsonify(driver.get_json())
+
+@driver_views.route('/api/drivers/<int:driver_id>/location', methods=['POST'])
+@jwt_required()
+def driver_location_ping_action(driver_id):
+    # answered from the location buffer: a ping normally costs no query
+    driver = get_driver_location(driver_id)
+    if not driver:
+        return jsonify(message=f"driver {driver_id} not found"), 404
+    if driver["user_id"] != current_user.id:
+        return jsonify(message="drivers can only report their own location"), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(message='body must be a JSON object'), 400
+    latitude, longitude, location = data.get('latitude'), data.get('longitude'), data.get('location')
+    if not _valid_coordinates(latitude, longitude):
+        return jsonify(message='latitude and longitude are required degrees'), 400
+    if location is not None and (not isinstance(location, str) or len(location) > 120):
+        return jsonify(message='location must be a string of at most 120 characters'), 400
+    # accepted into the write-behind buffer, stored at the next flush
+    return jsonify(record_driver_location(driver_id, latitude, longitude, location)), 202
+
+@driver_views.route('/api/drivers/<int:driver_id>/location', methods=['GET'])
+def driver_location_action(driver_id):
+    location = get_driver_location(driver_id)
+    if location is None:
+        return jsonify(message=f"driver {driver_id} not found"), 404
+    return jsonify(location)
+
+def _valid_coordinates(latitude, longitude):
+    return (isinstance(latitude, (int, float)) and isinstance(longitude, (int, float))
+            and -90 <= latitude <= 90 and -180 <= longitude <= 180)
+
+@driver_views.route('/api/drivers/nearest', methods=['GET'])
+def nearest_drivers_action():
+    try:
+        latitude = float(request.args['lat'])
+        longitude = float(request.args['lon'])
+        k = int(request.args.get('k', 5))
+    except (KeyError, ValueError):
+        return jsonify(message='lat and lon are required numbers, k an integer'), 400
+    if not _valid_coordinates(latitude, longitude) or not 1 <= k <= 100:
+        return jsonify(message='lat must be within ±90, lon within ±180 and k 1-100'), 400
+    return jsonify(get_nearest_drivers(latitude, longitude, k))
+
+@driver_views.route('/api/drivers/<int:driver_id>/events', methods=['GET'])
+@jwt_required()
+def driver_events_action(driver_id):
+    subscription = hub.subscribe(f"driver:{driver_id}")
+    driver = get_driver_location(driver_id)
+    if not driver:
+        subscription.close()
+        return jsonify(message=f"driver {driver_id} not found"), 404
+    initial = [("status", driver)]
+    # the stream can stay open for hours; don't hold a pooled connection for it
+    db.session.remove()
+    stream = sse_stream(subscription, current_app.config['SSE_KEEPALIVE_SECONDS'], initial)
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
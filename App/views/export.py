@@ -0,0 +1,28 @@
+from datetime import datetime
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_jwt_extended import jwt_required
+
+from App.controllers import (
+    EXPORT_ENTITIES,
+    export_ndjson
+)
+
+export_views = Blueprint('export_views', __name__, template_folder='../templates')
+
+'''
+API Routes
+'''
+
+@export_views.route('/api/export/<entity>', methods=['GET'])
+@jwt_required()
+def export_action(entity):
+    if entity not in EXPORT_ENTITIES:
+        return jsonify(message=f"entity must be one of {', '.join(EXPORT_ENTITIES)}"), 404
+    try:
+        since = datetime.fromisoformat(request.args['since']) if 'since' in request.args else None
+        until = datetime.fromisoformat(request.args['until']) if 'until' in request.args else None
+    except ValueError:
+        return jsonify(message='since and until must be ISO 8601 dates'), 400
+    include_archived = request.args.get('archived', '').lower() in ('1', 'true')
+    lines = export_ndjson(entity, since, until, request.args.get('status'), include_archived=include_archived)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
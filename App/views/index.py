@@ -1,5 +1,6 @@
-from flask import Blueprint, redirect, render_template, request, send_from_directory, jsonify
-from App.controllers import create_user, initialize
+from flask import Blueprint, redirect, render_template, request, send_from_directory, jsonify, url_for
+from flask_jwt_extended import jwt_required
+from App.controllers import create_user, enqueue_job
 
 index_views = Blueprint('index_views', __name__, template_folder='../templates')
 
@@ -8,9 +9,12 @@ def index_page():
     return render_template('index.html')
 
 @index_views.route('/init', methods=['GET'])
+@jwt_required()
 def init():
-    initialize()
-    return jsonify(message='db initialized!')
+    # rebuilding the database takes a while: a worker (flask worker) does it
+    job = enqueue_job('initialize', max_attempts=1)
+    status_url = url_for('job_views.job_status_action', job_id=job.id)
+    return jsonify(message='db initialization queued', job=job.get_json(), status_url=status_url), 202, {'Location': status_url}
 
 @index_views.route('/health', methods=['GET'])
 def health_check():
@@ -0,0 +1,16 @@
+from flask import Blueprint, jsonify
+
+from App.controllers import get_job
+
+job_views = Blueprint('job_views', __name__, template_folder='../templates')
+
+'''
+API Routes
+'''
+
+@job_views.route('/api/jobs/<int:job_id>', methods=['GET'])
+def job_status_action(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify(message=f"job {job_id} not found"), 404
+    return jsonify(job.get_json())
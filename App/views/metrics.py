@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+
+from App.metrics import collect_metrics, flush_metrics, render_prometheus
+
+metrics_views = Blueprint('metrics_views', __name__, template_folder='../templates')
+
+@metrics_views.route('/metrics', methods=['GET'])
+def metrics_action():
+    flush_metrics()
+    return Response(render_prometheus(collect_metrics()), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,52 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, current_user
+
+from App.database import db
+from App.models import Resident
+from App.controllers import (
+    get_inbox,
+    mark_notifications_read,
+    parse_inbox_cursor
+)
+
+notification_views = Blueprint('notification_views', __name__, template_folder='../templates')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _current_resident_id():
+    return db.session.scalar(db.select(Resident.id).filter_by(user_id=current_user.id))
+
+'''
+API Routes
+'''
+
+@notification_views.route('/api/notifications', methods=['GET'])
+@jwt_required()
+def inbox_action():
+    resident_id = _current_resident_id()
+    if resident_id is None:
+        return jsonify(message="only residents have an inbox"), 403
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    after = parse_inbox_cursor(request.args['after']) if 'after' in request.args else None
+    if not 0 < limit <= MAX_PAGE_SIZE or ('after' in request.args and after is None):
+        return jsonify(message=f"limit must be 1-{MAX_PAGE_SIZE} and after a cursor from a previous page"), 400
+    return jsonify(get_inbox(resident_id, limit, after))
+
+@notification_views.route('/api/notifications/read', methods=['POST'])
+@jwt_required()
+def mark_read_action():
+    resident_id = _current_resident_id()
+    if resident_id is None:
+        return jsonify(message="only residents have an inbox"), 403
+    # {"ids": [...]} marks those notifications, an empty body marks them all
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify(message='body must be a JSON object'), 400
+    ids = data.get('ids')
+    if ids is not None and not (isinstance(ids, list) and all(isinstance(i, int) for i in ids)):
+        return jsonify(message='ids must be a list of notification ids'), 400
+    return jsonify(marked=mark_notifications_read(resident_id, ids))
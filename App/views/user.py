@@ -5,17 +5,36 @@ from.index import index_views
 
 from App.controllers import (
     create_user,
-    get_all_users,
-    get_all_users_json,
+    get_users_page,
+    get_users_page_json,
     jwt_required
 )
+from App.etag import conditional_get
 
 user_views = Blueprint('user_views', __name__, template_folder='../templates')
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _page_args():
+    # returns (limit, after) from the query string, or None if they are malformed
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        after = int(request.args['after']) if 'after' in request.args else None
+    except ValueError:
+        return None
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        return None
+    return limit, after
+
 @user_views.route('/users', methods=['GET'])
+@conditional_get('user', per_user=True)
 def get_user_page():
-    users = get_all_users()
-    return render_template('users.html', users=users)
+    page = _page_args()
+    if page is None:
+        return render_template('message.html', title="Users", message=f"limit must be 1-{MAX_PAGE_SIZE} and after a user id"), 400
+    users, next_cursor = get_users_page(*page)
+    return render_template('users.html', users=users, next_cursor=next_cursor, limit=page[0])
 
 @user_views.route('/users', methods=['POST'])
 def create_user_action():
@@ -25,9 +44,12 @@ def create_user_action():
     return redirect(url_for('user_views.get_user_page'))
 
 @user_views.route('/api/users', methods=['GET'])
+@conditional_get('user')
 def get_users_action():
-    users = get_all_users_json()
-    return jsonify(users)
+    page = _page_args()
+    if page is None:
+        return jsonify(message=f"limit must be 1-{MAX_PAGE_SIZE} and after a user id"), 400
+    return jsonify(get_users_page_json(*page))
 
 @user_views.route('/api/users', methods=['POST'])
 def create_user_endpoint():
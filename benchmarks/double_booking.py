@@ -0,0 +1,106 @@
+"""
+Double-booking checks against 100k existing drives: the per-driver interval
+index (one range query to load, two bisects per new drive) against one range
+query per new drive, plus a whole week validated in one sweep and a week's
+schedule run through import_schedule.
+
+    python -m benchmarks.double_booking --drives 100000 --drivers 500
+    python -m benchmarks.double_booking --database-uri postgresql+psycopg2://localhost/breadvan_bench
+
+Also checks that the index and the per-drive queries agree on every new
+drive. The target database is dropped and recreated.
+"""
+import argparse, os, random, sys, tempfile, time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from App.main import create_app
+from App.database import db
+from App.models import User, Driver, Drive, Street
+from App.controllers import find_double_bookings, get_drive_duration, import_schedule, load_booking_index
+
+
+def seed(drives, drivers, start, days):
+    db.drop_all()
+    db.create_all()
+    rng = random.Random(5)
+    minutes = days * 24 * 60
+    with db.engine.begin() as conn:
+        conn.execute(insert(User), [{"username": f"bench{g}", "password": "x"} for g in range(drivers)])
+        conn.execute(insert(Driver), [{"user_id": 1 + g, "status": "OFF_DUTY", "location": "Depot"} for g in range(drivers)])
+        conn.execute(insert(Street), [{"name": f"street-{g}"} for g in range(200)])
+        conn.execute(insert(Drive), [{"driver_id": rng.randint(1, drivers), "street_id": rng.randint(1, 200),
+                                      "arrive_at": start + timedelta(minutes=rng.randrange(minutes))}
+                                     for _ in range(drives)])
+
+
+def candidates(n, drivers, start, days):
+    rng = random.Random(9)
+    return [(rng.randint(1, drivers), start + timedelta(minutes=rng.randrange(days * 24 * 60))) for _ in range(n)]
+
+
+def query_per_drive(new_drives):
+    # what each insert would cost without the index
+    duration = get_drive_duration()
+    found = []
+    for driver_id, arrive_at in new_drives:
+        found.append(db.session.scalar(
+            db.select(db.func.count()).select_from(Drive)
+            .filter(Drive.driver_id == driver_id, Drive.status != "CANCELLED",
+                    Drive.arrive_at > arrive_at - duration, Drive.arrive_at < arrive_at + duration)
+        ) > 0)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=None, help="defaults to a fresh sqlite file")
+    parser.add_argument("--drives", type=int, default=100_000)
+    parser.add_argument("--drivers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=70, help="the existing drives are spread over this many days")
+    parser.add_argument("--checks", type=int, default=5_000, help="new drives checked each way")
+    parser.add_argument("--week-rows", type=int, default=5_000, help="drive rows in the imported week")
+    args = parser.parse_args(argv)
+
+    uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bookings.db')}"
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "APP_PROFILE": "cli"})
+    start = (datetime.utcnow() + timedelta(days=1)).replace(second=0, microsecond=0)
+    end = start + timedelta(days=args.days)
+    with app.app_context():
+        seed(args.drives, args.drivers, start, args.days)
+        new_drives = candidates(args.checks, args.drivers, start, args.days)
+
+        began = time.perf_counter()
+        index = load_booking_index(range(1, args.drivers + 1), start, end, lock=False)
+        load_ms = (time.perf_counter() - began) * 1000
+        began = time.perf_counter()
+        indexed = [bool(index.overlapping(driver_id, arrive_at)) for driver_id, arrive_at in new_drives]
+        index_us = (time.perf_counter() - began) / len(new_drives) * 1e6
+
+        began = time.perf_counter()
+        queried = query_per_drive(new_drives)
+        query_us = (time.perf_counter() - began) / len(new_drives) * 1e6
+
+        began = time.perf_counter()
+        overlaps = find_double_bookings(start, start + timedelta(days=7))
+        sweep_ms = (time.perf_counter() - began) * 1000
+
+        week = candidates(args.week_rows, args.drivers, start + timedelta(days=args.days), 7)
+        report = import_schedule({"type": "drive", "driver": str(driver_id), "street": "street-1",
+                                  "arrive_at": f"{arrive_at:%Y-%m-%d %H:%M}"} for driver_id, arrive_at in week)
+
+    disagree = sum(1 for a, b in zip(indexed, queried) if a != b)
+    print(f"{args.drives} drives, {args.drivers} drivers over {args.days} days")
+    print(f"  load index: {load_ms:8.1f}ms ({len(index)} bookings)")
+    print(f"  interval index: {index_us:8.1f}us per new drive ({sum(indexed)} of {len(new_drives)} clash)")
+    print(f"  query per drive: {query_us:7.1f}us per new drive")
+    print(f"  one week swept: {sweep_ms:8.1f}ms ({len(overlaps)} overlapping pairs)")
+    print(f"  week imported: {report['rows_per_second']:8.0f} rows/s "
+          f"({report['inserted']['drive']} inserted, {len(report['rejected'])} rejected as double bookings)")
+    print(f"  index and queries disagree on {disagree} drives")
+    return 0 if disagree == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+End-to-end HTTP load test and latency regression check.
+
+Seeds a local database, boots the app under gunicorn with the shipped
+gunicorn_config.py, drives a fixed mix of API traffic at a fixed concurrency
+and reports throughput and p50/p95/p99 latency per endpoint.
+
+    python -m benchmarks.http_load --update-baseline     # record a baseline
+    python -m benchmarks.http_load                       # compare against it
+
+Exits non-zero when an endpoint returns errors, or when its p95/p99 latency or
+throughput is worse than the baseline by more than --threshold. Baselines are
+machine specific: record one on the machine that runs the comparison.
+
+The target database is dropped and recreated, so never point it at real data.
+"""
+import argparse, http.client, json, os, random, socket, subprocess, sys, tempfile, threading, time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from App.main import create_app
+from App.database import db
+from App.passwords import hash_password
+from benchmarks.query_plans import seed_generic, seed_postgres
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "http_load.json")
+PASSWORD = "benchpass"
+
+# (endpoint name, weight): roughly what a day of residents and drivers looks like
+TRAFFIC_MIX = (
+    ("POST /api/login", 2),
+    ("GET /api/identify", 15),
+    ("GET /api/users", 8),
+    ("GET /api/streets/<id>/drives", 40),
+    ("GET /api/drivers/<id>/requests", 20),
+    ("GET /api/stop-requests/<id>/eta", 15),
+    ("POST /api/drives/<id>/stop-requests", 5),
+)
+RETRY_RATE = 0.1  # stop request submissions resent with the same Idempotency-Key
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def seed(database_uri, sizes):
+    create_app({"SQLALCHEMY_DATABASE_URI": database_uri})
+    db.drop_all()
+    db.create_all()
+    drives = sizes[3]
+    # most drives are in the past, the rest spread over the coming days
+    start = datetime.utcnow() - timedelta(seconds=drives * 30 * 0.8)
+    with db.engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            seed_postgres(conn, sizes, start)
+        else:
+            seed_generic(conn, sizes, start)
+        # one shared hash: seeding thousands of real hashes would take minutes
+        conn.execute(text('UPDATE "user" SET password = :password'), {"password": hash_password(PASSWORD)})
+    db.engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def boot_gunicorn(database_uri, port, workers):
+    env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI=database_uri)
+    command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn_config.py",
+               "--bind", f"127.0.0.1:{port}", "--access-logfile", "/dev/null"]
+    if workers:
+        command += ["--workers", str(workers)]
+    server = subprocess.Popen(command + ["wsgi:app"], cwd=ROOT, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("gunicorn did not answer /health within 60s")
+
+
+class Client(threading.Thread):
+    """One simulated user on a keep-alive connection, picking requests from the mix."""
+
+    def __init__(self, port, sizes, until, warm_until, results, seed):
+        super().__init__(daemon=True)
+        self.port, self.until, self.warm_until, self.results = port, until, warm_until, results
+        self.drivers, self.streets, self.residents, self.drives, self.requests = sizes
+        self.random = random.Random(seed)
+        names, weights = zip(*TRAFFIC_MIX)
+        self.names, self.weights = names, weights
+        self.token = None
+        self.user = None
+        self.upcoming = None
+        self.last_key = None
+        self.submitted = 0
+
+    def call(self, method, path, body=None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = self.conn.getresponse()
+        return response.status, response.read()
+
+    def login(self):
+        # users after the drivers are residents, the only ones who request stops
+        self.user = self.random.randint(self.drivers + 1, self.drivers + self.residents)
+        self.upcoming = self.last_key = None
+        status, body = self.call("POST", "/api/login", {"username": f"bench{self.user}", "password": PASSWORD})
+        if status == 200:
+            self.token = json.loads(body)["access_token"]
+        return status
+
+    def submit_stop_request(self):
+        if self.upcoming is None:
+            street = 1 + (self.user - self.drivers) % self.streets
+            drives = json.loads(self.call("GET", f"/api/streets/{street}/drives")[1])
+            self.upcoming = [drive["id"] for drive in drives if drive["status"] != "CANCELLED"]
+        if not self.upcoming:
+            return 200
+        if self.last_key is None or self.random.random() >= RETRY_RATE:
+            self.submitted += 1
+            self.last_key = f"{self.name}-{self.submitted}"
+            self.last_drive = self.random.choice(self.upcoming)
+        self.conn.request("POST", f"/api/drives/{self.last_drive}/stop-requests", body="{}", headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.token}",
+            "Idempotency-Key": self.last_key,
+        })
+        response = self.conn.getresponse()
+        response.read()
+        return response.status
+
+    def request(self, name):
+        r = self.random
+        if name == "POST /api/login":
+            return self.login()
+        if name == "GET /api/identify":
+            return self.call("GET", "/api/identify")[0]
+        if name == "GET /api/users":
+            return self.call("GET", "/api/users")[0]
+        if name == "GET /api/streets/<id>/drives":
+            return self.call("GET", f"/api/streets/{r.randint(1, self.streets)}/drives")[0]
+        if name == "GET /api/drivers/<id>/requests":
+            return self.call("GET", f"/api/drivers/{r.randint(1, self.drivers)}/requests")[0]
+        if name == "POST /api/drives/<id>/stop-requests":
+            return self.submit_stop_request()
+        return self.call("GET", f"/api/stop-requests/{r.randint(1, self.requests)}/eta")[0]
+
+    def run(self):
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        self.login()
+        while time.monotonic() < self.until:
+            name = self.random.choices(self.names, self.weights)[0]
+            began = time.perf_counter()
+            try:
+                ok = self.request(name) < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+                self.conn.close()
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            elapsed = time.perf_counter() - began
+            if time.monotonic() >= self.warm_until:
+                self.results[name].append((elapsed, ok))
+        self.conn.close()
+
+
+def run_load(port, sizes, concurrency, duration, warmup):
+    results = defaultdict(list)
+    now = time.monotonic()
+    clients = [Client(port, sizes, now + warmup + duration, now + warmup, results, seed=i)
+               for i in range(concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    report = {}
+    for name, _ in TRAFFIC_MIX:
+        samples = results.get(name, [])
+        latencies = [elapsed for elapsed, _ in samples]
+        if not latencies:
+            continue
+        report[name] = {
+            "requests": len(samples),
+            "errors": sum(1 for _, ok in samples if not ok),
+            "rps": round(len(samples) / duration, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+    return report
+
+
+def regressions(report, baseline, threshold, slack_ms):
+    found = []
+    for name, result in report.items():
+        if result["errors"]:
+            found.append(f"{name}: {result['errors']} failed requests")
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            limit = base[key] * (1 + threshold) + slack_ms
+            if result[key] > limit:
+                found.append(f"{name}: {key} {result[key]:.1f} > {limit:.1f} (baseline {base[key]:.1f})")
+        if result["rps"] < base["rps"] * (1 - threshold):
+            found.append(f"{name}: {result['rps']:.1f} req/s < baseline {base['rps']:.1f} req/s")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=None, help="defaults to a fresh sqlite file")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds first")
+    parser.add_argument("--workers", type=int, default=None, help="overrides gunicorn_config.py")
+    parser.add_argument("--drives", type=int, default=20_000)
+    parser.add_argument("--stop-requests", type=int, default=100_000)
+    parser.add_argument("--drivers", type=int, default=50)
+    parser.add_argument("--streets", type=int, default=200)
+    parser.add_argument("--residents", type=int, default=5_000)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--slack-ms", type=float, default=2.0, help="absolute latency noise allowance")
+    parser.add_argument("--output", help="also write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'http-load.db')}"
+    sizes = (args.drivers, args.streets, args.residents, args.drives, args.stop_requests)
+    seed(database_uri, sizes)
+
+    port = free_port()
+    server = boot_gunicorn(database_uri, port, args.workers)
+    try:
+        report = run_load(port, sizes, args.concurrency, args.duration, args.warmup)
+    finally:
+        server.terminate()
+        server.wait(30)
+
+    print(f"\n{args.concurrency} clients for {args.duration:g}s")
+    print(f"{'endpoint':<34}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name, result in report.items():
+        print(f"{name:<34}{result['rps']:>9.1f}{result['p50_ms']:>9.1f}"
+              f"{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['errors']:>8}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nno baseline at {args.baseline}; record one with --update-baseline")
+        return 1 if any(result["errors"] for result in report.values()) else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    found = regressions(report, baseline, args.threshold, args.slack_ms)
+    if found:
+        print(f"\n{len(found)} regressions against {args.baseline}:")
+        for line in found:
+            print(f"  {line}")
+        return 1
+    print(f"\nno regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Driver location pings absorbed by one worker: POST /api/drivers/<id>/location
+into the write-behind buffer, against committing every ping as PUT
+/api/drivers/<id>/status does.
+
+    python -m benchmarks.location_pings --drivers 500 --pings 20000
+    python -m benchmarks.location_pings --database-uri postgresql+psycopg2://localhost/breadvan_bench
+
+Requests go through the Flask test client in one process, so the numbers are
+per worker, JWT checks included. Also reports how long a flush of every
+driver's latest ping takes and checks that it wrote each driver's last
+position. The target database is dropped and recreated.
+"""
+import argparse, os, random, sys, tempfile, time
+from datetime import datetime
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+
+from App.main import create_app
+from App.database import db
+from App.models import User, Driver
+from App.controllers import flush_location_buffer, location_buffer
+
+BOUNDS = (10.0, 10.9, -61.95, -60.9)
+
+
+def seed(drivers):
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as conn:
+        conn.execute(insert(User), [{"username": f"bench{g}", "password": "x"} for g in range(drivers)])
+        conn.execute(insert(Driver), [{"user_id": 1 + g, "status": "EN_ROUTE", "location": "Depot",
+                                       "status_updated_at": datetime.utcnow()} for g in range(drivers)])
+
+
+def run(client, pings, tokens, method, path, body):
+    rng = random.Random(3)
+    lat_min, lat_max, lon_min, lon_max = BOUNDS
+    last = {}
+    began = time.perf_counter()
+    for _ in range(pings):
+        driver_id = rng.randint(1, len(tokens))
+        position = (rng.uniform(lat_min, lat_max), rng.uniform(lon_min, lon_max))
+        response = client.open(path.format(driver_id), method=method, json=body(*position),
+                               headers={"Authorization": f"Bearer {tokens[driver_id - 1]}"})
+        if response.status_code >= 400:
+            raise SystemExit(f"{method} {path} answered {response.status_code}: {response.get_data(as_text=True)}")
+        last[driver_id] = position
+    return pings / (time.perf_counter() - began), last
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=None, help="defaults to a fresh sqlite file")
+    parser.add_argument("--drivers", type=int, default=500)
+    parser.add_argument("--pings", type=int, default=20_000)
+    parser.add_argument("--direct-pings", type=int, default=2_000, help="pings committed one by one")
+    args = parser.parse_args(argv)
+
+    uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pings.db')}"
+    # no background flush during the measurement: the flush is timed separately
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "APP_PROFILE": "api", "LOCATION_FLUSH_SECONDS": 3600})
+    seed(args.drivers)
+    tokens = [create_access_token(identity=str(1 + g)) for g in range(args.drivers)]
+    client = app.test_client()
+
+    direct_rate, _ = run(client, args.direct_pings, tokens, "PUT", "/api/drivers/{}/status",
+                         lambda lat, lon: {"status": "EN_ROUTE", "latitude": lat, "longitude": lon})
+    buffered_rate, last = run(client, args.pings, tokens, "POST", "/api/drivers/{}/location",
+                              lambda lat, lon: {"latitude": lat, "longitude": lon})
+    pending = location_buffer.pending_count()
+    began = time.perf_counter()
+    written = flush_location_buffer()
+    flush_ms = (time.perf_counter() - began) * 1000
+
+    with app.app_context():
+        stored = dict(db.session.execute(db.select(Driver.id, Driver.latitude)).all())
+    wrong = sum(1 for driver_id, (lat, _) in last.items() if stored[driver_id] != lat)
+    print(f"{args.drivers} drivers")
+    print(f"  committed per ping:  {direct_rate:8.0f} pings/s ({args.direct_pings} pings)")
+    print(f"  write-behind buffer: {buffered_rate:8.0f} pings/s ({args.pings} pings)")
+    print(f"  flush: {pending} drivers pending, {written} rows written in {flush_ms:.1f}ms "
+          f"({args.pings / max(written, 1):.0f} pings per row write)")
+    print(f"  drivers whose stored position isn't their last ping: {wrong}")
+    return 0 if wrong == 0 and written == len(last) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Concurrent login throughput under gevent, with password hashing inline on the
+event loop versus offloaded to the OS thread pool (PASSWORD_HASH_THREADS).
+
+    python -m benchmarks.login_throughput --concurrency 50 --logins 400
+
+Besides logins per second it reports how long the event loop was stalled,
+which is what every other request on a gevent worker waits for.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse, os, sys, tempfile, time
+
+import gevent
+
+from App.main import create_app
+from App.database import db
+from App.passwords import configure_password_hashing
+from App.controllers import create_user, login
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def measure(app, users, concurrency, logins):
+    stalls, latencies = [], []
+    done = False
+
+    def ticker():
+        # a well-behaved greenlet that wants to wake every 5ms
+        while not done:
+            began = time.perf_counter()
+            gevent.sleep(0.005)
+            stalls.append(time.perf_counter() - began - 0.005)
+
+    def client(n):
+        for i in range(n):
+            username = users[i % len(users)]
+            with app.app_context():
+                began = time.perf_counter()
+                assert login(username, f"{username}pass")
+                latencies.append(time.perf_counter() - began)
+
+    tick = gevent.spawn(ticker)
+    began = time.perf_counter()
+    gevent.joinall([gevent.spawn(client, logins // concurrency) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - began
+    done = True
+    tick.join()
+    return {
+        "logins_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "max_loop_stall_ms": max(stalls) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 4, help="pool size for the offloaded run")
+    parser.add_argument("--method", default=None, help="PASSWORD_HASH_METHOD, werkzeug's default if omitted")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), "login-bench.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}", "PASSWORD_HASH_METHOD": args.method})
+    db.create_all()
+    users = [f"bench{i}" for i in range(args.users)]
+    for username in users:
+        create_user(username, f"{username}pass")
+
+    print(f"{args.logins} logins, {args.concurrency} concurrent, method {args.method or 'werkzeug default'}")
+    for label, threads in (("inline", 0), (f"thread pool ({args.threads})", args.threads)):
+        app.config["PASSWORD_HASH_THREADS"] = threads
+        configure_password_hashing(app)
+        result = measure(app, users, args.concurrency, args.logins)
+        print(f"  {label:<18} {result['logins_per_second']:7.1f} logins/s   "
+              f"p50 {result['p50_ms']:7.1f}ms   p95 {result['p95_ms']:7.1f}ms   "
+              f"max loop stall {result['max_loop_stall_ms']:7.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Nearest-driver lookups: GridIndex against a brute-force scan over the same
+active drivers.
+
+    python -m benchmarks.nearest_drivers --drivers 10000 --queries 2000 --k 5
+
+Drivers are scattered over a Trinidad-sized area; queries land anywhere in it,
+including its empty edges. Exits non-zero if the two disagree.
+"""
+import argparse, random, sys, time
+
+from App.spatial import GridIndex, haversine_m
+
+BOUNDS = (10.0, 10.9, -61.95, -60.9)
+
+
+def brute_force(points, lat, lon, k):
+    return sorted(((key, haversine_m(lat, lon, plat, plon)) for key, (plat, plon) in points.items()),
+                  key=lambda item: item[1])[:k]
+
+
+def timed(func, queries):
+    results, timings = [], []
+    for lat, lon in queries:
+        began = time.perf_counter()
+        results.append(func(lat, lon))
+        timings.append(time.perf_counter() - began)
+    timings.sort()
+    return results, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--cell-degrees", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    lat_min, lat_max, lon_min, lon_max = BOUNDS
+    points = {i: (rng.uniform(lat_min, lat_max), rng.uniform(lon_min, lon_max)) for i in range(args.drivers)}
+    queries = [(rng.uniform(lat_min - 0.1, lat_max + 0.1), rng.uniform(lon_min - 0.1, lon_max + 0.1))
+               for _ in range(args.queries)]
+
+    index = GridIndex(args.cell_degrees)
+    began = time.perf_counter()
+    for key, (lat, lon) in points.items():
+        index.update(key, lat, lon)
+    build = time.perf_counter() - began
+
+    grid_results, grid_timings = timed(lambda lat, lon: index.nearest(lat, lon, args.k), queries)
+    brute_results, brute_timings = timed(lambda lat, lon: brute_force(points, lat, lon, args.k), queries)
+
+    mismatches = sum(
+        [key for key, _ in grid] != [key for key, _ in brute]
+        for grid, brute in zip(grid_results, brute_results)
+    )
+    print(f"{args.drivers} drivers, {args.queries} queries, k={args.k}, grid built in {build * 1000:.1f}ms")
+    for label, timings in (("grid index", grid_timings), ("brute force", brute_timings)):
+        p50 = timings[len(timings) // 2] * 1000
+        p99 = timings[int(len(timings) * 0.99)] * 1000
+        print(f"  {label:<12} p50 {p50:8.3f}ms   p99 {p99:8.3f}ms")
+    print(f"  speedup at p50: {brute_timings[len(brute_timings) // 2] / grid_timings[len(grid_timings) // 2]:.0f}x")
+    if mismatches:
+        print(f"{mismatches} queries returned different drivers")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
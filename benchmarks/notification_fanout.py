@@ -0,0 +1,76 @@
+"""
+Notifying every resident of a street about a drive: the single INSERT ...
+SELECT fan-out against adding one Notification per resident through the ORM,
+then the first inbox page of one of those residents.
+
+    python -m benchmarks.notification_fanout --residents 20000
+    python -m benchmarks.notification_fanout --database-uri postgresql+psycopg2://localhost/breadvan_bench
+
+The target database is dropped and recreated.
+"""
+import argparse, os, sys, tempfile, time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from App.main import create_app
+from App.database import db
+from App.models import User, Driver, Drive, Street, Resident, Notification
+from App.controllers import get_inbox, new_change_id, notify_street_residents
+
+
+def seed(residents):
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as conn:
+        conn.execute(insert(User), [{"username": f"bench{g}", "password": "x"} for g in range(residents + 1)])
+        conn.execute(insert(Street), [{"name": "Long Street"}])
+        conn.execute(insert(Driver), [{"user_id": residents + 1, "status": "OFF_DUTY", "location": "Depot"}])
+        conn.execute(insert(Resident), [{"user_id": 1 + g, "street_id": 1, "address": f"{g} Long Street"}
+                                        for g in range(residents)])
+        arrive_at = datetime.utcnow() + timedelta(days=1)
+        conn.execute(insert(Drive), [{"driver_id": 1, "street_id": 1, "arrive_at": arrive_at + timedelta(hours=h)}
+                                     for h in range(3)])
+
+
+def per_resident(drive_id):
+    # the loop the fan-out replaces
+    drive = db.session.get(Drive, drive_id)
+    for resident in Resident.query.filter_by(street_id=drive.street_id):
+        db.session.add(Notification(resident_id=resident.id, drive_id=drive.id, street_id=drive.street_id,
+                                    kind="DRIVE_SCHEDULED", arrive_at=drive.arrive_at))
+    db.session.commit()
+
+
+def timed(func, *args):
+    began = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - began) * 1000, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=None, help="defaults to a fresh sqlite file")
+    parser.add_argument("--residents", type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'fanout.db')}"
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "APP_PROFILE": "cli"})
+    with app.app_context():
+        seed(args.residents)
+        loop_ms, _ = timed(per_resident, 1)
+        change_id = new_change_id()
+        fanout_ms, written = timed(notify_street_residents, [2], "DRIVE_SCHEDULED", change_id)
+        again_ms, rewritten = timed(notify_street_residents, [2], "DRIVE_SCHEDULED", change_id)
+        inbox_ms, inbox = timed(get_inbox, args.residents // 2, 50)
+
+    print(f"{args.residents} residents on one street")
+    print(f"  one ORM insert per resident: {loop_ms:8.1f}ms")
+    print(f"  INSERT ... SELECT fan-out:   {fanout_ms:8.1f}ms ({written} notifications)")
+    print(f"  repeated fan-out (no-op):    {again_ms:8.1f}ms ({rewritten} notifications)")
+    print(f"  first inbox page:            {inbox_ms:8.1f}ms ({inbox['unread']} unread)")
+    return 0 if written == args.residents and rewritten == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
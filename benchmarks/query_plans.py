@@ -0,0 +1,193 @@
+"""
+Query-plan regression benchmark for the hot scheduling queries.
+
+Seeds a local database with a realistic volume of drives and stop requests,
+runs EXPLAIN on every hot lookup and exits non-zero if any of them falls back
+to a sequential scan of the drive or stop_request tables.
+
+    python -m benchmarks.query_plans --database-uri postgresql://localhost/breadvan_bench
+    python -m benchmarks.query_plans --no-seed --archive-days 30   # the same after archiving
+
+The target database is dropped and recreated, so never point it at real data.
+"""
+import argparse, sys, time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+from App.main import create_app
+from App.database import db
+from App.models import User, Driver, Street, Resident, Drive, StopRequest
+from App.controllers import archive_drives, recount_requests
+
+BATCH = 50_000
+HOT_TABLES = ("drive", "stop_request")
+
+
+def hot_queries(now):
+    # the lookups issued by resident-inbox, resident-request-stop, driver-requests,
+    # driver-update-request, resident-request-status and driver-day
+    today = datetime.combine(now.date(), datetime.min.time())
+    return {
+        "upcoming drives for street": db.select(Drive)
+            .filter(Drive.street_id == 42, Drive.arrive_at >= now)
+            .order_by(Drive.arrive_at.asc()),
+        "upcoming drives for driver": db.select(Drive)
+            .filter(Drive.driver_id == 7, Drive.arrive_at >= now)
+            .order_by(Drive.arrive_at.asc()),
+        "stop requests for drive": db.select(StopRequest)
+            .filter(StopRequest.drive_id == 123_456),
+        "stop requests for drives (select-in)": db.select(StopRequest)
+            .filter(StopRequest.drive_id.in_([1_001, 2_002, 3_003, 4_004])),
+        "driver day with request counts": db.select(
+                Drive.id, Street.name, Drive.arrive_at, Drive.status,
+                Drive.pending_requests, Drive.confirmed_requests, Drive.total_requests)
+            .join(Street, Street.id == Drive.street_id)
+            .filter(Drive.driver_id == 7, Drive.arrive_at >= today, Drive.arrive_at < today + timedelta(days=1))
+            .order_by(Drive.arrive_at.asc()),
+        "requests for resident": db.select(StopRequest)
+            .filter(StopRequest.resident_id == 321)
+            .order_by(StopRequest.requested_at.desc()),
+    }
+
+
+def seed_postgres(conn, sizes, start):
+    drivers, streets, residents, drives, requests = sizes
+    conn.execute(text('INSERT INTO "user" (username, password) '
+                      "SELECT 'bench' || g, 'x' FROM generate_series(1, :n) g"),
+                 {"n": drivers + residents})
+    conn.execute(text("INSERT INTO street (name) SELECT 'street-' || g FROM generate_series(1, :n) g"),
+                 {"n": streets})
+    conn.execute(text("INSERT INTO driver (user_id, status, location, status_updated_at) "
+                      "SELECT g, 'OFF_DUTY', 'UNSPECIFIED', now() FROM generate_series(1, :n) g"),
+                 {"n": drivers})
+    conn.execute(text("INSERT INTO resident (user_id, street_id, address) "
+                      "SELECT :drivers + g, 1 + g % :streets, g || ' Crust Lane' FROM generate_series(1, :n) g"),
+                 {"n": residents, "drivers": drivers, "streets": streets})
+    conn.execute(text("INSERT INTO drive (driver_id, street_id, arrive_at, created_at, status) "
+                      "SELECT 1 + g % :drivers, 1 + (g * 7) % :streets, "
+                      "CAST(:start AS timestamp) + make_interval(secs => g * 30), now(), "
+                      "CASE WHEN g % 10 = 0 THEN 'CANCELLED' ELSE 'SCHEDULED' END "
+                      "FROM generate_series(1, :n) g"),
+                 {"n": drives, "drivers": drivers, "streets": streets, "start": start})
+    # each resident/drive pair at most once (stop requests are unique per pair)
+    conn.execute(text("INSERT INTO stop_request (resident_id, drive_id, requested_at, status, address) "
+                      "SELECT 1 + (g / :drives + 13 * (g % :drives)) % :residents, 1 + g % :drives, "
+                      "CAST(:start AS timestamp) + make_interval(secs => g * 6), "
+                      "'PENDING', g || ' Crust Lane' FROM generate_series(1, :n) g"),
+                 {"n": requests, "residents": residents, "drives": drives, "start": start})
+    recount_requests(conn)
+    conn.execute(text("ANALYZE"))
+
+
+def seed_generic(conn, sizes, start):
+    drivers, streets, residents, drives, requests = sizes
+    now = datetime.utcnow()
+
+    def batched(table, n, row):
+        for lo in range(1, n + 1, BATCH):
+            conn.execute(insert(table), [row(g) for g in range(lo, min(lo + BATCH, n + 1))])
+
+    batched(User, drivers + residents, lambda g: {"username": f"bench{g}", "password": "x"})
+    batched(Street, streets, lambda g: {"name": f"street-{g}"})
+    batched(Driver, drivers, lambda g: {"user_id": g, "status": "OFF_DUTY", "location": "UNSPECIFIED",
+                                        "status_updated_at": now})
+    batched(Resident, residents, lambda g: {"user_id": drivers + g, "street_id": 1 + g % streets,
+                                            "address": f"{g} Crust Lane"})
+    batched(Drive, drives, lambda g: {"driver_id": 1 + g % drivers, "street_id": 1 + (g * 7) % streets,
+                                      "arrive_at": start + timedelta(seconds=g * 30), "created_at": now,
+                                      "status": "CANCELLED" if g % 10 == 0 else "SCHEDULED"})
+    # each resident/drive pair at most once (stop requests are unique per pair)
+    batched(StopRequest, requests, lambda g: {"resident_id": 1 + (g // drives + 13 * (g % drives)) % residents,
+                                              "drive_id": 1 + g % drives,
+                                              "requested_at": start + timedelta(seconds=g * 6),
+                                              "status": "PENDING", "address": f"{g} Crust Lane"})
+    recount_requests(conn)
+    conn.execute(text("ANALYZE"))
+
+
+def explain(conn, sql):
+    if conn.dialect.name == "postgresql":
+        return [row[0] for row in conn.execute(text("EXPLAIN " + sql))]
+    return [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+
+def is_sequential(plan_line):
+    # postgres: "Seq Scan on drive"; sqlite: "SCAN drive" (index use reads "SEARCH drive USING INDEX ...")
+    line = plan_line.strip()
+    for table in HOT_TABLES:
+        if f"Seq Scan on {table}" in line:
+            return True
+        if line.startswith(f"SCAN {table}") and "USING" not in line:
+            return True
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default="postgresql://localhost/breadvan_bench")
+    parser.add_argument("--drives", type=int, default=1_000_000)
+    parser.add_argument("--stop-requests", type=int, default=5_000_000)
+    parser.add_argument("--drivers", type=int, default=500)
+    parser.add_argument("--streets", type=int, default=2_000)
+    parser.add_argument("--residents", type=int, default=50_000)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data from a previous run")
+    parser.add_argument("--repeat", type=int, default=20, help="timed executions per query")
+    parser.add_argument("--archive-days", type=int, default=None,
+                        help="first move drives older than this to the archive tables")
+    args = parser.parse_args(argv)
+
+    create_app({"SQLALCHEMY_DATABASE_URI": args.database_uri})
+    sizes = (args.drivers, args.streets, args.residents, args.drives, args.stop_requests)
+    # drives span roughly the past year into the coming months
+    start = datetime.utcnow() - timedelta(seconds=args.drives * 30 * 0.8)
+
+    if not args.no_seed:
+        db.drop_all()
+        db.create_all()
+        began = time.perf_counter()
+        with db.engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                seed_postgres(conn, sizes, start)
+            else:
+                seed_generic(conn, sizes, start)
+        print(f"seeded {args.drives:,} drives and {args.stop_requests:,} stop requests "
+              f"in {time.perf_counter() - began:.1f}s")
+
+    if args.archive_days is not None:
+        report = archive_drives(timedelta(days=args.archive_days), chunk_size=10_000)
+        print(f"archived {report['drives']:,} drives and {report['stop_requests']:,} stop requests "
+              f"in {report['seconds']:.1f}s ({report['drives'] / max(report['seconds'], 1e-9):,.0f} drives/s)")
+        with db.engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("ANALYZE drive"))
+                conn.execute(text("ANALYZE stop_request"))
+
+    failures = []
+    with db.engine.connect() as conn:
+        for name, stmt in hot_queries(datetime.utcnow()).items():
+            sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+            plan = explain(conn, sql)
+            timings = []
+            for _ in range(args.repeat):
+                began = time.perf_counter()
+                conn.execute(text(sql)).fetchall()
+                timings.append((time.perf_counter() - began) * 1000)
+            timings.sort()
+            sequential = any(is_sequential(line) for line in plan)
+            print(f"\n{'FAIL' if sequential else 'ok  '} {name}: "
+                  f"median {timings[len(timings) // 2]:.2f}ms, max {timings[-1]:.2f}ms")
+            for line in plan:
+                print(f"       {line}")
+            if sequential:
+                failures.append(name)
+
+    if failures:
+        print(f"\n{len(failures)} hot queries fall back to a sequential scan: {', '.join(failures)}")
+        return 1
+    print("\nall hot queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Startup cost of each APP_PROFILE: importing App.main plus running create_app,
+measured in fresh interpreters, since that is what every `flask <command>`
+invocation and every new gunicorn worker pays.
+
+    python -m benchmarks.startup --runs 10
+
+Also lists the heavy optional modules each profile ended up importing.
+"""
+import argparse, json, os, statistics, subprocess, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WATCHED_MODULES = ("flask_admin", "flask_uploads", "numpy", "pytest")
+
+PROBE = """
+import json, sys, time
+began = time.perf_counter()
+from App.main import create_app
+imported = time.perf_counter()
+create_app({"SQLALCHEMY_DATABASE_URI": sys.argv[1], "APP_PROFILE": sys.argv[2]})
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - began) * 1000,
+    "factory_ms": (created - imported) * 1000,
+    "modules": [name for name in json.loads(sys.argv[3]) if name in sys.modules],
+}))
+"""
+
+
+def probe(profile, database_uri):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, database_uri, profile, json.dumps(WATCHED_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per profile")
+    parser.add_argument("--profiles", nargs="+", default=["web", "api", "cli"])
+    args = parser.parse_args(argv)
+
+    database_uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+    probe("web", database_uri)  # warm the filesystem and bytecode caches
+    print(f"median of {args.runs} runs")
+    print(f"{'profile':<9}{'import ms':>11}{'factory ms':>12}{'total ms':>10}  heavy modules loaded")
+    for profile in args.profiles:
+        runs = [probe(profile, database_uri) for _ in range(args.runs)]
+        imported = statistics.median(run["import_ms"] for run in runs)
+        factory = statistics.median(run["factory_ms"] for run in runs)
+        modules = ", ".join(runs[-1]["modules"]) or "-"
+        print(f"{profile:<9}{imported:>11.1f}{factory:>12.1f}{imported + factory:>10.1f}  {modules}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Stop request ingestion when a popular drive is published: every resident of
+the street submits at once through POST /api/drives/<id>/stop-requests, and a
+share of them retry (same Idempotency-Key) or double-submit (new key).
+
+    python -m benchmarks.stop_request_ingest --residents 5000 --concurrency 100
+    python -m benchmarks.stop_request_ingest --database-uri postgresql+psycopg2://localhost/breadvan_bench
+
+Reports submissions per second and latency, and checks that no resident ended
+up with more than one request. The target database is dropped and recreated.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse, os, random, sys, tempfile, time
+from datetime import datetime, timedelta
+
+import gevent
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, insert
+
+from App.main import create_app
+from App.database import db
+from App.models import User, Driver, Street, Resident, Drive, StopRequest
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def seed(residents):
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as conn:
+        conn.execute(insert(User), [{"username": f"bench{g}", "password": "x"} for g in range(residents + 1)])
+        conn.execute(insert(Street), [{"name": "Popular Street"}])
+        conn.execute(insert(Driver), [{"user_id": 1, "status": "OFF_DUTY", "location": "Depot",
+                                       "status_updated_at": datetime.utcnow()}])
+        conn.execute(insert(Resident), [{"user_id": 2 + g, "street_id": 1, "address": f"{g} Popular Street"}
+                                        for g in range(residents)])
+        conn.execute(insert(Drive), [{"driver_id": 1, "street_id": 1, "created_at": datetime.utcnow(),
+                                      "arrive_at": datetime.utcnow() + timedelta(hours=3), "status": "SCHEDULED"}])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=None, help="defaults to a fresh sqlite file")
+    parser.add_argument("--residents", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--retry-rate", type=float, default=0.2, help="share resent with the same key")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="share resent with a new key")
+    args = parser.parse_args(argv)
+
+    uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ingest.db')}"
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "APP_PROFILE": "api"})
+    seed(args.residents)
+    tokens = [create_access_token(identity=str(2 + g)) for g in range(args.residents)]
+    rng = random.Random(42)
+    submissions = []
+    for g, token in enumerate(tokens):
+        submissions.append((token, f"first-{g}"))
+        if rng.random() < args.retry_rate:
+            submissions.append((token, f"first-{g}"))
+        if rng.random() < args.duplicate_rate:
+            submissions.append((token, f"again-{g}"))
+    rng.shuffle(submissions)
+
+    client = app.test_client()
+    latencies, statuses = [], {}
+    queue = iter(submissions)
+
+    def worker():
+        for token, key in queue:
+            began = time.perf_counter()
+            with app.app_context():
+                response = client.post("/api/drives/1/stop-requests", json={},
+                                       headers={"Authorization": f"Bearer {token}", "Idempotency-Key": key})
+            latencies.append(time.perf_counter() - began)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    began = time.perf_counter()
+    gevent.joinall([gevent.spawn(worker) for _ in range(args.concurrency)], raise_error=True)
+    elapsed = time.perf_counter() - began
+
+    with app.app_context():
+        stored = db.session.scalar(db.select(func.count(StopRequest.id)))
+        per_resident = db.session.scalar(
+            db.select(func.count()).select_from(
+                db.select(StopRequest.resident_id).group_by(StopRequest.resident_id)
+                .having(func.count() > 1).subquery()
+            )
+        )
+    print(f"{len(submissions)} submissions from {args.residents} residents, {args.concurrency} concurrent")
+    print(f"  {len(submissions) / elapsed:.0f} submissions/s, p50 {percentile(latencies, 50) * 1000:.1f}ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"  responses: {', '.join(f'{status}: {n}' for status, n in sorted(statuses.items()))}")
+    print(f"  stop requests stored: {stored}, residents with duplicates: {per_resident}")
+    return 0 if stored == args.residents and per_resident == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 # gunicorn_config.py
-import multiprocessing
+import glob, multiprocessing, os
 
 # The socket to bind.
 # "0.0.0.0" to bind to all interfaces. 8000 is the port number.
@@ -16,4 +16,17 @@ loglevel = 'info'
 
 # Where to log to
 accesslog = '-'  # '-' means log to stdout
-errorlog = '-'  # '-' means log to stderr
\ No newline at end of file
+errorlog = '-'  # '-' means log to stderr
+
+def on_starting(server):
+    # per-worker metrics files left by a previous run would be summed into /metrics
+    metrics_dir = os.environ.get('FLASK_METRICS_DIR')
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, 'metrics-*.json')):
+            os.remove(path)
+
+def worker_exit(server, worker):
+    # write the location pings still buffered in this worker (atexit would
+    # too, but only if the worker gets as far as a clean interpreter exit)
+    from App.controllers import stop_location_flusher
+    stop_location_flusher()
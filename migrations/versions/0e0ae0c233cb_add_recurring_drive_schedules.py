@@ -0,0 +1,56 @@
+"""add recurring drive schedules
+
+Revision ID: 0e0ae0c233cb
+Revises: 47c75786386b
+Create Date: 2026-10-18 19:53:19.363024
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0e0ae0c233cb'
+down_revision = '47c75786386b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'drive_schedule',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('driver_id', sa.Integer(), nullable=False),
+        sa.Column('street_id', sa.Integer(), nullable=False),
+        sa.Column('weekday', sa.Integer(), nullable=False),
+        sa.Column('time_of_day', sa.Time(), nullable=False),
+        sa.Column('interval_weeks', sa.Integer(), nullable=False),
+        sa.Column('starts_on', sa.Date(), nullable=False),
+        sa.Column('ends_on', sa.Date(), nullable=True),
+        sa.Column('exceptions', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['driver_id'], ['driver.id']),
+        sa.ForeignKeyConstraint(['street_id'], ['street.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_drive_schedule_driver_id', 'drive_schedule', ['driver_id'])
+    op.create_index('ix_drive_schedule_street_id', 'drive_schedule', ['street_id'])
+    with op.batch_alter_table('drive') as batch_op:
+        batch_op.add_column(sa.Column('schedule_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_drive_schedule_id_drive_schedule', 'drive_schedule', ['schedule_id'], ['id'])
+        batch_op.create_unique_constraint('uq_drive_schedule_id_arrive_at', ['schedule_id', 'arrive_at'])
+    op.execute(
+        "INSERT INTO table_version (name, version) "
+        "SELECT 'drive_schedule', MAX(version) FROM table_version"
+    )
+
+
+def downgrade():
+    op.execute("DELETE FROM table_version WHERE name = 'drive_schedule'")
+    with op.batch_alter_table('drive') as batch_op:
+        batch_op.drop_constraint('uq_drive_schedule_id_arrive_at', type_='unique')
+        batch_op.drop_constraint('fk_drive_schedule_id_drive_schedule', type_='foreignkey')
+        batch_op.drop_column('schedule_id')
+    op.drop_index('ix_drive_schedule_street_id', table_name='drive_schedule')
+    op.drop_index('ix_drive_schedule_driver_id', table_name='drive_schedule')
+    op.drop_table('drive_schedule')
@@ -0,0 +1,34 @@
+"""add driver and resident coordinates
+
+Revision ID: 22d3d1441cb8
+Revises: 99f1ffc5a7c9
+Create Date: 2026-10-18 19:08:01.804649
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '22d3d1441cb8'
+down_revision = '99f1ffc5a7c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('driver') as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+    with op.batch_alter_table('resident') as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('resident') as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
+    with op.batch_alter_table('driver') as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
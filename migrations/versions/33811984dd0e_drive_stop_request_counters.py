@@ -0,0 +1,39 @@
+"""drive stop request counters
+
+Revision ID: 33811984dd0e
+Revises: 713a5ebec082
+Create Date: 2026-10-18 19:39:21.656709
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '33811984dd0e'
+down_revision = '713a5ebec082'
+branch_labels = None
+depends_on = None
+
+COUNTERS = ('pending_requests', 'confirmed_requests', 'total_requests')
+
+
+def upgrade():
+    with op.batch_alter_table('drive') as batch_op:
+        for name in COUNTERS:
+            batch_op.add_column(sa.Column(name, sa.Integer(), server_default='0', nullable=False))
+    # backfill from the requests already there
+    op.execute(
+        "UPDATE drive SET "
+        "pending_requests = (SELECT COUNT(*) FROM stop_request "
+        "WHERE stop_request.drive_id = drive.id AND stop_request.status = 'PENDING'), "
+        "confirmed_requests = (SELECT COUNT(*) FROM stop_request "
+        "WHERE stop_request.drive_id = drive.id AND stop_request.status = 'CONFIRMED'), "
+        "total_requests = (SELECT COUNT(*) FROM stop_request WHERE stop_request.drive_id = drive.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('drive') as batch_op:
+        for name in reversed(COUNTERS):
+            batch_op.drop_column(name)
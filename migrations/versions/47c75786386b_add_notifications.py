@@ -0,0 +1,47 @@
+"""add notifications
+
+Revision ID: 47c75786386b
+Revises: 53c19a99c089
+Create Date: 2026-10-18 19:46:42.871055
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '47c75786386b'
+down_revision = '53c19a99c089'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'notification',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('resident_id', sa.Integer(), nullable=False),
+        sa.Column('drive_id', sa.Integer(), nullable=False),
+        sa.Column('street_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('arrive_at', sa.DateTime(), nullable=False),
+        sa.Column('read', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['resident_id'], ['resident.id']),
+        sa.ForeignKeyConstraint(['street_id'], ['street.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_resident_id_read_created_at', 'notification',
+                    ['resident_id', 'read', 'created_at'])
+    op.create_index('ix_notification_drive_id', 'notification', ['drive_id'])
+    op.execute(
+        "INSERT INTO table_version (name, version) "
+        "SELECT 'notification', MAX(version) FROM table_version"
+    )
+
+
+def downgrade():
+    op.execute("DELETE FROM table_version WHERE name = 'notification'")
+    op.drop_index('ix_notification_drive_id', table_name='notification')
+    op.drop_index('ix_notification_resident_id_read_created_at', table_name='notification')
+    op.drop_table('notification')
@@ -0,0 +1,47 @@
+"""add job queue
+
+Revision ID: 53c19a99c089
+Revises: 33811984dd0e
+Create Date: 2026-10-18 19:42:38.637126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '53c19a99c089'
+down_revision = '33811984dd0e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_by', sa.String(length=120), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_status_run_at', 'job', ['status', 'run_at'])
+    op.execute(
+        "INSERT INTO table_version (name, version) "
+        "SELECT 'job', MAX(version) FROM table_version"
+    )
+
+
+def downgrade():
+    op.execute("DELETE FROM table_version WHERE name = 'job'")
+    op.drop_index('ix_job_status_run_at', table_name='job')
+    op.drop_table('job')
@@ -0,0 +1,65 @@
+"""drive and stop request archive tables
+
+Revision ID: 713a5ebec082
+Revises: bafb9e72ee9a
+Create Date: 2026-10-18 19:36:11.245322
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '713a5ebec082'
+down_revision = 'bafb9e72ee9a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'drive_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('driver_id', sa.Integer(), nullable=False),
+        sa.Column('street_id', sa.Integer(), nullable=False),
+        sa.Column('arrive_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['driver_id'], ['driver.id']),
+        sa.ForeignKeyConstraint(['street_id'], ['street.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_drive_archive_street_id_arrive_at', 'drive_archive', ['street_id', 'arrive_at'])
+    op.create_index('ix_drive_archive_driver_id_arrive_at', 'drive_archive', ['driver_id', 'arrive_at'])
+    op.create_table(
+        'stop_request_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('resident_id', sa.Integer(), nullable=False),
+        sa.Column('drive_id', sa.Integer(), nullable=False),
+        sa.Column('requested_at', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('address', sa.String(length=200), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['resident_id'], ['resident.id']),
+        sa.ForeignKeyConstraint(['drive_id'], ['drive_archive.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stop_request_archive_drive_id', 'stop_request_archive', ['drive_id'])
+    op.create_index('ix_stop_request_archive_resident_id_requested_at', 'stop_request_archive',
+                    ['resident_id', sa.text('requested_at DESC')])
+    op.execute(
+        "INSERT INTO table_version (name, version) "
+        "SELECT name, (SELECT MAX(version) FROM table_version) "
+        "FROM (SELECT 'drive_archive' AS name UNION ALL SELECT 'stop_request_archive') AS new_tables"
+    )
+
+
+def downgrade():
+    op.execute("DELETE FROM table_version WHERE name IN ('drive_archive', 'stop_request_archive')")
+    op.drop_index('ix_stop_request_archive_resident_id_requested_at', table_name='stop_request_archive')
+    op.drop_index('ix_stop_request_archive_drive_id', table_name='stop_request_archive')
+    op.drop_table('stop_request_archive')
+    op.drop_index('ix_drive_archive_driver_id_arrive_at', table_name='drive_archive')
+    op.drop_index('ix_drive_archive_street_id_arrive_at', table_name='drive_archive')
+    op.drop_table('drive_archive')
@@ -0,0 +1,31 @@
+"""add scheduling indexes
+
+Revision ID: 99f1ffc5a7c9
+Revises: 
+Create Date: 2026-10-18 18:57:13.894673
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '99f1ffc5a7c9'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_drive_street_id_arrive_at', 'drive', ['street_id', 'arrive_at'])
+    op.create_index('ix_drive_driver_id_arrive_at', 'drive', ['driver_id', 'arrive_at'])
+    op.create_index('ix_stop_request_drive_id', 'stop_request', ['drive_id'])
+    op.create_index('ix_stop_request_resident_id_requested_at', 'stop_request',
+                    ['resident_id', sa.text('requested_at DESC')])
+
+
+def downgrade():
+    op.drop_index('ix_stop_request_resident_id_requested_at', table_name='stop_request')
+    op.drop_index('ix_stop_request_drive_id', table_name='stop_request')
+    op.drop_index('ix_drive_driver_id_arrive_at', table_name='drive')
+    op.drop_index('ix_drive_street_id_arrive_at', table_name='drive')
@@ -0,0 +1,30 @@
+"""key notifications on the drive change
+
+Revision ID: b2ef1e1cf19e
+Revises: 0e0ae0c233cb
+Create Date: 2026-10-18 20:03:49.357144
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2ef1e1cf19e'
+down_revision = '0e0ae0c233cb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.add_column(sa.Column('change_id', sa.String(length=32), nullable=True))
+        batch_op.drop_index('ix_notification_drive_id')
+        batch_op.create_index('ix_notification_drive_id_change_id', ['drive_id', 'change_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('notification') as batch_op:
+        batch_op.drop_index('ix_notification_drive_id_change_id')
+        batch_op.create_index('ix_notification_drive_id', ['drive_id'])
+        batch_op.drop_column('change_id')
@@ -0,0 +1,51 @@
+"""stop request uniqueness and idempotency keys
+
+Revision ID: bafb9e72ee9a
+Revises: d617378b88af
+Create Date: 2026-10-18 19:26:14.502672
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bafb9e72ee9a'
+down_revision = 'd617378b88af'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keep the first request of any resident/drive pair before enforcing uniqueness
+    op.execute(
+        "DELETE FROM stop_request WHERE id NOT IN "
+        "(SELECT MIN(id) FROM stop_request GROUP BY resident_id, drive_id)"
+    )
+    with op.batch_alter_table('stop_request') as batch_op:
+        batch_op.create_unique_constraint('uq_stop_request_resident_id_drive_id', ['resident_id', 'drive_id'])
+
+    op.create_table(
+        'idempotency_key',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=False),
+        sa.Column('response', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('user_id', 'key')
+    )
+    op.create_index('ix_idempotency_key_created_at', 'idempotency_key', ['created_at'])
+    op.execute(
+        "INSERT INTO table_version (name, version) "
+        "SELECT 'idempotency_key', MAX(version) FROM table_version"
+    )
+
+
+def downgrade():
+    op.execute("DELETE FROM table_version WHERE name = 'idempotency_key'")
+    op.drop_index('ix_idempotency_key_created_at', table_name='idempotency_key')
+    op.drop_table('idempotency_key')
+    with op.batch_alter_table('stop_request') as batch_op:
+        batch_op.drop_constraint('uq_stop_request_resident_id_drive_id', type_='unique')
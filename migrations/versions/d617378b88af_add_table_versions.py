@@ -0,0 +1,37 @@
+"""add table versions
+
+Revision ID: d617378b88af
+Revises: 22d3d1441cb8
+Create Date: 2026-10-18 19:23:14.709297
+
+"""
+import time
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd617378b88af'
+down_revision = '22d3d1441cb8'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('user', 'driver', 'street', 'resident', 'drive', 'stop_request')
+
+
+def upgrade():
+    table_version = op.create_table(
+        'table_version',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    # versions start from the clock so they never repeat an earlier database's
+    start = int(time.time() * 1000)
+    op.bulk_insert(table_version, [{'name': name, 'version': start} for name in TABLES])
+
+
+def downgrade():
+    op.drop_table('table_version')
@@ -1,15 +1,38 @@
-import click, pytest, sys
+import click, os, sys, threading
 from flask.cli import with_appcontext, AppGroup
 
 from datetime import datetime, timedelta
 from App.database import db, get_migrate
 from App.models import User, Driver, Drive, Street, Resident, StopRequest   
 from App.main import create_app
-from App.controllers import ( create_user, get_all_users_json, get_all_users, initialize )
+from App.controllers import ( create_user, get_all_users_json, get_all_users, initialize, get_driver_request_board,
+                              get_upcoming_drives_for_street, export_ndjson, EXPORT_ENTITIES,
+                              import_schedule, read_schedule_file, set_driver_status, DRIVER_STATUSES,
+                              get_drive_route, get_drive_etas,
+                              submit_stop_request, purge_idempotency_keys,
+                              archive_drives, get_archive_counts, get_resident_stop_requests,
+                              get_driver_day, reconcile_request_counts,
+                              get_job, work, stop_on_signals,
+                              schedule_drive, reschedule_drive, cancel_drive, find_double_bookings,
+                              create_drive_schedule, skip_schedule_occurrence, submit_occurrence_stop_request,
+                              notify_street_residents, new_change_id, get_inbox, mark_notifications_read )
 
 # This commands file allow you to create convenient CLI commands for testing controllers
 
-app = create_app()
+def _flask_subcommand(argv):
+    # the first argument that is neither a global option (--debug, --app wsgi, ...) nor an option's value
+    args = iter(argv)
+    for arg in args:
+        if arg in ('-A', '--app', '-e', '--env-file'):
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+# gunicorn and `flask run` serve the full app; other `flask <command>` runs
+# skip the HTTP side unless FLASK_APP_PROFILE says otherwise
+serving = os.environ.get('FLASK_RUN_FROM_CLI') != 'true' or _flask_subcommand(sys.argv[1:]) in ('run', 'routes')
+app = create_app({} if serving or 'FLASK_APP_PROFILE' in os.environ else {'APP_PROFILE': 'cli'})
 migrate = get_migrate(app)
 
 # This command creates and initializes the database
@@ -22,7 +45,6 @@ def init():
     sally = User(username='sally', password='sallypass')
     rob = User(username='rob', password='robpass')
     db.session.add_all([sally, rob])
-    db.session.commit()
     
     # Get the bob user that was created by initialize()
     bob = User.query.filter_by(username='bob').first()
@@ -31,17 +53,16 @@ def init():
     rye_street = Street(name='Rye')
     sourdough_street = Street(name='Sourdough')
     db.session.add_all([rye_street, sourdough_street])
-    db.session.commit()
     
     # Make bob a driver
     bob_driver = Driver(user_id=bob.id, status='EN_ROUTE', location='Garage')
     db.session.add(bob_driver)
-    db.session.commit()
+    # flush once to get ids; everything is committed together at the end
+    db.session.flush()
     
     # Make sally a resident of Rye
     sally_resident = Resident(user_id=sally.id, street_id=rye_street.id, address='67 Brioche')
     db.session.add(sally_resident)
-    db.session.commit()
     
     # Create bob's drives
     now = datetime.utcnow()
@@ -63,7 +84,7 @@ def init():
     )
     
     db.session.add_all([drive_rye, drive_sourdough])
-    db.session.commit()
+    db.session.flush()
     
     # Create sally's stop request for the Rye drive
     sally_stop_request = StopRequest(
@@ -74,6 +95,7 @@ def init():
     )
     db.session.add(sally_stop_request)
     db.session.commit()
+    notify_street_residents([drive_rye.id, drive_sourdough.id], 'DRIVE_SCHEDULED', new_change_id())
     
     print('Database initialized with preloaded data:')
     print('- Users: sally, rob, bob')
@@ -81,6 +103,7 @@ def init():
     print('- Bob is a driver with 2 scheduled drives')
     print('- Sally is a resident of Rye at 67 Brioche')
     print('- Sally has 1 stop request for the Rye drive')
+    print('- Sally has been notified of the Rye drive')
 
 '''
 User Commands
@@ -112,6 +135,18 @@ def list_user_command(format):
 
 app.cli.add_command(user_cli) # add the group to the cli
 
+# this command will be : flask export drives --since 2025-10-01 --until 2025-10-02 --output drives.ndjson
+@app.cli.command("export", help="Streams drives or stop requests as newline-delimited JSON")
+@click.argument("entity", type=click.Choice(EXPORT_ENTITIES))
+@click.option("--since", type=click.DateTime(), default=None, help="Earliest arrive_at (drives) or requested_at (stop-requests)")
+@click.option("--until", type=click.DateTime(), default=None, help="Exclusive upper bound for the same column")
+@click.option("--status", default=None, help="Only rows with this status")
+@click.option("--output", type=click.File("w"), default="-", help="File to write, stdout by default")
+@click.option("--archived", is_flag=True, help="Include rows moved to the archive tables")
+def export_command(entity, since, until, status, output, archived):
+    for line in export_ndjson(entity, since, until, status, include_archived=archived):
+        output.write(line)
+
 '''
 Test Commands
 '''
@@ -121,6 +156,7 @@ test = AppGroup('test', help='Testing commands')
 @test.command("user", help="Run User tests")
 @click.argument("type", default="all")
 def user_tests_command(type):
+    import pytest
     if type == "unit":
         sys.exit(pytest.main(["-k", "UserUnitTests"]))
     elif type == "int":
@@ -131,6 +167,74 @@ def user_tests_command(type):
 
 app.cli.add_command(test)
 
+# this command will be : flask import-schedule week42.csv
+@app.cli.command("import-schedule", help="Bulk imports streets, residents and drives from a .csv or .jsonl file")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", default=1000, show_default=True, help="Rows validated and committed per transaction")
+def import_schedule_command(path, chunk_size):
+    report = import_schedule(read_schedule_file(path), chunk_size=chunk_size)
+    inserted = report['inserted']
+    print(f"Imported {report['rows']} rows in {report['seconds']:.2f}s ({report['rows_per_second']:.0f} rows/s)")
+    print(f"- Streets: {inserted['street']}, Residents: {inserted['resident']}, Drives: {inserted['drive']}")
+    print(f"- Rejected: {len(report['rejected'])}")
+    for rejected in report['rejected']:
+        print(f"  row {rejected['line']}: {rejected['reason']}")
+
+@app.cli.command("purge-idempotency-keys", help="Forgets stored API responses for old Idempotency-Keys")
+@click.option("--hours", default=24, show_default=True, help="Keep responses newer than this")
+def purge_idempotency_keys_command(hours):
+    print(f"Removed {purge_idempotency_keys(timedelta(hours=hours))} idempotency keys older than {hours}h")
+
+# this command will be : flask archive-drives --days 30 --max-chunks 50
+@app.cli.command("archive-drives", help="Moves old drives and their stop requests to the archive tables")
+@click.option("--days", type=int, default=None, help="Archive drives that arrived more than this many days ago (ARCHIVE_AFTER_DAYS)")
+@click.option("--chunk-size", type=int, default=None, help="Drives moved per transaction (ARCHIVE_CHUNK_SIZE)")
+@click.option("--max-chunks", type=int, default=None, help="Stop after this many chunks; run again to carry on")
+def archive_drives_command(days, chunk_size, max_chunks):
+    report = archive_drives(timedelta(days=days) if days is not None else None, chunk_size, max_chunks)
+    print(f"Archived {report['drives']} drives and {report['stop_requests']} stop requests "
+          f"in {report['chunks']} chunks ({report['seconds']:.2f}s)")
+    if not report['done']:
+        print("- More drives are due; run again to continue")
+    counts = get_archive_counts()
+    print(f"- Live: {counts['drives']} drives, {counts['stop_requests']} stop requests")
+    print(f"- Archived: {counts['archived_drives']} drives, {counts['archived_stop_requests']} stop requests")
+
+@app.cli.command("reconcile-request-counts", help="Checks every drive's stop request counters and repairs drift")
+@click.option("--dry-run", is_flag=True, help="Only report drifted drives")
+@click.option("--chunk-size", default=1000, show_default=True, help="Drives checked per transaction")
+def reconcile_request_counts_command(dry_run, chunk_size):
+    report = reconcile_request_counts(repair=not dry_run, chunk_size=chunk_size)
+    print(f"Checked {report['checked']} drives, {len(report['drifted'])} drifted, {report['repaired']} repaired")
+    for drifted in report['drifted'][:20]:
+        print(f"  drive {drifted['drive_id']}: pending/confirmed/total {drifted['stored']} -> {drifted['actual']}")
+    if len(report['drifted']) > 20:
+        print(f"  ... and {len(report['drifted']) - 20} more")
+
+# this command will be : flask worker, or flask worker --burst to drain the queue and exit
+@app.cli.command("worker", help="Runs queued background jobs until stopped")
+@click.option("--burst", is_flag=True, help="Exit once no job is runnable")
+@click.option("--max-jobs", type=int, default=None, help="Exit after running this many jobs")
+def worker_command(burst, max_jobs):
+    stop = threading.Event()
+    stop_on_signals(stop)
+    done = work(burst=burst, max_jobs=max_jobs, stop=stop)
+    print(f"Worker stopped: {done['SUCCEEDED']} succeeded, {done['QUEUED']} queued for retry, {done['FAILED']} failed")
+
+@app.cli.command("job-status", help="Shows a background job")
+@click.argument("job_id", type=int)
+def job_status_command(job_id):
+    job = get_job(job_id)
+    if job is None:
+        print(f"Job #{job_id} not found.")
+        return
+    info = job.get_json()
+    print(f"Job #{job_id} {info['kind']}: {info['status']} after {info['attempts']}/{info['max_attempts']} attempts")
+    if info['last_error']:
+        print(f"- Last error: {info['last_error']}")
+    if info['result'] is not None:
+        print(f"- Result: {info['result']}")
+
 # ----------- SIMPLE SETUP COMMANDS (print/input; no app groups) -----------
 def _bv_prompt_nonempty(label: str) -> str:
     while True:
@@ -251,6 +355,23 @@ def _yes_no(prompt: str) -> bool:
             return False
         print("Please enter 'y' or 'n'.")
 
+def _prompt_coordinates():
+    """
+    Ask for an optional "lat,lon" pair. Returns (None, None) when left blank.
+    """
+    while True:
+        raw = input("Coordinates as lat,lon (blank to skip): ").strip()
+        if not raw:
+            return None, None
+        try:
+            lat, lon = (float(part) for part in raw.split(","))
+        except ValueError:
+            print("Enter two numbers separated by a comma, e.g. 10.6549,-61.5019")
+            continue
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return lat, lon
+        print("Latitude must be within ±90 and longitude within ±180.")
+
 def _parse_dt(s: str):
     try:
         return datetime.strptime(s.strip(), "%Y-%m-%d %H:%M")
@@ -315,11 +436,97 @@ def schedule_drive_cmd():
             continue
         break
 
-    # 4) Save Drive
-    drive = Drive(driver_id=chosen_driver.id, street_id=chosen_street.id, arrive_at=arrive_at)
-    db.session.add(drive)
-    db.session.commit()
+    # 4) Save Drive (telling the street's residents is left to a worker)
+    try:
+        drive = schedule_drive(chosen_driver.id, chosen_street.id, arrive_at)
+    except ValueError as e:
+        db.session.rollback()
+        print(f"\nNot scheduled: {e}.")
+        return
     print(f"\nOK: Drive #{drive.id} scheduled for {chosen_street.name} at {arrive_at} by Driver #{chosen_driver.id}.")
+    print("Residents will be notified by the next worker run (flask worker).")
+
+# this command will be : flask reschedule-drive 3 "2025-10-02 11:00"
+@app.cli.command("reschedule-drive", help="Moves a scheduled drive to a new arrival time and notifies the street")
+@click.argument("drive_id", type=int)
+@click.argument("arrive_at")
+def reschedule_drive_cmd(drive_id, arrive_at):
+    when = _parse_dt(arrive_at)
+    if not when:
+        print("Arrival must be YYYY-MM-DD HH:MM.")
+        return
+    try:
+        drive = reschedule_drive(drive_id, when)
+    except ValueError as e:
+        db.session.rollback()
+        print(f"Not rescheduled: {e}.")
+        return
+    if drive is None:
+        print(f"Drive #{drive_id} not found.")
+        return
+    print(f"OK: Drive #{drive.id} now arrives at {drive.arrive_at}; residents will be notified.")
+
+# this command will be : flask create-drive-schedule 1 2 0 09:30 --every-weeks 2 --skip 2025-12-22
+@app.cli.command("create-drive-schedule", help="Adds a recurring weekly drive (WEEKDAY 0 is Monday, TIME is HH:MM)")
+@click.argument("driver_id", type=int)
+@click.argument("street_id", type=int)
+@click.argument("weekday", type=click.IntRange(0, 6))
+@click.argument("time_of_day", type=click.DateTime(formats=["%H:%M"]))
+@click.option("--starts-on", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="First possible day, today by default")
+@click.option("--ends-on", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Last possible day")
+@click.option("--every-weeks", type=click.IntRange(min=1), default=1, show_default=True)
+@click.option("--skip", type=click.DateTime(formats=["%Y-%m-%d"]), multiple=True, help="A day without a drive (repeatable)")
+def create_drive_schedule_cmd(driver_id, street_id, weekday, time_of_day, starts_on, ends_on, every_weeks, skip):
+    if not db.session.get(Driver, driver_id) or not db.session.get(Street, street_id):
+        print("Unknown driver or street.")
+        return
+    try:
+        schedule = create_drive_schedule(driver_id, street_id, weekday, time_of_day.time(),
+                                         (starts_on or datetime.utcnow()).date(), ends_on.date() if ends_on else None,
+                                         every_weeks, [day.date() for day in skip])
+    except ValueError as e:
+        db.session.rollback()
+        print(f"Not created: {e}.")
+        return
+    print(f"OK: Schedule #{schedule.id} created.")
+
+@app.cli.command("skip-scheduled-drive", help="Drops one day's drive from a recurring schedule")
+@click.argument("schedule_id", type=int)
+@click.argument("day", type=click.DateTime(formats=["%Y-%m-%d"]))
+def skip_scheduled_drive_cmd(schedule_id, day):
+    try:
+        schedule = skip_schedule_occurrence(schedule_id, day.date())
+    except ValueError as e:
+        print(f"Not skipped: {e}.")
+        return
+    if schedule is None:
+        print(f"Schedule #{schedule_id} not found.")
+        return
+    print(f"OK: Schedule #{schedule_id} has no drive on {day.date()}.")
+
+# this command will be : flask check-bookings --days 7
+@app.cli.command("check-bookings", help="Reports drivers booked on overlapping drives, recurring ones included")
+@click.option("--days", default=7, show_default=True, help="How far ahead to look")
+def check_bookings_cmd(days):
+    now = datetime.utcnow()
+    overlaps = find_double_bookings(now, now + timedelta(days=days))
+    print(f"{len(overlaps)} overlapping booking pairs in the next {days} days")
+    for o in overlaps:
+        print(f"  driver {o['driver_id']}: {o['booking']} at {o['arrive_at']} "
+              f"and {o['overlapping_booking']} at {o['overlapping_arrive_at']}")
+
+@app.cli.command("cancel-drive", help="Cancels a drive and notifies the street")
+@click.argument("drive_id", type=int)
+def cancel_drive_cmd(drive_id):
+    try:
+        drive = cancel_drive(drive_id)
+    except ValueError as e:
+        print(f"Not cancelled: {e}.")
+        return
+    if drive is None:
+        print(f"Drive #{drive_id} not found.")
+        return
+    print(f"OK: Drive #{drive.id} cancelled; residents will be notified.")
 
 # ========= RESIDENT: set home street + view inbox =========
 
@@ -380,6 +587,9 @@ def set_resident_street_cmd():
     res = Resident.query.filter_by(user_id=user.id).first()
     if res:
         res.street_id = st.id
+        latitude, longitude = _prompt_coordinates()
+        if latitude is not None:
+            res.latitude, res.longitude = latitude, longitude
         db.session.commit()
         print(f"OK: Updated resident User #{user.id} to street '{st.name}'.")
     else:
@@ -388,15 +598,18 @@ def set_resident_street_cmd():
         if not address:
             print("Address is required. Cancelled.")
             return
-        res = Resident(user_id=user.id, street_id=st.id, address=address)
+        latitude, longitude = _prompt_coordinates()
+        res = Resident(user_id=user.id, street_id=st.id, address=address, latitude=latitude, longitude=longitude)
         db.session.add(res)
         db.session.commit()
         print(f"OK: Set resident User #{user.id} to street '{st.name}' (Resident #{res.id}).")
 
 @app.cli.command("resident-inbox")
-def resident_inbox_cmd():
+@click.option("--limit", default=20, show_default=True, help="Notifications shown")
+def resident_inbox_cmd(limit):
     """
-    (Resident) View inbox for scheduled drives to their street.
+    (Resident) View inbox: notifications about drives to their street, unread
+    first, then marks the ones shown as read.
     A user is a resident if they do NOT have a Driver profile.
     """
     user = _choose_user_res("Pick resident user to view inbox")
@@ -418,18 +631,27 @@ def resident_inbox_cmd():
         print("Resident street not found. Set it again with: flask set-resident-street")
         return
 
-    now = datetime.utcnow()
-    drives = (Drive.query
-                    .filter(Drive.street_id == street.id, Drive.arrive_at >= now)
-                    .order_by(Drive.arrive_at.asc())
-                    .all())
+    inbox = get_inbox(res.id, limit=limit)
+
+    print(f"\nInbox for {street.name} ({inbox['unread']} unread):")
+    if not inbox["notifications"]:
+        print("  (none)")
+    for n in inbox["notifications"]:
+        print(f"  {'*' if not n['read'] else ' '} {n['message']} (drive #{n['drive_id']})")
+    mark_notifications_read(res.id, [n["id"] for n in inbox["notifications"] if not n["read"]])
 
+    # one-off and recurring drives together
     print(f"\nUpcoming drives for {street.name}:")
+    drives = get_upcoming_drives_for_street(street.id)
     if not drives:
         print("  (none)")
-        return
     for d in drives:
-        print(f"  - Drive #{d.id} at {d.arrive_at} (driver {d.driver_id})")
+        print(f"  - {_describe_upcoming(d)} at {d.arrive_at} (driver {d.driver_id})")
+
+def _describe_upcoming(drive):
+    if drive.id is None:
+        return f"Weekly drive (schedule #{drive.schedule_id})"
+    return f"Drive #{drive.id}"
 
 # ========= RESIDENT: request a stop (print/input) =========
 
@@ -465,18 +687,14 @@ def resident_request_stop_cmd():
         return
 
     # 2) list upcoming drives on that street
-    now = datetime.utcnow()
-    drives = (Drive.query
-                    .filter(Drive.street_id == street.id, Drive.arrive_at >= now)
-                    .order_by(Drive.arrive_at.asc())
-                    .all())
+    drives = get_upcoming_drives_for_street(street.id)
     if not drives:
         print(f"No upcoming drives for {street.name}."); return
 
     chosen_drive = _pick_from_menu(
         drives,
         "upcoming drive",
-        show=lambda d: f"Drive #{d.id} at {d.arrive_at} (driver {d.driver_id})"
+        show=lambda d: f"{_describe_upcoming(d)} at {d.arrive_at} (driver {d.driver_id})"
     )
     if not chosen_drive:
         print("Cancelled."); return
@@ -488,17 +706,20 @@ def resident_request_stop_cmd():
             break
         print("Address is required.")
 
-    # 4) save
-    req = StopRequest(
-        drive_id=chosen_drive.id,
-        resident_id=res.id,
-        address=address,
-        status="PENDING",
-    )
-    db.session.add(req)
-    db.session.commit()
-
-    print(f"OK: Stop request #{req.id} recorded for Drive #{chosen_drive.id} on {street.name} (status PENDING).")
+    # 4) save (same path as the API, so a repeat request doesn't duplicate);
+    #    a recurring drive becomes a drive of its own here
+    if chosen_drive.id is None:
+        status, body = submit_occurrence_stop_request(user.id, chosen_drive.schedule_id, chosen_drive.arrive_at, address)
+    else:
+        status, body = submit_stop_request(user.id, chosen_drive.id, address)
+    if status >= 400:
+        print(f"Not saved: {body['message']}")
+        return
+    req = body["stop_request"]
+    if not body["created"]:
+        print(f"You already have Stop request #{req['id']} for Drive #{req['drive_id']} (status {req['status']}).")
+        return
+    print(f"OK: Stop request #{req['id']} recorded for Drive #{req['drive_id']} on {street.name} (status PENDING).")
 
 # ========= DRIVER: status management and request handling =========
 
@@ -516,7 +737,7 @@ def driver_set_status_cmd():
         return
     
     # Choose new status
-    statuses = ["OFF_DUTY", "EN_ROUTE", "DELAYED", "ACCEPTED", "REJECTED", "COMPLETED"]
+    statuses = DRIVER_STATUSES
     print("\nSelect new status:")
     for i, status in enumerate(statuses, 1):
         print(f"  {i}) {status}")
@@ -538,11 +759,11 @@ def driver_set_status_cmd():
     if not new_location:
         new_location = chosen_driver.location
     
-    # Update driver
-    chosen_driver.status = new_status
-    chosen_driver.location = new_location
-    chosen_driver.status_updated_at = datetime.utcnow()
-    db.session.commit()
+    # Optional GPS position
+    latitude, longitude = _prompt_coordinates()
+    
+    # Update driver (also notifies live subscribers)
+    set_driver_status(chosen_driver.id, new_status, new_location, latitude, longitude)
     
     print(f"OK: Driver #{chosen_driver.id} status updated to {new_status} at {new_location}.")
 
@@ -559,36 +780,42 @@ def driver_requests_cmd():
         print("Cancelled.")
         return
     
-    # Get upcoming drives for this driver
-    now = datetime.utcnow()
-    upcoming_drives = Drive.query.filter(
-        Drive.driver_id == chosen_driver.id,
-        Drive.arrive_at >= now
-    ).order_by(Drive.arrive_at.asc()).all()
+    # Get upcoming drives for this driver, with streets, requests and residents preloaded
+    upcoming_drives = get_driver_request_board(chosen_driver.id)
     
     if not upcoming_drives:
         print(f"No upcoming drives for Driver #{chosen_driver.id}.")
         return
     
     print(f"\nUpcoming drives for Driver #{chosen_driver.id}:")
-    total_requests = 0
     
     for drive in upcoming_drives:
-        street = Street.query.get(drive.street_id)
-        requests = StopRequest.query.filter_by(drive_id=drive.id).all()
-        total_requests += len(requests)
+        requests = sorted(drive.stop_requests, key=lambda r: r.id)
         
-        print(f"\nDrive #{drive.id} to {street.name} at {drive.arrive_at}")
+        print(f"\nDrive #{drive.id} to {drive.street.name} at {drive.arrive_at}"
+              f" ({drive.pending_requests} pending, {drive.confirmed_requests} confirmed)")
         if requests:
             for req in requests:
-                resident = Resident.query.get(req.resident_id)
-                user = User.query.get(resident.user_id)
-                print(f"  - Request #{req.id}: {user.username} at {req.address}")
+                print(f"  - Request #{req.id}: {req.resident.user.username} at {req.address}")
                 print(f"    Status: {req.status}")
         else:
             print("  (no stop requests)")
     
-    print(f"\nTotal stop requests: {total_requests}")
+    print(f"\nTotal stop requests: {sum(drive.total_requests for drive in upcoming_drives)}")
+
+# this command will be : flask driver-day 1 --date 2026-10-19
+@app.cli.command("driver-day", help="Lists a driver's drives on one day with their stop request counts")
+@click.argument("driver_id", type=int)
+@click.option("--date", "day", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Today by default")
+def driver_day_cmd(driver_id, day):
+    drives = get_driver_day(driver_id, day.date() if day else None)
+    if not drives:
+        print(f"No drives for Driver #{driver_id} on {(day or datetime.utcnow()).date()}.")
+        return
+    for drive in drives:
+        print(f"Drive #{drive['id']} to {drive['street_name']} at {drive['arrive_at']} [{drive['status']}]: "
+              f"{drive['total_requests']} requests, {drive['pending_requests']} pending, "
+              f"{drive['confirmed_requests']} confirmed")
 
 @app.cli.command("driver-update-request")
 def driver_update_request_cmd():
@@ -603,12 +830,8 @@ def driver_update_request_cmd():
         print("Cancelled.")
         return
     
-    # Get all pending requests for this driver's upcoming drives
-    now = datetime.utcnow()
-    upcoming_drives = Drive.query.filter(
-        Drive.driver_id == chosen_driver.id,
-        Drive.arrive_at >= now
-    ).all()
+    # Get all requests for this driver's upcoming drives
+    upcoming_drives = get_driver_request_board(chosen_driver.id)
     
     if not upcoming_drives:
         print(f"No upcoming drives for Driver #{chosen_driver.id}.")
@@ -617,12 +840,8 @@ def driver_update_request_cmd():
     # Collect all requests
     all_requests = []
     for drive in upcoming_drives:
-        requests = StopRequest.query.filter_by(drive_id=drive.id).all()
-        for req in requests:
-            resident = Resident.query.get(req.resident_id)
-            user = User.query.get(resident.user_id)
-            street = Street.query.get(drive.street_id)
-            all_requests.append((req, user, street, drive))
+        for req in sorted(drive.stop_requests, key=lambda r: r.id):
+            all_requests.append((req, req.resident.user, drive.street, drive))
     
     if not all_requests:
         print(f"No stop requests found for Driver #{chosen_driver.id}.")
@@ -672,8 +891,49 @@ def driver_update_request_cmd():
     
     print(f"OK: Request #{selected_req.id} status updated to {new_status}.")
 
+@app.cli.command("drive-route")
+@click.argument("drive_id", type=int)
+def drive_route_cmd(drive_id):
+    """
+    (Driver) Show the optimized visiting order of a drive's confirmed stops.
+    """
+    route = get_drive_route(drive_id)
+    if route is None:
+        print(f"Drive #{drive_id} not found.")
+        return
+    if not route["stops"] and not route["unrouted"]:
+        print(f"Drive #{drive_id} has no confirmed stop requests.")
+        return
+    start = "driver's position" if route["start"] else "first stop"
+    print(f"\nRoute for Drive #{drive_id} from {start} ({route['distance_m'] / 1000:.1f} km):")
+    for stop in route["stops"]:
+        print(f"  {stop['sequence']}) Request #{stop['stop_request_id']} at {stop['address']}")
+    if route["unrouted"]:
+        print("\nNo coordinates, visit when convenient:")
+        for stop in route["unrouted"]:
+            print(f"  - Request #{stop['stop_request_id']} at {stop['address']}")
+
+@app.cli.command("drive-etas")
+@click.argument("drive_id", type=int)
+def drive_etas_cmd(drive_id):
+    """
+    (Driver) Show the estimated arrival time at each stop of a drive.
+    """
+    etas = get_drive_etas(drive_id)
+    if etas is None:
+        print(f"Drive #{drive_id} not found.")
+        return
+    if not etas["stops"]:
+        print(f"Drive #{drive_id} has no routed stop requests.")
+        return
+    print(f"\nArrival estimates for Drive #{drive_id}:")
+    for stop in etas["stops"]:
+        when = "passed" if stop["passed"] else datetime.fromisoformat(stop["eta"]).strftime("%Y-%m-%d %H:%M")
+        print(f"  {stop['sequence']}) Request #{stop['stop_request_id']}: {when}")
+
 @app.cli.command("resident-request-status")
-def resident_request_status_cmd():
+@click.option("--archived", is_flag=True, help="Also show requests on archived drives")
+def resident_request_status_cmd(archived):
     """
     (Resident) View status of stop requests for a resident.
     """
@@ -697,8 +957,8 @@ def resident_request_status_cmd():
         print("This user has no home street set. Run: flask set-resident-street")
         return
     
-    # Get all stop requests for this resident
-    requests = StopRequest.query.filter_by(resident_id=res.id).order_by(StopRequest.requested_at.desc()).all()
+    # Get all stop requests for this resident, with their drives, in one query
+    requests = get_resident_stop_requests(res.id, include_archived=archived)
     
     if not requests:
         print(f"No stop requests found for {user.username}.")
@@ -706,16 +966,11 @@ def resident_request_status_cmd():
     
     print(f"\nStop requests for {user.username} (Resident #{res.id}):")
     for req in requests:
-        drive = Drive.query.get(req.drive_id)
-        street = Street.query.get(drive.street_id)
-        driver = Driver.query.get(drive.driver_id)
-        driver_user = User.query.get(driver.user_id)
-        
-        print(f"\nRequest #{req.id}:")
-        print(f"  Drive: #{drive.id} to {street.name} at {drive.arrive_at}")
-        print(f"  Driver: {driver_user.username} (Driver #{driver.id})")
-        print(f"  Address: {req.address}")
-        print(f"  Status: {req.status}")
-        print(f"  Requested: {req.requested_at}")
+        print(f"\nRequest #{req['id']}:{' (archived)' if req['archived'] else ''}")
+        print(f"  Drive: #{req['drive_id']} to {req['street_name']} at {req['arrive_at']}")
+        print(f"  Driver: {req['driver_username']}")
+        print(f"  Address: {req['address']}")
+        print(f"  Status: {req['status']}")
+        print(f"  Requested: {req['requested_at']}")
 
 